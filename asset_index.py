@@ -0,0 +1,82 @@
+# 资产的列式索引：把大量资产的可操作时间、类型、计数器放进NumPy数组，一次调用算出可操作掩码、各账号下一次可操作时间和各类型的统计
+# 目前只在benchmark.py中与逐个对象计算对比，NumPy见requirements-benchmark.txt
+from datetime import datetime
+from typing import Dict, List
+import numpy as np
+from res import Farming, Tool, Crop, Chicken, MBS, Building
+
+# 资产类型编号
+kinds = [Tool, Crop, Chicken, MBS, Building]
+kind_names = ["mining", "plant", "chicken", "mbs", "build", "other"]
+KIND_BUILDING = kinds.index(Building)
+# 不属于以上类型的资产
+KIND_OTHER = len(kinds)
+
+# 鸡24小时内最多喂4次
+CHICKEN_DAY_CLAIMS = 4
+DAY_SECONDS = 24 * 3600
+
+
+def kind_of(item: Farming) -> int:
+    for i, cls in enumerate(kinds):
+        if isinstance(item, cls):
+            return i
+    return KIND_OTHER
+
+
+class AssetIndex:
+    # items: 账号: 资产列表
+    def __init__(self, items: Dict[str, List[Farming]]):
+        self.accounts: List[str] = list(items.keys())
+        self.items: List[Farming] = [item for account in self.accounts for item in items[account]]
+        count = len(self.items)
+        self.account = np.repeat(np.arange(len(self.accounts), dtype=np.int32),
+                                 [len(items[account]) for account in self.accounts])
+        self.kind = np.fromiter((kind_of(item) for item in self.items), dtype=np.int8, count=count)
+        self.next_availability = np.fromiter((item.next_availability.timestamp() for item in self.items),
+                                             dtype=np.float64, count=count)
+        self.is_ready = np.fromiter((getattr(item, "is_ready", 0) or 0 for item in self.items),
+                                    dtype=np.int8, count=count)
+        # 鸡24小时内的喂食次数，及其中最早一次的时间
+        day_claims = [getattr(item, "day_claims_at", None) or [] for item in self.items]
+        self.day_claims = np.fromiter((len(claims) for claims in day_claims), dtype=np.int16, count=count)
+        self.first_day_claim = np.fromiter((claims[0].timestamp() if claims else 0 for claims in day_claims),
+                                           dtype=np.float64, count=count)
+
+    def __len__(self):
+        return len(self.items)
+
+    # 考虑了鸡每天喂食次数限制的可操作时间
+    def effective_next(self) -> np.ndarray:
+        limited = self.day_claims >= CHICKEN_DAY_CLAIMS
+        return np.where(limited, np.maximum(self.next_availability, self.first_day_claim + DAY_SECONDS),
+                        self.next_availability)
+
+    # 已完成的建筑物不再操作
+    def active(self) -> np.ndarray:
+        return ~((self.kind == KIND_BUILDING) & (self.is_ready == 1))
+
+    def operable_mask(self, now: datetime) -> np.ndarray:
+        return self.active() & (self.effective_next() <= now.timestamp())
+
+    # 各账号下一次有东西可操作的时间(已经可操作的不算)，没有的为None
+    def next_due(self, now: datetime) -> Dict[str, datetime]:
+        times = self.effective_next()
+        waiting = self.active() & (times > now.timestamp())
+        due = np.full(len(self.accounts), np.inf)
+        np.minimum.at(due, self.account[waiting], times[waiting])
+        return {account: None if np.isinf(t) else datetime.fromtimestamp(t) for account, t in zip(self.accounts, due)}
+
+    # 各类型资产的数量：{类型: (可操作数, 等待数)}
+    def histogram(self, now: datetime) -> Dict[str, tuple]:
+        mask = self.operable_mask(now)
+        active = self.active()
+        ready = np.bincount(self.kind[mask], minlength=len(kind_names))
+        waiting = np.bincount(self.kind[active & ~mask], minlength=len(kind_names))
+        return {name: (int(ready[i]), int(waiting[i])) for i, name in enumerate(kind_names)}
+
+    # 把算出的可操作时间写回资产对象(鸡受每天喂食次数限制时会推迟)
+    def write_back(self):
+        for item, t in zip(self.items, self.effective_next()):
+            if t != item.next_availability.timestamp():
+                item.next_availability = datetime.fromtimestamp(t)
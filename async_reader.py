@@ -0,0 +1,45 @@
+# 并发读取一个账号的所有链上数据表，一次扫描只需一个往返时间
+import asyncio
+import time
+from typing import Dict, Tuple, Callable
+import aiohttp
+import fast_json
+from ratelimit import get_limiter, feedback
+
+
+class AsyncTableReader:
+    # observer(url, 耗时秒数, 是否成功)：每个请求结束后回调，用于统计节点延迟
+    def __init__(self, proxy: str = None, timeout: int = 30, observer: Callable[[str, float, bool], None] = None):
+        self.proxy = "http://{0}".format(proxy) if proxy else None
+        self.observer = observer
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+
+    async def fetch(self, session: aiohttp.ClientSession, url: str, post_data: dict):
+        delay = get_limiter(url).reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        begin = time.monotonic()
+        try:
+            async with session.post(url, json=post_data, proxy=self.proxy) as resp:
+                feedback(url, resp.status, resp.headers)
+                resp.raise_for_status()
+                result = fast_json.loads(await resp.read())
+        except Exception:
+            if self.observer:
+                self.observer(url, time.monotonic() - begin, False)
+            raise
+        if self.observer:
+            self.observer(url, time.monotonic() - begin, True)
+        return result
+
+    async def fetch_all(self, requests: Dict[str, Tuple[str, dict]]) -> Dict[str, object]:
+        async with aiohttp.ClientSession(timeout=self.timeout, trust_env=False) as session:
+            keys = list(requests.keys())
+            tasks = [self.fetch(session, *requests[key]) for key in keys]
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+        # 出错的表不返回，调用方会退回到逐个同步读取
+        return {key: result for key, result in zip(keys, results) if not isinstance(result, BaseException)}
+
+    # requests: {名称: (url, post_data)}，返回 {名称: 响应json}
+    def read(self, requests: Dict[str, Tuple[str, dict]]) -> Dict[str, object]:
+        return asyncio.run(self.fetch_all(requests))
@@ -0,0 +1,189 @@
+# 批量交易：把一轮扫描中所有可操作的action合并成少数几笔多action交易提交，
+# 多笔交易同时在途，不必逐笔等待签名返回
+import time
+from concurrent.futures import Future, TimeoutError, CancelledError, wait, FIRST_COMPLETED
+from dataclasses import dataclass
+from typing import List, Callable, Optional, Dict, Tuple
+from settings import cfg
+from exceptions import TransactException, ResourceException
+from retry import classify, whole_transaction_errors, pause_errors, retry_stats
+from resources import ResourceMonitor
+
+
+# 等待提交的一个action
+@dataclass
+class PendingAction:
+    action: dict
+    # 日志中显示的描述
+    desc: str
+    # 提交成功后的回调，参数为交易结果
+    on_success: Callable[[dict], None] = None
+    # 提交失败后的回调，参数为异常
+    on_failure: Callable[[TransactException], None] = None
+    # 后面的操作依赖它(如恢复能量、修理工具)，要等之前的交易都返回后单独提交，并等它返回
+    barrier: bool = False
+
+
+class TransactionBatcher:
+    # submit: 提交交易的函数，返回Future，成功时为交易结果，失败时抛出TransactException
+    # poll: 取回签名结果的函数，等待交易时定期调用
+    def __init__(self, submit: Callable[[dict], Future], log, monitor: ResourceMonitor = None,
+                 poll: Callable[[], None] = None):
+        self.submit_transaction = submit
+        self.log = log
+        # 账号CPU/NET监控，为空则不检查
+        self.monitor = monitor
+        self.poll = poll
+        self.pending: List[PendingAction] = []
+        # 已提交还没返回的交易 {Future: (其中的action, 提交时间)}
+        self.in_flight: Dict[Future, Tuple[List[PendingAction], float]] = {}
+        # 本次flush中第一个导致操作失败的错误
+        self.error: Optional[TransactException] = None
+
+    # retry: 是否是失败后的重试，用于统计重试放大倍数
+    def add(self, action: dict, desc: str, on_success: Callable = None, on_failure: Callable = None,
+            retry: bool = False, barrier: bool = False):
+        if not retry:
+            retry_stats.request("action")
+        self.pending.append(PendingAction(action, desc, on_success, on_failure, barrier))
+
+    def clear(self):
+        self.pending.clear()
+
+    def __len__(self):
+        return len(self.pending)
+
+    # 提交所有等待中的action，按顺序切分成若干笔交易，最多同时有max_inflight_transactions笔在途，
+    # recover/repair所在的交易单独等待返回，保证排在依赖它们的claim前面
+    # 返回值：有操作失败时为第一个错误，都成功(或只是推迟)时为None
+    def flush(self) -> Optional[TransactException]:
+        pending = self.pending
+        self.pending = []
+        self.error = None
+        if not pending:
+            return None
+        size = max(1, cfg.batch_max_actions)
+        limit = max(1, cfg.max_inflight_transactions)
+        self.log.info("批量提交【{0}】个操作，每笔交易最多【{1}】个".format(len(pending), size))
+        try:
+            for i in range(0, len(pending), size):
+                batch = pending[i:i + size]
+                rest = pending[i + size:]
+                barrier = any(item.barrier for item in batch)
+                error = self.drain(0 if barrier else limit - 1)
+                if error:
+                    self.log.error("账号资源不足或节点过载，本轮剩余【{0}】个操作稍后重试".format(len(batch + rest)))
+                    self.fail(batch + rest, error)
+                    break
+                if self.monitor:
+                    # CPU/NET只够提交前面一部分(包括在途交易)，其余的推迟到资源恢复后
+                    flying = [item.action for items, _ in self.in_flight.values() for item in items]
+                    fit = max(0, self.monitor.affordable(flying + [item.action for item in batch]) - len(flying))
+                    if fit < len(batch):
+                        if fit:
+                            self.launch(batch[:fit])
+                        error = self.drain(0)
+                        if error:
+                            self.log.error("账号资源不足或节点过载，本轮剩余【{0}】个操作稍后重试".format(
+                                len(batch) - fit + len(rest)))
+                            self.fail(batch[fit:] + rest, error)
+                        else:
+                            self.defer(batch[fit:] + rest)
+                        break
+                self.launch(batch)
+                if barrier:
+                    error = self.drain(0)
+                    if error and rest:
+                        self.log.error("账号资源不足或节点过载，本轮剩余【{0}】个操作稍后重试".format(len(rest)))
+                        self.fail(rest, error)
+                        break
+            self.drain(0)
+        finally:
+            # 不可重试的错误中断了提交，在途交易的结果不再处理(成功的交易仍会记入自己发出的交易)
+            for future in self.in_flight:
+                future.cancel()
+            self.in_flight.clear()
+        return self.error
+
+    def start(self, batch: List[PendingAction]) -> Future:
+        retry_stats.attempt("action", len(batch))
+        return self.submit_transaction({"actions": [item.action for item in batch]})
+
+    # 提交一笔交易，不等待返回
+    def launch(self, batch: List[PendingAction]):
+        self.in_flight[self.start(batch)] = (batch, time.monotonic())
+
+    # 等到在途交易不超过limit笔，返回需要暂停提交本轮剩余交易的错误
+    def drain(self, limit: int) -> Optional[TransactException]:
+        error = None
+        while len(self.in_flight) > limit:
+            if self.poll:
+                self.poll()
+            done, _ = wait(list(self.in_flight), timeout=cfg.transact_poll_interval, return_when=FIRST_COMPLETED)
+            now = time.monotonic()
+            for future, (batch, started) in list(self.in_flight.items()):
+                if future in done or now - started > cfg.transact_timeout.total_seconds():
+                    del self.in_flight[future]
+                    # 超时的不再等待，已经返回的取消不了
+                    future.cancel()
+                    error = self.handle(batch, future) or error
+        return error
+
+    # 提交一笔交易并等待返回，被拒绝时二分定位出错的action，其余action照常提交
+    # 返回值：需要暂停提交本轮剩余交易的错误，没有则为None
+    def submit(self, batch: List[PendingAction]) -> Optional[TransactException]:
+        future = self.start(batch)
+        deadline = time.monotonic() + cfg.transact_timeout.total_seconds()
+        while not future.done() and time.monotonic() < deadline:
+            if self.poll:
+                self.poll()
+            wait([future], timeout=cfg.transact_poll_interval)
+        future.cancel()
+        return self.handle(batch, future)
+
+    # 处理一笔已返回(或超时)的交易
+    def handle(self, batch: List[PendingAction], future: Future) -> Optional[TransactException]:
+        try:
+            result = future.result(timeout=0)
+        except (TimeoutError, CancelledError):
+            return self.rejected(batch, TransactException("transaction timed out"))
+        except TransactException as e:
+            return self.rejected(batch, e)
+        if self.monitor:
+            self.monitor.record([item.action for item in batch], result)
+        for item in batch:
+            if item.on_success:
+                item.on_success(result)
+        return None
+
+    def rejected(self, batch: List[PendingAction], e: TransactException) -> Optional[TransactException]:
+        if not e.retry:
+            raise e
+        error_class = classify(e)
+        if len(batch) == 1 or error_class in whole_transaction_errors:
+            self.fail(batch, e)
+            return e if error_class in pause_errors else None
+        self.log.info("交易被拒绝，拆分为两笔重试: {0}".format([item.desc for item in batch]))
+        mid = len(batch) // 2
+        error = self.submit(batch[:mid])
+        if error:
+            self.fail(batch[mid:], error)
+            return error
+        return self.submit(batch[mid:])
+
+    # 账号CPU/NET不够，这些action不提交，等资源恢复后由回调重新安排
+    def defer(self, batch: List[PendingAction]):
+        wait_seconds = self.monitor.wait_seconds([batch[0].action])
+        self.log.info("账号CPU/NET不足，【{0}】个操作推迟约【{1:.0f}】秒后提交".format(len(batch), wait_seconds))
+        e = ResourceException("账号CPU/NET不足", wait_seconds)
+        for item in batch:
+            if item.on_failure:
+                item.on_failure(e)
+
+    # 这些action本轮提交失败，由回调决定何时重试
+    def fail(self, batch: List[PendingAction], e: TransactException):
+        self.error = self.error or e
+        for item in batch:
+            self.log.error("操作失败: {0} {1}".format(item.desc, e))
+            if item.on_failure:
+                item.on_failure(e)
@@ -0,0 +1,351 @@
+#!/usr/bin/python3
+# 性能测试，例如：python benchmark.py bulk --rpc https://api.wax.alohaeos.com a.wam b.wam
+#               python benchmark.py inject --times 100 --reload
+#               python benchmark.py index --accounts 1000 --assets 20
+#               python benchmark.py json --rows 1000 tools.json
+#               python benchmark.py scan --sizes 1,10,100,1000 --latency 0.02
+# 需要先安装额外的依赖：pip install -r requirements-benchmark.txt
+import argparse
+import functools
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+import psutil
+from typing import List, Dict
+import requests
+from logger import log
+from farmer import Farmer, create_http_session
+from bulk_reader import BulkTableReader, bulk_tables
+from rpc_pool import EndpointPool
+from settings import cfg, UserParam
+from asset_index import AssetIndex
+import fast_json
+import farmer as farmer_module
+import chain_stub
+from config_cache import ConfigCache
+import res
+
+
+# 统计会话发出的请求数
+def count_requests(http: requests.Session) -> List[int]:
+    counter = [0]
+
+    def hook(resp, *args, **kwargs):
+        counter[0] += 1
+
+    http.hooks["response"].append(hook)
+    return counter
+
+
+# 对比逐个账号读取和批量读取的请求数与耗时
+def bench_bulk_read(endpoints: List[str], accounts: List[str], tables: List[str]):
+    http = create_http_session(pool_size=4)
+    counter = count_requests(http)
+    rpc_pool = EndpointPool(endpoints)
+
+    begin = time.perf_counter()
+    for account in accounts:
+        farmer = Farmer()
+        farmer.wax_account = account
+        farmer.http = http
+        farmer.rpc_pool = rpc_pool
+        for table in tables:
+            farmer.get_table_rows(table, bulk_tables[table][0])
+    per_account = (counter[0], time.perf_counter() - begin)
+
+    counter[0] = 0
+    begin = time.perf_counter()
+    BulkTableReader(http, rpc_pool, log).read(tables, accounts)
+    bulk = (counter[0], time.perf_counter() - begin)
+
+    print("{0:<12}{1:>10}{2:>12}".format("path", "requests", "seconds"))
+    print("{0:<12}{1:>10}{2:>12.3f}".format("per-account", *per_account))
+    print("{0:<12}{1:>10}{2:>12.3f}".format("bulk", *bulk))
+
+
+# 在本地端口提供一个空白页面，代替游戏页面
+def serve_stub_page() -> str:
+    root = tempfile.mkdtemp()
+    with open(os.path.join(root, "index.html"), "w") as file:
+        file.write("<html><head></head><body></body></html>")
+        file.close()
+    class QuietHandler(SimpleHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+    handler = functools.partial(QuietHandler, directory=root)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return "http://127.0.0.1:{0}/index.html".format(server.server_port)
+
+
+# 签名前的注入耗时：每次检查并注入 vs 通过CDP注册一次，wax_transact换成立即返回的空函数，只比较注入本身
+def bench_inject(times: int, reload: bool):
+    url = serve_stub_page()
+    stub = "window.wax_transact = function(transaction) { return [true, {}]; };"
+    results = []
+    for registered in (False, True):
+        farmer = Farmer()
+        farmer.wax_account = "benchmark"
+        if not registered:
+            farmer.register_waxjs = lambda: None
+        begin = time.perf_counter()
+        farmer.init_browser()
+        farmer.driver.get(url)
+        setup = time.perf_counter() - begin
+        try:
+            begin = time.perf_counter()
+            for _ in range(times):
+                if reload:
+                    farmer.driver.refresh()
+                farmer.inject_waxjs()
+                farmer.driver.execute_script(stub)
+                farmer.driver.execute_script("return window.wax_transact(arguments[0]);", {"actions": []})
+            elapsed = time.perf_counter() - begin
+        finally:
+            farmer.close_browser()
+        results.append(("cdp" if registered else "probe", setup, elapsed / times * 1000))
+
+    print("{0:<8}{1:>12}{2:>16}".format("path", "setup(s)", "per-trx(ms)"))
+    for name, setup, per_trx in results:
+        print("{0:<8}{1:>12.3f}{2:>16.2f}".format(name, setup, per_trx))
+
+
+# 随机生成的资产，一半工具一半鸡，可操作时间分布在前后两小时内
+def synthetic_assets(accounts: int, per_account: int) -> Dict[str, List[res.Farming]]:
+    rng = random.Random(1)
+    now = time.time()
+    tool_ids = list(res.supported_tools.keys())
+    items = {}
+    for i in range(accounts):
+        rows_tool = [{
+            "asset_id": str(i * per_account + j),
+            "template_id": rng.choice(tool_ids),
+            "next_availability": int(now + rng.uniform(-7200, 7200)),
+            "current_durability": 100,
+            "durability": 200,
+        } for j in range(per_account // 2)]
+        rows_chicken = [{
+            "asset_id": str(i * per_account + j),
+            "template_id": res.NFT.Chicken,
+            "name": "Chicken",
+            "times_claimed": 1,
+            "last_claimed": int(now - 3600),
+            "next_availability": int(now + rng.uniform(-7200, 7200)),
+            "day_claims_at": [int(now - rng.uniform(0, 86400)) for _ in range(rng.randint(0, 4))],
+        } for j in range(per_account // 2, per_account)]
+        items["account{0}".format(i)] = res.create_tools(rows_tool) + res.create_chickens(rows_chicken)
+    return items
+
+
+# 对比逐个对象和列式索引计算可操作资产及下一次可操作时间的耗时
+def bench_index(accounts: int, per_account: int, rounds: int):
+    items = synthetic_assets(accounts, per_account)
+    farmers = {}
+    for account in items:
+        farmer = Farmer()
+        farmer.wax_account = account
+        farmers[account] = farmer
+
+    begin = time.perf_counter()
+    for _ in range(rounds):
+        for account, assets in items.items():
+            farmer = farmers[account]
+            farmer.not_operational.clear()
+            farmer.filter_operable([item for item in assets if isinstance(item, res.Tool)])
+            farmer.filter_operable([item for item in assets if isinstance(item, res.Chicken)])
+            min(item.next_availability for item in farmer.not_operational) if farmer.not_operational else None
+    per_object = (time.perf_counter() - begin) / rounds
+
+    begin = time.perf_counter()
+    index = AssetIndex(items)
+    build = time.perf_counter() - begin
+    begin = time.perf_counter()
+    for _ in range(rounds):
+        now = datetime.now()
+        index.operable_mask(now)
+        index.next_due(now)
+        index.histogram(now)
+    vectorized = (time.perf_counter() - begin) / rounds
+
+    print("accounts {0}, assets {1}".format(accounts, len(index)))
+    print("{0:<12}{1:>12}".format("path", "ms/round"))
+    print("{0:<12}{1:>12.2f}".format("per-object", per_object * 1000))
+    print("{0:<12}{1:>12.2f}".format("index-build", build * 1000))
+    print("{0:<12}{1:>12.2f}".format("vectorized", vectorized * 1000))
+
+
+# 合成的tools表响应，没有录制的响应文件时使用
+def synthetic_tools_response(rows: int) -> bytes:
+    now = int(time.time())
+    tool_ids = list(res.supported_tools.keys())
+    return json.dumps({"rows": [{
+        "asset_id": str(1099500000000 + i),
+        "owner": "benchmark.wam",
+        "type": "Wood",
+        "rarity": "Common",
+        "template_id": tool_ids[i % len(tool_ids)],
+        "durability": 200,
+        "current_durability": 150,
+        "next_availability": now + i,
+    } for i in range(rows)], "more": False, "next_key": ""}).encode()
+
+
+def make_response(content: bytes) -> requests.Response:
+    resp = requests.Response()
+    resp._content = content
+    resp.status_code = 200
+    resp.encoding = "utf-8"
+    return resp
+
+
+# 对比原来的解析方式(生成响应文本用于调试日志 + resp.json())和快速解析，都构造成工具对象
+def bench_json(fixtures: List[str], rows: int, rounds: int):
+    bodies = []
+    for path in fixtures:
+        with open(path, "rb") as file:
+            bodies.append(file.read())
+            file.close()
+    if not bodies:
+        bodies.append(synthetic_tools_response(rows))
+    bench_log = logging.LoggerAdapter(logging.getLogger("benchmark"), {"tag": "benchmark"})
+    bench_log.logger.setLevel(logging.INFO)
+
+    def baseline(resp: requests.Response):
+        bench_log.debug("get_table_rows tools:{0}".format(resp.text))
+        return res.create_tools(resp.json()["rows"])
+
+    def fast(resp: requests.Response):
+        return res.create_tools(fast_json.decode(resp, bench_log, "get_table_rows tools")["rows"])
+
+    print("decoder: {0}".format("orjson" if fast_json.orjson else "json"))
+    print("{0:<10}{1:>12}".format("path", "ms/resp"))
+    for name, parse in (("baseline", baseline), ("fast", fast)):
+        begin = time.perf_counter()
+        for _ in range(rounds):
+            for body in bodies:
+                # 每次都是新的响应对象，和真实请求一样没有缓存的文本
+                parse(make_response(body))
+        elapsed = time.perf_counter() - begin
+        print("{0:<10}{1:>12.3f}".format(name, elapsed / rounds / len(bodies) * 1000))
+
+
+# 在子进程中启动模拟服务，它的CPU和内存不计入本进程
+def launch_stub(accounts: int, latency: float, sign_latency: float, error_rate: float):
+    port = random.randint(20000, 60000)
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "chain_stub.py")
+    proc = subprocess.Popen([sys.executable, script, "--port", str(port), "--accounts", str(accounts),
+                             "--latency", str(latency), "--sign-latency", str(sign_latency),
+                             "--error-rate", str(error_rate)], stdout=subprocess.DEVNULL)
+    url = "http://127.0.0.1:{0}".format(port)
+    for _ in range(600):
+        try:
+            requests.get(url + "/stub/stats", timeout=1)
+            return proc, url
+        except requests.RequestException:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("模拟服务启动失败")
+
+
+def stub_requests(url: str) -> int:
+    return requests.get(url + "/stub/stats").json()["requests"]
+
+
+# 对模拟的链运行一轮scan_all，统计每秒请求数、每秒claim数、CPU和内存
+# inflight: 每个账号同时在途的交易数
+def bench_scan(sizes: List[int], latency: float, sign_latency: float, error_rate: float, inflight: int):
+    logging.getLogger("logger").setLevel(logging.WARNING)
+    cfg.endpoint_rate_limit = 1000000
+    cfg.endpoint_burst = 1000000
+    cfg.signer_rate_limit = 1000000
+    cfg.max_inflight_transactions = inflight
+    farmer_module.farming_config = ConfigCache(os.path.join(tempfile.mkdtemp(), "farming_config.json"))
+    print("{0:>8}{1:>10}{2:>10}{3:>10}{4:>10}{5:>10}{6:>10}".format(
+        "accounts", "seconds", "requests", "req/s", "claims/s", "cpu(s)", "rss(MB)"))
+    for size in sizes:
+        proc, url = launch_stub(size, latency, sign_latency, error_rate)
+        try:
+            Farmer.rpc_pool = EndpointPool([url])
+            Farmer.url_assets = url + "/atomicassets/v1/assets"
+            cfg.history_url = url + "/v2/history/get_actions"
+            cfg.transaction_status_url = url + "/v2/history/get_transaction"
+            http = create_http_session(pool_size=cfg.max_workers)
+            farmers = []
+            for i in range(size):
+                param = UserParam()
+                param.wax_account = chain_stub.account_name(i)
+                farmer = Farmer(param)
+                farmer.wax_account = param.wax_account
+                farmer.init_http(http)
+                farmer.signer = chain_stub.StubSigner(http, url)
+                farmers.append(farmer)
+
+            process = psutil.Process()
+            cpu = process.cpu_times()
+            requests_before = stub_requests(url)
+            begin = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=cfg.max_workers) as executor:
+                list(executor.map(lambda farmer: farmer.scan_all(), farmers))
+            elapsed = time.perf_counter() - begin
+            cpu_after = process.cpu_times()
+            count_requests = stub_requests(url) - requests_before - 1
+            claims = sum(farmer.count_success_claim for farmer in farmers)
+            cpu_seconds = (cpu_after.user - cpu.user) + (cpu_after.system - cpu.system)
+            print("{0:>8}{1:>10.2f}{2:>10}{3:>10.1f}{4:>10.1f}{5:>10.2f}{6:>10.1f}".format(
+                size, elapsed, count_requests, count_requests / elapsed, claims / elapsed, cpu_seconds,
+                process.memory_info().rss / 1024 / 1024))
+        finally:
+            proc.kill()
+            proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="command", required=True)
+    bulk = sub.add_parser("bulk", help="批量读取数据表 vs 逐个账号读取")
+    bulk.add_argument("--rpc", default=",".join(cfg.rpc_endpoints), help="节点列表，逗号分隔")
+    bulk.add_argument("--tables", default=",".join(bulk_tables.keys()))
+    bulk.add_argument("accounts", nargs="+")
+    inject = sub.add_parser("inject", help="每次签名前注入waxjs vs 通过CDP注册一次")
+    inject.add_argument("--times", type=int, default=100)
+    inject.add_argument("--reload", action="store_true", help="每次签名前刷新页面")
+    index = sub.add_parser("index", help="列式索引 vs 逐个对象计算可操作资产")
+    index.add_argument("--accounts", type=int, default=1000)
+    index.add_argument("--assets", type=int, default=20, help="每个账号的资产数")
+    index.add_argument("--rounds", type=int, default=5)
+    decode = sub.add_parser("json", help="快速JSON解析 vs 原来的解析方式")
+    decode.add_argument("--rows", type=int, default=1000, help="没有录制的响应文件时，合成的行数")
+    decode.add_argument("--rounds", type=int, default=50)
+    decode.add_argument("fixtures", nargs="*", help="录制的get_table_rows tools响应文件")
+    scan = sub.add_parser("scan", help="对本地模拟的链运行scan_all的吞吐量")
+    scan.add_argument("--sizes", default="1,10,100,1000", help="账号数量，逗号分隔")
+    scan.add_argument("--latency", type=float, default=0.02, help="模拟每个请求的延迟(秒)")
+    scan.add_argument("--sign-latency", type=float, default=0.5, help="模拟每次签名的延迟(秒)")
+    scan.add_argument("--error-rate", type=float, default=0, help="模拟请求出错的比例")
+    scan.add_argument("--inflight", type=int, default=cfg.max_inflight_transactions, help="每个账号同时在途的交易数")
+    args = parser.parse_args()
+    if args.command == "bulk":
+        bench_bulk_read(args.rpc.split(","), args.accounts, args.tables.split(","))
+    elif args.command == "inject":
+        bench_inject(args.times, args.reload)
+    elif args.command == "index":
+        bench_index(args.accounts, args.assets, args.rounds)
+    elif args.command == "json":
+        bench_json(args.fixtures, args.rows, args.rounds)
+    elif args.command == "scan":
+        bench_scan([int(size) for size in args.sizes.split(",")], args.latency, args.sign_latency,
+                   args.error_rate, args.inflight)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+# 多账号共用的浏览器池：保持最多size个浏览器，不属于任何账号，按需借给有交易要签署的账号
+# 借给另一个账号时替换all-access.wax.io的cookie切换WAX云钱包账号，内存占用取决于同时签名的账号数而不是账号总数
+# 代理和服务器模式是启动浏览器时的参数，只借给启动参数相同的账号
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Dict, Tuple
+from logger import log
+from metrics import metrics
+
+
+@dataclass
+class PooledBrowser:
+    index: int
+    driver: object = None
+    # 浏览器中当前登录的账号
+    account: str = None
+    # 启动参数 (代理, 是否服务器模式)
+    options: Tuple = None
+    waxjs_registered: bool = False
+    leased: bool = False
+    # 最后一次归还的时间
+    last_used: float = 0
+
+
+class BrowserPool:
+    def __init__(self, size: int, data_dir: str):
+        self.size = size
+        self.data_dir = data_dir
+        self.cond = threading.Condition()
+        self.browsers: List[PooledBrowser] = [PooledBrowser(i) for i in range(size)]
+        # 账号: 借出的浏览器
+        self.leased: Dict[str, PooledBrowser] = {}
+
+    # 挑选空闲的浏览器：优先已登录本账号的，其次还没打开的，再次是启动参数相同、最久没用的，
+    # 都没有时关掉最久没用的一个，按本账号的参数重新打开
+    def pick(self, account: str, options: Tuple) -> PooledBrowser:
+        free = [browser for browser in self.browsers if not browser.leased]
+        if not free:
+            return None
+        same = [browser for browser in free if browser.driver and browser.options == options]
+        for browser in same:
+            if browser.account == account:
+                return browser
+        for browser in free:
+            if not browser.driver:
+                return browser
+        return min(same or free, key=lambda browser: browser.last_used)
+
+    # 借出浏览器，没有空闲的就等待
+    def checkout(self, farmer):
+        account = farmer.wax_account
+        options = farmer.browser_options()
+        with self.cond:
+            while True:
+                browser = self.pick(account, options)
+                if browser:
+                    break
+                self.cond.wait()
+            browser.leased = True
+            self.leased[account] = browser
+        farmer.driver = browser.driver
+        farmer.waxjs_registered = browser.waxjs_registered
+        try:
+            if farmer.driver and browser.options != options:
+                log.info("浏览器池第【{0}】个浏览器的代理或服务器模式不同，重新打开".format(browser.index + 1))
+                farmer.close_browser()
+                browser.driver = None
+                browser.account = None
+            if not farmer.driver:
+                log.info("浏览器池打开第【{0}】个浏览器".format(browser.index + 1))
+                farmer.init_browser(os.path.join(self.data_dir, "pool-{0}".format(browser.index)))
+                browser.driver = farmer.driver
+                browser.options = options
+                browser.waxjs_registered = farmer.waxjs_registered
+            if browser.account != account:
+                browser.account = None
+                farmer.switch_account()
+                browser.account = account
+        except Exception:
+            farmer.close_browser()
+            browser.driver = None
+            browser.account = None
+            self.checkin(farmer)
+            raise
+
+    def checkin(self, farmer):
+        with self.cond:
+            browser = self.leased.pop(farmer.wax_account, None)
+            if browser:
+                browser.driver = farmer.driver
+                browser.waxjs_registered = farmer.waxjs_registered
+                if not browser.driver:
+                    browser.account = None
+                browser.leased = False
+                browser.last_used = time.time()
+            farmer.driver = None
+            self.cond.notify()
+
+    # 账号退出时归还浏览器，浏览器留在池中
+    def discard(self, farmer):
+        if farmer.wax_account in self.leased:
+            self.checkin(farmer)
+
+    def close(self):
+        with self.cond:
+            for browser in self.browsers:
+                if browser.driver:
+                    metrics.discard("farmer_browser_rss_bytes", browser=browser.driver.session_id[:8])
+                    browser.driver.quit()
+                    browser.driver = None
+                    browser.account = None
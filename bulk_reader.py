@@ -0,0 +1,89 @@
+# 多账号批量读取数据表：按owner索引范围分页读取，再按账号拆分，代替每个账号每张表一个请求
+from typing import List, Dict, Iterable
+import requests
+from settings import cfg
+import eos
+import fast_json
+from rpc_pool import EndpointPool
+
+# 表名: (索引位置, 账号字段)
+bulk_tables = {
+    "accounts": (1, "account"),
+    "tools": (2, "owner"),
+    "crops": (2, "owner"),
+    "animals": (2, "owner"),
+    "buildings": (2, "owner"),
+    "mbs": (2, "owner"),
+}
+
+
+class BulkTableReader:
+    def __init__(self, http: requests.Session, rpc_pool: EndpointPool, log):
+        self.http = http
+        self.rpc_pool = rpc_pool
+        self.log = log
+        # 本次读取发出的请求数
+        self.count_request = 0
+
+    def post(self, table: str, index_position: int, lower_bound: str, upper_bound: str, limit: int) -> dict:
+        post_data = {
+            "json": True,
+            "code": "farmersworld",
+            "scope": "farmersworld",
+            "table": table,
+            "lower_bound": lower_bound,
+            "upper_bound": upper_bound,
+            "index_position": index_position,
+            "key_type": "i64",
+            "limit": limit,
+            "reverse": False,
+            "show_payer": False
+        }
+        self.count_request += 1
+        resp = self.rpc_pool.post(self.http, "get_table_rows", post_data)
+        return fast_json.loads(resp.content)
+
+    # 读取一张表中多个账号的数据，返回 {账号: 行列表}
+    # 每页从下一个还没读到的账号开始，跳过中间其他玩家的数据，最坏情况下等同于逐个账号读取
+    def read_table(self, table: str, accounts: Iterable[str]) -> Dict[str, List[dict]]:
+        index_position, owner_field = bulk_tables[table]
+        pending = sorted(set(accounts), key=eos.name_to_int)
+        result = {account: [] for account in pending}
+        upper_bound = pending[-1] if pending else None
+        while pending:
+            lower_bound = pending[0]
+            resp = self.post(table, index_position, lower_bound, upper_bound, cfg.bulk_page_limit)
+            rows = resp["rows"]
+            last_owner = rows[-1][owner_field] if rows else None
+            if resp.get("more") and last_owner == lower_bound and rows[0][owner_field] == lower_bound:
+                # 一页全是同一个账号的数据，单独读这个账号
+                result[lower_bound] = self.read_account(table, lower_bound)
+                pending.pop(0)
+                continue
+            for row in rows:
+                owner = row[owner_field]
+                # 翻页时最后一个账号的数据可能不完整，留到下一页重新读
+                if resp.get("more") and owner == last_owner:
+                    break
+                if owner in result:
+                    result[owner].append(row)
+            if not resp.get("more"):
+                break
+            last_key = eos.name_to_int(last_owner)
+            pending = [account for account in pending if eos.name_to_int(account) >= last_key]
+        return result
+
+    def read_account(self, table: str, account: str) -> List[dict]:
+        index_position, _ = bulk_tables[table]
+        return self.post(table, index_position, account, account, cfg.bulk_page_limit)["rows"]
+
+    # 读取多张表，返回 {账号: {表名: 与get_table_rows相同格式的响应}}
+    def read(self, tables: Iterable[str], accounts: List[str]) -> Dict[str, Dict[str, dict]]:
+        result = {account: {} for account in accounts}
+        for table in tables:
+            rows = self.read_table(table, accounts)
+            for account, items in rows.items():
+                result[account][table] = {"rows": items, "more": False}
+        self.log.info("批量读取【{0}】个账号的{1}，共【{2}】个请求".format(len(accounts), list(tables),
+                                                                self.count_request))
+        return result
@@ -0,0 +1,356 @@
+#!/usr/bin/python3
+# 本地模拟的链和接口，用于离线测试和性能测试，不需要真实的WAX节点和浏览器
+# 模拟 get_table_rows、get_currency_balance、get_account、get_info、atomicassets的assets接口、Hyperion的get_actions和get_transaction，
+# 以及一个直接修改模拟数据的签名接口，可以设置延迟和出错比例
+# 例如：python chain_stub.py --port 8900 --latency 0.02 --error-rate 0.01
+import argparse
+import bisect
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, List, Tuple
+from urllib.parse import urlparse, parse_qs
+import requests
+import eos
+import fast_json
+import res
+from signer import Signer
+
+CHARGE_TIME = 3600
+BARLEY_PER_ACCOUNT = 20
+# 各claim操作对应的数据表
+claim_tables = {"claim": "tools", "cropclaim": "crops", "mbsclaim": "mbs", "bldclaim": "buildings"}
+
+
+# 第i个模拟账号的名字
+def account_name(i: int) -> str:
+    letters = ""
+    for _ in range(4):
+        letters = chr(ord("a") + i % 26) + letters
+        i //= 26
+    return "stub{0}.wam".format(letters)
+
+
+class ChainState:
+    def __init__(self, accounts: int, seed: int = 1):
+        self.lock = threading.Lock()
+        self.rng = random.Random(seed)
+        self.next_asset_id = 1099500000000
+        # 表名: 所有行，按账号排列
+        self.tables: Dict[str, List[dict]] = {name: [] for name in ("accounts", "tools", "crops", "animals",
+                                                                     "buildings", "mbs")}
+        # 账号: 箱子里的大麦
+        self.chest: Dict[str, List[dict]] = {}
+        # 已上链的交易 transaction_id: 区块时间
+        self.transactions: Dict[str, str] = {}
+        # asset_id: (表名, 数据表中的行)
+        self.rows_by_id: Dict[str, Tuple[str, dict]] = {}
+        self.names = sorted((account_name(i) for i in range(accounts)), key=eos.name_to_int)
+        for name in self.names:
+            self.generate(name)
+        # 表名: 各行owner的数值，账号按顺序生成，行已经按owner排好
+        self.keys: Dict[str, List[int]] = {}
+        for table in self.tables:
+            self.index(table)
+            self.rows_by_id.update({row["asset_id"]: (table, row) for row in self.tables[table] if "asset_id" in row})
+
+    def index(self, table: str):
+        owner_field = "account" if table == "accounts" else "owner"
+        self.keys[table] = [eos.name_to_int(row[owner_field]) for row in self.tables[table]]
+
+    def new_asset_id(self) -> str:
+        self.next_asset_id += 1
+        return str(self.next_asset_id)
+
+    # 一个账号的模拟数据，大约一半的东西已经可以操作
+    def generate(self, name: str):
+        now = int(time.time())
+        rng = self.rng
+
+        def next_time():
+            return now + rng.randint(-CHARGE_TIME, CHARGE_TIME)
+
+        self.tables["accounts"].append({
+            "account": name,
+            "energy": "{0}.0000".format(rng.randint(50, 500)),
+            "max_energy": "500.0000",
+            "balances": ["500.0000 GOLD", "500.0000 WOOD", "500.0000 FOOD"],
+        })
+        for template_id in rng.sample(list(res.supported_tools.keys()), 3):
+            self.tables["tools"].append({
+                "asset_id": self.new_asset_id(), "owner": name, "type": "Wood", "template_id": template_id,
+                "durability": 200, "current_durability": rng.randint(0, 200), "next_availability": next_time(),
+            })
+        for template_id in (res.NFT.BarleySeed, res.NFT.CornSeed):
+            self.tables["crops"].append({
+                "asset_id": self.new_asset_id(), "owner": name, "template_id": template_id,
+                "name": res.supported_crops[template_id], "times_claimed": rng.randint(0, 41),
+                "last_claimed": now - CHARGE_TIME, "next_availability": next_time(),
+            })
+        for _ in range(2):
+            self.tables["animals"].append({
+                "asset_id": self.new_asset_id(), "owner": name, "template_id": res.NFT.Chicken, "name": "Chicken",
+                "times_claimed": 1, "last_claimed": now - CHARGE_TIME, "next_availability": next_time(),
+                "day_claims_at": [now - CHARGE_TIME],
+            })
+        self.tables["mbs"].append({
+            "asset_id": self.new_asset_id(), "owner": name, "template_id": 1, "next_availability": next_time(),
+        })
+        self.chest[name] = [{
+            "asset_id": self.new_asset_id(), "name": "Barley", "is_transferable": True, "is_burnable": True,
+            "schema": {"schema_name": "foods"}, "template": {"template_id": str(res.NFT.Barley)},
+        } for _ in range(BARLEY_PER_ACCOUNT)]
+
+    # 按owner索引范围查询，与链上的分页方式一致
+    def table_rows(self, post_data: dict) -> dict:
+        table = post_data["table"]
+        if table in ("toolconfs", "cropconf", "mbsconf"):
+            return {"rows": config_rows(table), "more": False, "next_key": ""}
+        owner_field = "account" if table == "accounts" else "owner"
+        lower = eos.name_to_int(post_data["lower_bound"])
+        upper = eos.name_to_int(post_data["upper_bound"]) if post_data.get("upper_bound") else 2 ** 64 - 1
+        limit = post_data.get("limit", 10)
+        with self.lock:
+            keys = self.keys.get(table, [])
+            rows = self.tables.get(table, [])[bisect.bisect_left(keys, lower):bisect.bisect_right(keys, upper)]
+            page = json.loads(json.dumps(rows[:limit]))
+        more = len(rows) > limit
+        return {"rows": page, "more": more, "next_key": rows[limit][owner_field] if more else ""}
+
+    def find(self, table: str, asset_id) -> dict:
+        found = self.rows_by_id.get(str(asset_id))
+        return found[1] if found and found[0] == table else None
+
+    def account(self, name: str) -> dict:
+        for row in self.tables["accounts"]:
+            if row["account"] == name:
+                return row
+        return None
+
+    # 检查交易中的action能否全部执行，返回第一个错误信息，都能执行返回None
+    # 同一笔交易中对同一个资产的第二次claim按未就绪处理，与依次执行的结果一致
+    def check(self, actions: List[dict], now: int) -> str:
+        claimed = set()
+        for act in actions:
+            data = act["data"]
+            name = act["name"]
+            if name in ("claim", "cropclaim", "mbsclaim", "bldclaim"):
+                asset_id = str(data.get("asset_id") or data.get("crop_id"))
+                row = self.find(claim_tables[name], asset_id)
+                if not row or row["next_availability"] > now or asset_id in claimed:
+                    return "assertion failure with message: not ready to claim"
+                claimed.add(asset_id)
+            elif name == "repair" and not self.find("tools", data["asset_id"]):
+                return "assertion failure with message: tool not found"
+            elif name == "recover" and not self.account(data["owner"]):
+                return "assertion failure with message: account not found"
+            elif name == "transfer" and not self.find("animals", data["memo"].split(":")[1]):
+                return "assertion failure with message: animal not found"
+        return None
+
+    # 执行交易中的action，返回错误信息，成功返回None；有一个action出错则整笔交易都不执行
+    def apply(self, actions: List[dict]) -> str:
+        now = int(time.time())
+        with self.lock:
+            error = self.check(actions, now)
+            if error:
+                return error
+            for act in actions:
+                data = act["data"]
+                name = act["name"]
+                if name in claim_tables:
+                    table = claim_tables[name]
+                    row = self.find(table, data.get("asset_id") or data.get("crop_id"))
+                    row["next_availability"] = now + CHARGE_TIME
+                    if table == "tools":
+                        row["current_durability"] = max(0, row["current_durability"] - 5)
+                    if table == "crops":
+                        row["times_claimed"] += 1
+                        row["last_claimed"] = now
+                        if row["times_claimed"] >= 42:
+                            self.tables["crops"].remove(row)
+                            self.rows_by_id.pop(row["asset_id"])
+                            self.index("crops")
+                elif name == "repair":
+                    row = self.find("tools", data["asset_id"])
+                    row["current_durability"] = row["durability"]
+                elif name == "recover":
+                    row = self.account(data["owner"])
+                    row["energy"] = "{0}.0000".format(int(float(row["energy"])) + data["energy_recovered"])
+                elif name == "transfer":
+                    chicken = self.find("animals", data["memo"].split(":")[1])
+                    chest = self.chest.get(data["from"], [])
+                    assets = set(data["asset_ids"])
+                    self.chest[data["from"]] = [item for item in chest if item["asset_id"] not in assets]
+                    chicken["next_availability"] = now + CHARGE_TIME
+                    chicken["day_claims_at"] = (chicken["day_claims_at"] + [now])[-4:]
+        return None
+
+    def assets(self, params: Dict[str, str]) -> dict:
+        page = int(params.get("page", 1))
+        limit = int(params.get("limit", 100))
+        with self.lock:
+            items = list(self.chest.get(params.get("owner"), []))
+        if params.get("template_id"):
+            items = [item for item in items if item["template"]["template_id"] == str(params["template_id"])]
+        return {"success": True, "data": items[(page - 1) * limit:page * limit]}
+
+
+# 支持的工具和农作物的配置表
+def config_rows(table: str) -> List[dict]:
+    if table == "toolconfs":
+        return [{"template_id": template_id, "template_name": name, "type": "Wood", "charged_time": CHARGE_TIME,
+                 "energy_consumed": 10, "durability_consumed": 5, "rewards_rate": 5}
+                for template_id, name in res.supported_tools.items()]
+    if table == "cropconf":
+        return [{"template_id": template_id, "name": name, "charge_time": CHARGE_TIME, "energy_consumed": 30,
+                 "required_claims": 42} for template_id, name in res.supported_crops.items()]
+    return [{"template_id": 1, "name": "Wood Member", "type": "Wood"}]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    state: ChainState = None
+    latency = 0.0
+    error_rate = 0.0
+    sign_latency = 0.0
+    count_request = 0
+    count_lock = threading.Lock()
+
+    def reply(self, body: object, status: int = 200):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    # 模拟延迟和节点出错，返回是否已经回复了错误
+    def simulate(self, latency: float) -> bool:
+        with StubHandler.count_lock:
+            StubHandler.count_request += 1
+        if latency:
+            time.sleep(latency)
+        if self.error_rate and random.random() < self.error_rate:
+            self.reply({"message": "stub error"}, 503)
+            return True
+        return False
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if url.path == "/stub/stats":
+            self.reply({"requests": StubHandler.count_request})
+            return
+        if self.simulate(self.latency):
+            return
+        if url.path == "/atomicassets/v1/assets":
+            self.reply(self.state.assets(params))
+        elif url.path == "/v2/history/get_actions":
+            self.reply({"actions": []})
+        elif url.path == "/v2/history/get_transaction":
+            block_time = self.state.transactions.get(params.get("id"))
+            if block_time:
+                self.reply({"executed": True, "trx_id": params["id"], "actions": [{"timestamp": block_time}]})
+            else:
+                self.reply({"executed": False}, 404)
+        else:
+            self.reply({"message": "not found"}, 404)
+
+    def do_POST(self):
+        post_data = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        path = urlparse(self.path).path
+        if path == "/stub/transact":
+            self.transact(post_data)
+            return
+        if self.simulate(self.latency):
+            return
+        if path == "/v1/chain/get_table_rows":
+            self.reply(self.state.table_rows(post_data))
+        elif path == "/v1/chain/get_currency_balance":
+            self.reply(["100.0000 FWF", "100.0000 FWG", "100.0000 FWW"])
+        elif path == "/v1/chain/get_account":
+            self.reply({"account_name": post_data["account_name"],
+                        "cpu_limit": {"used": 1000, "available": 99000, "max": 100000},
+                        "net_limit": {"used": 1000, "available": 99000, "max": 100000}})
+        elif path == "/v1/chain/get_info":
+            self.reply({"head_block_num": 1, "last_irreversible_block_num": 1,
+                        "head_block_time": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.000")})
+        else:
+            self.reply({"message": "not found"}, 404)
+
+    # 模拟的签名：直接修改模拟数据，返回与waxjs相同格式的结果
+    def transact(self, transaction: dict):
+        if self.simulate(self.sign_latency):
+            return
+        error = self.state.apply(transaction["actions"])
+        if error:
+            self.reply([False, error])
+            return
+        transaction_id = "{0:064x}".format(random.getrandbits(256))
+        block_time = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000")
+        self.state.transactions[transaction_id] = block_time
+        self.reply([True, {
+            "transaction_id": transaction_id,
+            "processed": {
+                "block_time": block_time,
+                "receipt": {"cpu_usage_us": 300 * len(transaction["actions"]), "net_usage_words": 16},
+            },
+        }])
+
+    def log_message(self, format, *args):
+        pass
+
+
+# 启动模拟服务，返回 (服务, 地址)
+def start(accounts: int, port: int = 0, latency: float = 0, error_rate: float = 0,
+          sign_latency: float = 0) -> Tuple[ThreadingHTTPServer, str]:
+    handler = type("Handler", (StubHandler,), {
+        "state": ChainState(accounts),
+        "latency": latency,
+        "error_rate": error_rate,
+        "sign_latency": sign_latency,
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://127.0.0.1:{0}".format(server.server_port)
+
+
+# 使用模拟服务签名
+class StubSigner(Signer):
+    def __init__(self, http: requests.Session, url: str):
+        self.http = http
+        self.url = url + "/stub/transact"
+
+    def transact(self, transaction: dict) -> Tuple[bool, object]:
+        try:
+            resp = self.http.post(self.url, json=transaction)
+        except requests.RequestException as e:
+            return False, str(e)
+        if resp.status_code != 200:
+            return False, resp.text
+        return tuple(fast_json.loads(resp.content))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--accounts", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0, help="每个请求的延迟(秒)")
+    parser.add_argument("--sign-latency", type=float, default=0, help="每次签名的延迟(秒)")
+    parser.add_argument("--error-rate", type=float, default=0, help="请求出错的比例")
+    args = parser.parse_args()
+    server, url = start(args.accounts, args.port, args.latency, args.error_rate, args.sign_latency)
+    print("模拟服务: {0}，账号 {1} ~ {2}".format(url, account_name(0), account_name(args.accounts - 1)))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
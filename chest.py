@@ -0,0 +1,85 @@
+# 箱子里的NFT：按页流式读取atomicassets的资产，由服务器按模板或分类筛选；
+# 并在本地缓存账号的库存，自己转出的资产(如喂鸡的大麦)直接从缓存中去掉，不必每次重新读取
+import threading
+import time
+from typing import Dict, List, Iterator, Callable, Iterable
+import requests
+import fast_json
+from res import Asset, create_asset
+from settings import cfg
+
+
+class ChestReader:
+    def __init__(self, http: requests.Session, url: str, account: str, log=None):
+        self.http = http
+        self.url = url
+        self.account = account
+        self.log = log
+
+    # 逐页读取原始json，用到哪页才请求哪页
+    def iter_raw(self, template_id: int = None, schema_name: str = None,
+                 template_blacklist: str = None) -> Iterator[dict]:
+        params = {
+            "collection_name": "farmersworld",
+            "owner": self.account,
+            "limit": cfg.chest_page_size,
+            "order": "asc",
+            "sort": "asset_id",
+        }
+        if template_id:
+            params["template_id"] = template_id
+        if schema_name:
+            params["schema_name"] = schema_name
+        if template_blacklist:
+            params["template_blacklist"] = template_blacklist
+        page = 1
+        while True:
+            params["page"] = page
+            resp = fast_json.decode(self.http.get(self.url, params=params), self.log, "assets page {0}".format(page))
+            assert resp["success"]
+            data = resp["data"]
+            yield from data
+            if len(data) < cfg.chest_page_size:
+                return
+            page += 1
+
+    def iter_assets(self, template_id: int = None, schema_name: str = None,
+                    template_blacklist: str = None) -> Iterator[Asset]:
+        for item in self.iter_raw(template_id, schema_name, template_blacklist):
+            yield create_asset(item)
+
+
+# 账号箱子中各模板资产的本地缓存
+class ChestInventory:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # template_id: 资产列表
+        self.assets: Dict[int, List[Asset]] = {}
+        self.loaded_at: Dict[int, float] = {}
+
+    # 返回缓存的副本，没有缓存或已过期则用load重新读取
+    def get(self, template_id: int, load: Callable[[], Iterable[Asset]]) -> List[Asset]:
+        with self.lock:
+            loaded_at = self.loaded_at.get(template_id, 0)
+            if time.time() - loaded_at < cfg.chest_cache_ttl.total_seconds():
+                return list(self.assets[template_id])
+        assets = list(load())
+        with self.lock:
+            self.assets[template_id] = assets
+            self.loaded_at[template_id] = time.time()
+        return list(assets)
+
+    # 自己转出了资产
+    def remove(self, asset_ids: List[str]):
+        asset_ids = set(asset_ids)
+        with self.lock:
+            for template_id, assets in self.assets.items():
+                self.assets[template_id] = [item for item in assets if item.asset_id not in asset_ids]
+
+    # 库存可能有外部变化，下次重新读取
+    def invalidate(self, template_id: int = None):
+        with self.lock:
+            if template_id is None:
+                self.loaded_at.clear()
+            else:
+                self.loaded_at.pop(template_id, None)
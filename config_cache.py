@@ -0,0 +1,100 @@
+# 游戏配置表（工具、农作物、会员卡）的本地缓存：进程内共用一份，落盘保存，过期后在后台刷新
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Callable
+from settings import cfg
+from logger import log
+
+# 缓存文件格式的版本，格式变化时旧缓存作废
+CACHE_VERSION = 1
+
+Tables = Dict[str, List[dict]]
+
+
+class ConfigCache:
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.tables: Tables = None
+        # 配置内容的摘要，内容不变时不必重新应用
+        self.digest: str = None
+        self.fetched_at: float = 0
+        self.refreshing = False
+
+    def is_fresh(self) -> bool:
+        return time.time() - self.fetched_at < cfg.config_cache_ttl.total_seconds()
+
+    def load_file(self) -> bool:
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, "r", encoding="utf8") as file:
+                data = json.load(file)
+                file.close()
+        except (OSError, ValueError) as e:
+            log.warning("读取配置缓存失败: {0}".format(e))
+            return False
+        if data.get("version") != CACHE_VERSION:
+            return False
+        self.tables = data["tables"]
+        self.digest = data["digest"]
+        self.fetched_at = data["fetched_at"]
+        return True
+
+    def save_file(self):
+        data = {
+            "version": CACHE_VERSION,
+            "digest": self.digest,
+            "fetched_at": self.fetched_at,
+            "tables": self.tables,
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf8") as file:
+            json.dump(data, file)
+            file.close()
+        os.replace(tmp_path, self.path)
+
+    # 更新缓存，返回内容是否有变化
+    def update(self, tables: Tables) -> bool:
+        digest = hashlib.sha256(json.dumps(tables, sort_keys=True).encode()).hexdigest()
+        changed = digest != self.digest
+        self.tables = tables
+        self.digest = digest
+        self.fetched_at = time.time()
+        self.save_file()
+        return changed
+
+    def refresh(self, fetch: Callable[[], Tables], apply: Callable[[Tables], None]):
+        try:
+            tables = fetch()
+            with self.lock:
+                if self.update(tables):
+                    log.info("游戏配置有更新")
+                    apply(tables)
+        except Exception as e:
+            log.warning("刷新游戏配置失败: {0}".format(e))
+        finally:
+            self.refreshing = False
+
+    # 获取配置并应用：已加载就直接返回，有缓存就用缓存，过期的在后台刷新，都没有才同步下载
+    # fetch: 从服务器下载配置表  apply: 把配置表应用到res中
+    def get(self, fetch: Callable[[], Tables], apply: Callable[[Tables], None]):
+        with self.lock:
+            if self.tables is None:
+                if self.load_file():
+                    log.info("使用本地缓存的游戏配置")
+                else:
+                    log.info("正在加载游戏配置")
+                    self.update(fetch())
+                apply(self.tables)
+            if self.is_fresh() or self.refreshing:
+                return
+            self.refreshing = True
+        threading.Thread(target=self.refresh, args=(fetch, apply), daemon=True).start()
+
+
+farming_config = ConfigCache(cfg.config_cache_path)
@@ -0,0 +1,368 @@
+# EOSIO底层工具：账户名编码、按ABI序列化、secp256k1签名，纯python实现，不依赖浏览器
+import hashlib
+import hmac
+import struct
+from datetime import datetime
+from typing import Dict, Tuple
+
+
+####################################################### name #######################################################
+
+def char_to_symbol(c: str) -> int:
+    if "a" <= c <= "z":
+        return ord(c) - ord("a") + 6
+    if "1" <= c <= "5":
+        return ord(c) - ord("1") + 1
+    return 0
+
+
+# 账户名转为uint64，链上按这个数值排序
+def name_to_int(name: str) -> int:
+    value = 0
+    for i in range(13):
+        c = char_to_symbol(name[i]) if i < len(name) else 0
+        if i < 12:
+            value |= (c & 0x1f) << (64 - 5 * (i + 1))
+        else:
+            value |= c & 0x0f
+    return value
+
+
+####################################################### ABI ########################################################
+
+class Writer:
+    def __init__(self):
+        self.buf = bytearray()
+
+    def varuint32(self, value: int):
+        while True:
+            b = value & 0x7f
+            value >>= 7
+            if value:
+                self.buf.append(b | 0x80)
+            else:
+                self.buf.append(b)
+                return
+
+    def bytes(self, data: bytes):
+        self.varuint32(len(data))
+        self.buf += data
+
+    def pack(self, fmt: str, value):
+        self.buf += struct.pack("<" + fmt, value)
+
+
+_int_types = {
+    "bool": "?", "int8": "b", "uint8": "B", "int16": "h", "uint16": "H",
+    "int32": "i", "uint32": "I", "int64": "q", "uint64": "Q",
+    "float32": "f", "float64": "d",
+}
+
+
+def _write_symbol(w: Writer, value: str):
+    precision, code = value.split(",")
+    w.pack("B", int(precision))
+    w.buf += code.encode().ljust(7, b"\0")
+
+
+def _write_asset(w: Writer, value: str):
+    amount, code = value.split(" ")
+    precision = len(amount.split(".")[1]) if "." in amount else 0
+    w.pack("q", int(amount.replace(".", "")))
+    _write_symbol(w, "{0},{1}".format(precision, code))
+
+
+def _write_time_point_sec(w: Writer, value):
+    if isinstance(value, str):
+        value = datetime.strptime(value.split(".")[0], "%Y-%m-%dT%H:%M:%S")
+        value = int((value - datetime(1970, 1, 1)).total_seconds())
+    w.pack("I", value)
+
+
+_builtin_writers = {
+    "name": lambda w, v: w.pack("Q", name_to_int(v)),
+    "string": lambda w, v: w.bytes(v.encode()),
+    "bytes": lambda w, v: w.bytes(bytes.fromhex(v)),
+    "varuint32": lambda w, v: w.varuint32(int(v)),
+    "checksum256": lambda w, v: w.buf.extend(bytes.fromhex(v)),
+    "symbol": _write_symbol,
+    "asset": _write_asset,
+    "time_point_sec": _write_time_point_sec,
+}
+
+
+class Abi:
+    def __init__(self, abi: dict):
+        self.types: Dict[str, str] = {item["new_type_name"]: item["type"] for item in abi.get("types", [])}
+        self.structs: Dict[str, dict] = {item["name"]: item for item in abi.get("structs", [])}
+        self.actions: Dict[str, str] = {item["name"]: item["type"] for item in abi.get("actions", [])}
+
+    def resolve(self, type_name: str) -> str:
+        while type_name in self.types:
+            type_name = self.types[type_name]
+        return type_name
+
+    def write(self, w: Writer, type_name: str, value):
+        type_name = self.resolve(type_name)
+        if type_name.endswith("[]"):
+            w.varuint32(len(value))
+            for item in value:
+                self.write(w, type_name[:-2], item)
+        elif type_name.endswith("?"):
+            w.pack("B", 0 if value is None else 1)
+            if value is not None:
+                self.write(w, type_name[:-1], value)
+        elif type_name in _int_types:
+            w.pack(_int_types[type_name], value if type_name.startswith("float") else int(value))
+        elif type_name in _builtin_writers:
+            _builtin_writers[type_name](w, value)
+        elif type_name in self.structs:
+            struct_def = self.structs[type_name]
+            if struct_def.get("base"):
+                self.write(w, struct_def["base"], value)
+            for field in struct_def["fields"]:
+                self.write(w, field["type"], value[field["name"]])
+        else:
+            raise ValueError("unsupported abi type: {0}".format(type_name))
+
+    # 序列化某个action的data
+    def pack_action_data(self, action_name: str, data: dict) -> bytes:
+        w = Writer()
+        self.write(w, self.actions[action_name], data)
+        return bytes(w.buf)
+
+
+# 序列化交易，actions中的data必须已经是序列化后的bytes
+def pack_transaction(trx: dict) -> bytes:
+    w = Writer()
+    w.pack("I", trx["expiration"])
+    w.pack("H", trx["ref_block_num"])
+    w.pack("I", trx["ref_block_prefix"])
+    w.varuint32(0)  # max_net_usage_words
+    w.pack("B", 0)  # max_cpu_usage_ms
+    w.varuint32(0)  # delay_sec
+    w.varuint32(0)  # context_free_actions
+    w.varuint32(len(trx["actions"]))
+    for action in trx["actions"]:
+        w.pack("Q", name_to_int(action["account"]))
+        w.pack("Q", name_to_int(action["name"]))
+        w.varuint32(len(action["authorization"]))
+        for auth in action["authorization"]:
+            w.pack("Q", name_to_int(auth["actor"]))
+            w.pack("Q", name_to_int(auth["permission"]))
+        w.bytes(action["data"])
+    w.varuint32(0)  # transaction_extensions
+    return bytes(w.buf)
+
+
+##################################################### secp256k1 ####################################################
+
+_P = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEFFFFFC2F
+_N = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+_G = (0x79BE667EF9DCBBAC55A06295CE870B07029BFCDB2DCE28D959F2815B16F81798,
+      0x483ADA7726A3C4655DA4FBFC0E1108A8FD17B448A68554199C47D08FFB10D4B8)
+
+
+def _point_add(a: Tuple[int, int], b: Tuple[int, int]) -> Tuple[int, int]:
+    if a is None:
+        return b
+    if b is None:
+        return a
+    if a[0] == b[0] and (a[1] + b[1]) % _P == 0:
+        return None
+    if a == b:
+        lam = 3 * a[0] * a[0] * pow(2 * a[1], -1, _P) % _P
+    else:
+        lam = (b[1] - a[1]) * pow(b[0] - a[0], -1, _P) % _P
+    x = (lam * lam - a[0] - b[0]) % _P
+    return x, (lam * (a[0] - x) - a[1]) % _P
+
+
+def _point_mul(k: int, point: Tuple[int, int] = _G) -> Tuple[int, int]:
+    result = None
+    while k:
+        if k & 1:
+            result = _point_add(result, point)
+        point = _point_add(point, point)
+        k >>= 1
+    return result
+
+
+# RFC6979确定性随机数，extra用于签名不规范时换一个k重签
+def _nonce_k(secret: int, digest: bytes, extra: int) -> int:
+    x = secret.to_bytes(32, "big")
+    h = digest if not extra else hashlib.sha256(digest + bytes(extra)).digest()
+    v = b"\x01" * 32
+    k = b"\x00" * 32
+    k = hmac.new(k, v + b"\x00" + x + h, hashlib.sha256).digest()
+    v = hmac.new(k, v, hashlib.sha256).digest()
+    k = hmac.new(k, v + b"\x01" + x + h, hashlib.sha256).digest()
+    v = hmac.new(k, v, hashlib.sha256).digest()
+    while True:
+        v = hmac.new(k, v, hashlib.sha256).digest()
+        candidate = int.from_bytes(v, "big")
+        if 1 <= candidate < _N:
+            return candidate
+        k = hmac.new(k, v + b"\x00", hashlib.sha256).digest()
+        v = hmac.new(k, v, hashlib.sha256).digest()
+
+
+# 链上只接受r和s都是32字节且最高位为0的签名
+def _is_canonical(sig: bytes) -> bool:
+    return not (sig[1] & 0x80) and not (sig[1] == 0 and not (sig[2] & 0x80)) \
+        and not (sig[33] & 0x80) and not (sig[33] == 0 and not (sig[34] & 0x80))
+
+
+# 对32字节的摘要签名，返回65字节的可恢复签名（header + r + s）
+def sign_digest(secret: int, digest: bytes) -> bytes:
+    z = int.from_bytes(digest, "big")
+    extra = 0
+    while True:
+        k = _nonce_k(secret, digest, extra)
+        extra += 1
+        point = _point_mul(k)
+        r = point[0] % _N
+        if r == 0:
+            continue
+        s = pow(k, -1, _N) * (z + r * secret) % _N
+        if s == 0:
+            continue
+        recid = (point[1] & 1) | (2 if point[0] >= _N else 0)
+        if s > _N // 2:
+            s = _N - s
+            recid ^= 1
+        sig = bytes([27 + 4 + recid]) + r.to_bytes(32, "big") + s.to_bytes(32, "big")
+        if _is_canonical(sig):
+            return sig
+
+
+####################################################### keys #######################################################
+
+_B58 = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+
+def b58encode(data: bytes) -> str:
+    num = int.from_bytes(data, "big")
+    out = ""
+    while num:
+        num, rem = divmod(num, 58)
+        out = _B58[rem] + out
+    pad = len(data) - len(data.lstrip(b"\0"))
+    return "1" * pad + out
+
+
+def b58decode(text: str) -> bytes:
+    num = 0
+    for c in text:
+        num = num * 58 + _B58.index(c)
+    pad = len(text) - len(text.lstrip("1"))
+    body = num.to_bytes((num.bit_length() + 7) // 8, "big") if num else b""
+    return b"\0" * pad + body
+
+
+def ripemd160(data: bytes) -> bytes:
+    try:
+        return hashlib.new("ripemd160", data).digest()
+    except ValueError:
+        # 部分OpenSSL 3环境没有ripemd160
+        return _ripemd160(data)
+
+
+# 私钥支持传统WIF格式(5开头)和PVT_K1_格式
+def decode_private_key(key: str) -> int:
+    if key.startswith("PVT_K1_"):
+        raw = b58decode(key[len("PVT_K1_"):])
+        secret, checksum = raw[:32], raw[32:]
+        if ripemd160(secret + b"K1")[:4] != checksum:
+            raise ValueError("invalid private key checksum")
+        return int.from_bytes(secret, "big")
+    raw = b58decode(key)
+    body, checksum = raw[:-4], raw[-4:]
+    if hashlib.sha256(hashlib.sha256(body).digest()).digest()[:4] != checksum or body[0] != 0x80:
+        raise ValueError("invalid private key checksum")
+    return int.from_bytes(body[1:33], "big")
+
+
+def public_key(secret: int) -> str:
+    x, y = _point_mul(secret)
+    compressed = bytes([2 + (y & 1)]) + x.to_bytes(32, "big")
+    return "PUB_K1_" + b58encode(compressed + ripemd160(compressed + b"K1")[:4])
+
+
+def encode_signature(sig: bytes) -> str:
+    return "SIG_K1_" + b58encode(sig + ripemd160(sig + b"K1")[:4])
+
+
+# 对序列化后的交易签名，返回SIG_K1_格式的签名
+def sign_transaction(secret: int, chain_id: str, packed_trx: bytes) -> str:
+    digest = hashlib.sha256(bytes.fromhex(chain_id) + packed_trx + b"\0" * 32).digest()
+    return encode_signature(sign_digest(secret, digest))
+
+
+##################################################### ripemd160 ####################################################
+
+_RMD_R1 = [
+    0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15,
+    7, 4, 13, 1, 10, 6, 15, 3, 12, 0, 9, 5, 2, 14, 11, 8,
+    3, 10, 14, 4, 9, 15, 8, 1, 2, 7, 0, 6, 13, 11, 5, 12,
+    1, 9, 11, 10, 0, 8, 12, 4, 13, 3, 7, 15, 14, 5, 6, 2,
+    4, 0, 5, 9, 7, 12, 2, 10, 14, 1, 3, 8, 11, 6, 15, 13]
+_RMD_R2 = [
+    5, 14, 7, 0, 9, 2, 11, 4, 13, 6, 15, 8, 1, 10, 3, 12,
+    6, 11, 3, 7, 0, 13, 5, 10, 14, 15, 8, 12, 4, 9, 1, 2,
+    15, 5, 1, 3, 7, 14, 6, 9, 11, 8, 12, 2, 10, 0, 4, 13,
+    8, 6, 4, 1, 3, 11, 15, 0, 5, 12, 2, 13, 9, 7, 10, 14,
+    12, 15, 10, 4, 1, 5, 8, 7, 6, 2, 13, 14, 0, 3, 9, 11]
+_RMD_S1 = [
+    11, 14, 15, 12, 5, 8, 7, 9, 11, 13, 14, 15, 6, 7, 9, 8,
+    7, 6, 8, 13, 11, 9, 7, 15, 7, 12, 15, 9, 11, 7, 13, 12,
+    11, 13, 6, 7, 14, 9, 13, 15, 14, 8, 13, 6, 5, 12, 7, 5,
+    11, 12, 14, 15, 14, 15, 9, 8, 9, 14, 5, 6, 8, 6, 5, 12,
+    9, 15, 5, 11, 6, 8, 13, 12, 5, 12, 13, 14, 11, 8, 5, 6]
+_RMD_S2 = [
+    8, 9, 9, 11, 13, 15, 15, 5, 7, 7, 8, 11, 14, 14, 12, 6,
+    9, 13, 15, 7, 12, 8, 9, 11, 7, 7, 12, 7, 6, 15, 13, 11,
+    9, 7, 15, 11, 8, 6, 6, 14, 12, 13, 5, 14, 13, 13, 7, 5,
+    15, 5, 8, 11, 14, 14, 6, 14, 6, 9, 12, 9, 12, 5, 15, 8,
+    8, 5, 12, 9, 12, 5, 14, 6, 8, 13, 6, 5, 15, 13, 11, 11]
+_RMD_K1 = [0x00000000, 0x5A827999, 0x6ED9EBA1, 0x8F1BBCDC, 0xA953FD4E]
+_RMD_K2 = [0x50A28BE6, 0x5C4DD124, 0x6D703EF3, 0x7A6D76E9, 0x00000000]
+_M32 = 0xFFFFFFFF
+
+
+def _rmd_f(j: int, x: int, y: int, z: int) -> int:
+    if j == 0:
+        return x ^ y ^ z
+    if j == 1:
+        return (x & y) | (~x & z)
+    if j == 2:
+        return (x | ~y) ^ z
+    if j == 3:
+        return (x & z) | (y & ~z)
+    return x ^ (y | ~z)
+
+
+def _rol(x: int, n: int) -> int:
+    return ((x << n) | (x >> (32 - n))) & _M32
+
+
+def _ripemd160(data: bytes) -> bytes:
+    h = [0x67452301, 0xEFCDAB89, 0x98BADCFE, 0x10325476, 0xC3D2E1F0]
+    msg = data + b"\x80" + b"\0" * ((55 - len(data)) % 64) + struct.pack("<Q", len(data) * 8)
+    for offset in range(0, len(msg), 64):
+        x = struct.unpack("<16I", msg[offset:offset + 64])
+        al, bl, cl, dl, el = h
+        ar, br, cr, dr, er = h
+        for j in range(80):
+            rnd = j >> 4
+            t = _rol((al + _rmd_f(rnd, bl, cl, dl) + x[_RMD_R1[j]] + _RMD_K1[rnd]) & _M32, _RMD_S1[j]) + el
+            al, el, dl, cl, bl = el, dl, _rol(cl, 10), bl, t & _M32
+            t = _rol((ar + _rmd_f(4 - rnd, br, cr, dr) + x[_RMD_R2[j]] + _RMD_K2[rnd]) & _M32, _RMD_S2[j]) + er
+            ar, er, dr, cr, br = er, dr, _rol(cr, 10), br, t & _M32
+        t = (h[1] + cl + dr) & _M32
+        h[1] = (h[2] + dl + er) & _M32
+        h[2] = (h[3] + el + ar) & _M32
+        h[3] = (h[4] + al + br) & _M32
+        h[4] = (h[0] + bl + cr) & _M32
+        h[0] = t
+    return struct.pack("<5I", *h)
@@ -0,0 +1,30 @@
+# 程序中用到的各种异常
+
+
+class FarmerException(Exception):
+    pass
+
+
+class CookieExpireException(FarmerException):
+    pass
+
+
+# 调用智能合约出错，此时应停止并检查日志，不宜反复重试
+class TransactException(FarmerException):
+    # 有的智能合约错误可以重试,-1为无限重试
+    def __init__(self, msg, retry=True, max_retry_times: int = -1):
+        super().__init__(msg)
+        self.retry = retry
+        self.max_retry_times = max_retry_times
+
+
+# 账号CPU/NET不足，操作推迟到资源恢复后再提交
+class ResourceException(TransactException):
+    def __init__(self, msg, wait_seconds: float):
+        super().__init__(msg)
+        self.wait_seconds = wait_seconds
+
+
+# 遇到不可恢复的错误 ,终止程序
+class StopException(FarmerException):
+    pass
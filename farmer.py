@@ -6,46 +6,94 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import WebDriverException
 import tenacity
-from tenacity import stop_after_attempt, wait_fixed, retry_if_exception_type, RetryCallState
+from tenacity import retry_if_exception_type, RetryCallState
 import logging
 import requests
 from requests.exceptions import RequestException
 import functools
+from concurrent.futures import Future, InvalidStateError
 from decimal import Decimal
-from typing import List, Dict
+from typing import List, Dict, Tuple, Callable
 import base64
+import json
 from pprint import pprint
 import logger
 import utils
 from utils import plat
-from settings import user_param
+from settings import user_param, UserParam
 import res
-from res import Building, Resoure, Animal, Asset, Farming, Crop, NFT, Axe, Tool, Token, Chicken, FishingRod, MBS
+import sign_page
+import fast_json
+from res import Building, Resoure, Animal, Asset, Farming, Crop, NFT, Tool, Token, Chicken, MBS
 from datetime import datetime, timedelta
 from settings import cfg
 import os
+from contextlib import contextmanager
 from logger import log
+from exceptions import FarmerException, CookieExpireException, TransactException, StopException, ResourceException
+from batch import TransactionBatcher
+from planner import EnergyPlanner, PlannedClaim, repair_cost, expected_yield
+from scheduler import Scheduler
+from signer import Signer, SeleniumSigner, KeySigner
+from async_reader import AsyncTableReader
+from rpc_pool import EndpointPool
+from ratelimit import get_limiter, feedback, SIGNER
+from retry import classify, backoff, should_retry, wait_for_error, stop_for_error, retry_stats, CPU, NET
+from resources import ResourceMonitor
+from receipts import ReceiptTracker
+from config_cache import farming_config
+from chest import ChestReader, ChestInventory
+from state import AccountState, HistoryPoller, CHEST
+from metrics import metrics
+
+
+# 创建带重试的http会话，多个账号可以共用同一个会话及其连接池
+def create_http_session(proxy: str = None, before_sleep=None, pool_size: int = 10) -> requests.Session:
+    http = requests.Session()
+    http.trust_env = False
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    http.mount("http://", adapter)
+    http.mount("https://", adapter)
+    request = functools.partial(http.request, timeout=30)
+
+    # 所有请求都经过所在节点的限速器，并按应答状态调整速率
+    def limited_request(method, url, *args, **kwargs):
+        get_limiter(url).wait()
+        retry_stats.attempt("http")
+        resp = request(method, url, *args, **kwargs)
+        feedback(url, resp.status_code, resp.headers)
+        return resp
 
-class FarmerException(Exception):
-    pass
-
+    http.request = limited_request
+    if proxy:
+        http.proxies = {
+            "http": "http://{0}".format(proxy),
+            "https": "http://{0}".format(proxy),
+        }
+    # 按错误类型决定重试等待时间和次数
+    def before_retry(state: RetryCallState):
+        retry_stats.retry("http", classify(state.outcome.exception()))
+        if before_sleep:
+            before_sleep(state)
 
-class CookieExpireException(FarmerException):
-    pass
+    http_retry_wrapper = tenacity.retry(wait=wait_for_error, stop=stop_for_error,
+                                        retry=retry_if_exception_type(RequestException),
+                                        before_sleep=before_retry, reraise=True)
 
+    def counted(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            retry_stats.request("http")
+            return func(*args, **kwargs)
+        return wrapper
 
-# 调用智能合约出错，此时应停止并检查日志，不宜反复重试
-class TransactException(FarmerException):
-    # 有的智能合约错误可以重试,-1为无限重试
-    def __init__(self, msg, retry=True, max_retry_times: int = -1):
-        super().__init__(msg)
-        self.retry = retry
-        self.max_retry_times = max_retry_times
+    http.get = counted(http_retry_wrapper(http.get))
+    http.post = counted(http_retry_wrapper(http.post))
+    return http
 
 
-# 遇到不可恢复的错误 ,终止程序
-class StopException(FarmerException):
-    pass
+# Network.setCookie接受的cookie字段，Network.getCookies返回的其它字段需要去掉
+cookie_fields = ("name", "value", "domain", "path", "secure", "httpOnly", "sameSite", "expires")
 
 
 class Status:
@@ -54,24 +102,41 @@ class Status:
 
 
 class Farmer:
-    # wax rpc
-    url_rpc = "https://api.wax.alohaeos.com/v1/chain/"
-    url_table_row = url_rpc + "get_table_rows"
+    # wax rpc节点池，所有账号共用
+    rpc_pool = EndpointPool(cfg.rpc_endpoints)
     # 资产API
     url_assets = "https://wax.api.atomicassets.io/atomicassets/v1/assets"
     waxjs: str = None
+    # base64编码后的waxjs，每次注入时不必重新编码
+    waxjs_b64: str = None
     myjs: str = None
     chrome_data_dir = os.path.abspath(cfg.chrome_data_dir)
-
-    def __init__(self):
+    # 子系统对应的数据表及索引
+    subsystem_tables = {
+        "mbs": ("mbs", 2),
+        "build": ("buildings", 2),
+        "plant": ("crops", 2),
+        "chicken": ("animals", 2),
+        "mining": ("tools", 2),
+    }
+
+    def __init__(self, param: UserParam = None):
+        # 本账号的配置参数
+        self.user_param: UserParam = param or user_param
         self.wax_account: str = None
         self.login_name: str = None
         self.password: str = None
         self.driver: webdriver.Chrome = None
+        # 浏览器是否已经通过CDP注册了waxjs
+        self.waxjs_registered = False
+        # 签署交易的后端
+        self.signer: Signer = None
         self.proxy: str = None
         self.http: requests.Session = None
-        self.cookies: List[dict] = None
-        self.log: logging.LoggerAdapter = log
+        self.cookies: dict = None
+        self.log: logging.LoggerAdapter = logging.LoggerAdapter(log.logger, {"tag": "global"})
+        # 多账号运行时共用的浏览器池，为空则使用自己的浏览器
+        self.browser_pool = None
         # 下一次可以操作东西的时间
         self.next_operate_time: datetime = datetime.max
         # 下一次扫描时间
@@ -87,80 +152,204 @@ class Farmer:
         # 本轮开始时的资源数量
         self.resoure: Resoure = None
         self.token: Token = None
+        # 本轮扫描预取的数据表 {表名: 响应json}
+        self.table_cache: Dict[str, dict] = {}
+        # 失败后等待重试的操作 {(动作名, 资产ID): 已重试次数}
+        self.retry_attempts: Dict[Tuple[str, str], int] = {}
+        # 本地推算的账号状态，减少全量读取数据表
+        self.state = AccountState()
+        self.history: HistoryPoller = None
+        # 箱子里的NFT及其本地缓存
+        self.chest: ChestReader = None
+        self.inventory = ChestInventory()
+        # 本轮扫描中可操作的东西，扫描结束后统一安排能量和修理
+        self.planner = EnergyPlanner()
+        # 账号CPU/NET监控，提交前检查资源是否够用
+        self.resources: ResourceMonitor = None
+        # 已提交交易的上链确认
+        self.receipts: ReceiptTracker = None
+        # 本轮扫描中待提交的操作，扫描结束后批量提交
+        self.batcher = TransactionBatcher(self.wax_submit, self.log, poll=self.poll_signer)
+        # 各子系统下一次可操作的时间
+        self.scheduler = Scheduler()
 
     def close(self):
+        if self.browser_pool:
+            self.browser_pool.discard(self)
         if self.driver:
             self.log.info("稍等，程序正在退出")
+            self.close_browser()
+
+    def close_browser(self):
+        if self.driver:
+            metrics.discard("farmer_browser_rss_bytes", browser=self.driver.session_id[:8])
             self.driver.quit()
+            self.driver = None
+            self.waxjs_registered = False
 
     def init(self):
+        self.init_http()
+        self.init_signer()
+        if self.signer.needs_browser:
+            self.init_browser()
+
+    def init_signer(self):
+        if self.user_param.signer == "key":
+            self.log.info("使用本地私钥签名，不启动浏览器")
+            self.signer = KeySigner(self.http, self.rpc_pool, self.user_param.private_key)
+        else:
+            self.signer = SeleniumSigner(self)
+
+    # http: 多账号运行时共用的会话，为空则自己创建
+    def init_http(self, http: requests.Session = None):
         self.log.extra["tag"] = self.wax_account
+        self.http = http or create_http_session(self.proxy, self.log_retry)
+        self.chest = ChestReader(self.http, self.url_assets, self.wax_account, self.log)
+        if cfg.resource_monitor:
+            self.resources = ResourceMonitor(self.wax_account, self.wax_get_account, self.log)
+        if cfg.transaction_status_url:
+            self.receipts = ReceiptTracker(self.http, cfg.transaction_status_url, self.wax_account, self.log)
+        if cfg.state_tracking and cfg.history_url:
+            self.history = HistoryPoller(self.http, cfg.history_url, self.wax_account)
+
+    # data_dir: 浏览器的用户数据目录，为空则使用本账号的目录
+    def init_browser(self, data_dir: str = None):
         options = webdriver.ChromeOptions()
-        # options.add_argument("--headless")
-        # options.add_argument("--no-sandbox")
+        if self.user_param.on_server:
+            self.server_options(options)
         options.add_argument("--disable-extensions")
         options.add_argument("--log-level=3")
         options.add_argument("--disable-logging")
-        data_dir = os.path.join(Farmer.chrome_data_dir, self.wax_account)
+        data_dir = data_dir or os.path.join(Farmer.chrome_data_dir, self.wax_account)
         options.add_argument("--user-data-dir={0}".format(data_dir))
         if self.proxy:
             options.add_argument("--proxy-server={0}".format(self.proxy))
         self.driver = webdriver.Chrome(plat.driver_path, options=options)
         self.driver.implicitly_wait(60)
         self.driver.set_script_timeout(60)
-        self.http = requests.Session()
-        self.http.trust_env = False
-        self.http.request = functools.partial(self.http.request, timeout=30)
-        if self.proxy:
-            self.http.proxies = {
-                "http": "http://{0}".format(self.proxy),
-                "https": "http://{0}".format(self.proxy),
-            }
-        http_retry_wrapper = tenacity.retry(wait=wait_fixed(cfg.req_interval), stop=stop_after_attempt(5),
-                                            retry=retry_if_exception_type(RequestException),
-                                            before_sleep=self.log_retry, reraise=True)
-        self.http.get = http_retry_wrapper(self.http.get)
-        self.http.post = http_retry_wrapper(self.http.post)
+        if self.user_param.on_server:
+            self.block_urls()
+        self.register_waxjs()
+
+    # 影响浏览器启动参数的设置，浏览器池只把浏览器借给这些设置相同的账号
+    def browser_options(self) -> Tuple:
+        return self.proxy, bool(self.user_param.on_server)
+
+    # 服务器模式：无界面运行，关闭图片、GPU、网络字体和后台网络请求
+    @staticmethod
+    def server_options(options: webdriver.ChromeOptions):
+        options.add_argument("--headless=new")
+        options.add_argument("--no-sandbox")
+        options.add_argument("--disable-gpu")
+        options.add_argument("--disable-dev-shm-usage")
+        options.add_argument("--disable-remote-fonts")
+        options.add_argument("--disable-background-networking")
+        options.add_argument("--disable-component-update")
+        options.add_argument("--disable-default-apps")
+        options.add_argument("--disable-sync")
+        options.add_argument("--mute-audio")
+        options.add_argument("--blink-settings=imagesEnabled=false")
+        options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+
+    # 服务器模式：不加载签名用不到的资源
+    def block_urls(self):
+        try:
+            self.driver.execute_cdp_cmd("Network.enable", {})
+            self.driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": cfg.blocked_urls})
+        except WebDriverException as e:
+            self.log.warning("设置浏览器屏蔽的资源失败: {0}".format(e))
+
+    # 浏览器(chromedriver及其启动的所有Chrome进程)占用的物理内存(字节)
+    def browser_rss(self) -> int:
+        if not self.driver:
+            return 0
+        return utils.process_tree_rss(self.driver.service.process.pid)
+
+    # 借用浏览器签署交易，没有浏览器池时直接使用自己的浏览器
+    @contextmanager
+    def lease_browser(self):
+        if not self.browser_pool or not self.signer.needs_browser:
+            yield self.driver
+            self.report_browser_rss()
+            return
+        self.browser_pool.checkout(self)
+        try:
+            yield self.driver
+        finally:
+            self.report_browser_rss()
+            self.browser_pool.checkin(self)
+
+    def report_browser_rss(self):
+        if not self.driver:
+            return
+        try:
+            rss = self.browser_rss()
+        except AttributeError:
+            return
+        browser = self.driver.session_id[:8]
+        metrics.set("farmer_browser_rss_bytes", rss, browser=browser)
+        self.log.debug("浏览器占用内存: {0:.1f}MB".format(rss / 1024 / 1024))
 
     def inject_waxjs(self):
-        # 如果已经注入过就不再注入了
-        if self.driver.execute_script("return window.mywax != undefined;"):
-            return True
+        with metrics.timer("farmer_inject_waxjs_seconds", account=self.wax_account):
+            return self.do_inject_waxjs()
 
+    @staticmethod
+    def load_js():
         if not Farmer.waxjs:
             with open("waxjs.js", "r") as file:
                 Farmer.waxjs = file.read()
                 file.close()
-                Farmer.waxjs = base64.b64encode(Farmer.waxjs.encode()).decode()
+            Farmer.waxjs_b64 = base64.b64encode(Farmer.waxjs.encode()).decode()
         if not Farmer.myjs:
             with open("inject.js", "r") as file:
                 Farmer.myjs = file.read()
                 file.close()
 
+    # 通过CDP注册waxjs，浏览器每次打开或刷新页面时自动执行，签名前不必再检查和注入
+    def register_waxjs(self):
+        Farmer.load_js()
+        source = "if (window.top === window) {{\nwindow.wax_rpc_endpoint = {0};\n{1}\n{2}\n}}".format(
+            json.dumps(self.rpc_pool.choose().url), Farmer.waxjs, Farmer.myjs)
+        try:
+            self.driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": source})
+            self.waxjs_registered = True
+        except WebDriverException as e:
+            self.log.warning("注册waxjs失败，改为每次签名前检查注入: {0}".format(e))
+
+    def do_inject_waxjs(self):
+        if self.waxjs_registered:
+            return True
+        # 如果已经注入过就不再注入了
+        if self.driver.execute_script("return window.mywax != undefined;"):
+            return True
+
+        Farmer.load_js()
         code = "var s = document.createElement('script');"
         code += "s.type = 'text/javascript';"
-        code += "s.text = atob('{0}');".format(Farmer.waxjs)
+        code += "s.text = atob('{0}');".format(Farmer.waxjs_b64)
         code += "document.head.appendChild(s);"
         self.driver.execute_script(code)
+        # waxjs使用节点池中当前最快的节点
+        self.driver.execute_script("window.wax_rpc_endpoint = arguments[0];", self.rpc_pool.choose().url)
         self.driver.execute_script(Farmer.myjs)
         return True
 
     def start(self):
+        if self.signer.needs_browser:
+            self.login()
+        # 从服务器获取游戏参数
+        self.load_farming_config()
+
+    # 在浏览器中登录游戏和WAX云钱包
+    def login(self):
         self.log.info("启动浏览器")
+        if cfg.sign_only and (self.cookies or self.may_cache_login()):
+            self.login_sign_page()
+            return
         if self.cookies:
             self.log.info("使用预设的cookie自动登录")
-            cookies = self.cookies["cookies"]
-            key_cookie = {}
-            for item in cookies:
-                if item.get("domain") == "all-access.wax.io":
-                    key_cookie = item
-                    break
-            if not key_cookie:
-                raise CookieExpireException("not find cookie domain as all-access.wax.io")
-            ret = self.driver.execute_cdp_cmd("Network.setCookie", key_cookie)
-            self.log.info("Network.setCookie: {0}".format(ret))
-            if not ret["success"]:
-                raise CookieExpireException("Network.setCookie error")
+            self.set_wax_cookie()
         self.driver.get("https://play.farmersworld.io/")
         # 等待页面加载完毕
         elem = self.driver.find_element(By.ID, "RPC-Endpoint")
@@ -168,6 +357,8 @@ class Farmer:
         wait_seconds = 60
         if self.may_cache_login():
             self.log.info("使用Cache自动登录")
+        elif self.user_param.on_server:
+            raise CookieExpireException("服务器模式下无法手动登录，请预设cookie，或先在非服务器模式下登录一次")
         else:
             wait_seconds = 600
             self.log.info("请在弹出的窗口中手动登录账号")
@@ -182,17 +373,64 @@ class Farmer:
             EC.presence_of_element_located((By.XPATH, "//img[@class='navbar-group--icon' and @alt='Map']")))
         # self.driver.find_element(By.XPATH, "//img[@class='navbar-group--icon' and @alt='Map']")
         self.log.info("登录成功,稍等...")
-        time.sleep(cfg.req_interval)
+        time.sleep(cfg.login_wait)
+        self.wax_login()
+
+    # 打开本地的签名页面，用cookie自动登录WAX云钱包，只有手动登录时才需要打开游戏页面
+    def login_sign_page(self):
+        if self.cookies:
+            self.set_wax_cookie()
+        self.log.info("打开签名页面")
+        self.driver.get(sign_page.url())
+        self.wax_login()
+        if not self.driver.execute_script("return window.mywax.userAccount;"):
+            raise CookieExpireException("cookie失效")
+        self.log.info("登录成功")
+
+    # 在页面中登录WAX云钱包，并确认登录的是本账号
+    def wax_login(self):
         self.inject_waxjs()
         ret = self.driver.execute_script("return window.wax_login();")
         self.log.info("window.wax_login(): {0}".format(ret))
         if not ret[0]:
             raise CookieExpireException("cookie失效")
+        account = self.driver.execute_script("return window.mywax.userAccount;")
+        if account and account != self.wax_account:
+            raise CookieExpireException("WAX云钱包登录的账号是{0}".format(account))
+
+    # 设置all-access.wax.io的cookie，浏览器中的WAX云钱包就登录为本账号
+    def set_wax_cookie(self):
+        key_cookies = [item for item in self.cookies["cookies"] if item.get("domain") == "all-access.wax.io"]
+        if not key_cookies:
+            raise CookieExpireException("not find cookie domain as all-access.wax.io")
+        for item in key_cookies:
+            cookie = {k: v for k, v in item.items() if k in cookie_fields}
+            ret = self.driver.execute_cdp_cmd("Network.setCookie", cookie)
+            self.log.info("Network.setCookie: {0}".format(ret))
+            if not ret["success"]:
+                raise CookieExpireException("Network.setCookie error")
 
-        # 从服务器获取游戏参数
-        self.log.info("正在加载游戏配置")
-        self.init_farming_config()
-        time.sleep(cfg.req_interval)
+    # 删除浏览器中其它账号留下的all-access.wax.io的cookie
+    def clear_wax_cookie(self):
+        cookies = self.driver.execute_cdp_cmd("Network.getCookies", {"urls": ["https://all-access.wax.io"]})
+        for item in cookies["cookies"]:
+            self.driver.execute_cdp_cmd("Network.deleteCookies", {"name": item["name"], "domain": item["domain"]})
+
+    # 在浏览器池的浏览器中切换到本账号：有cookie就替换cookie后刷新页面，否则走完整的登录流程并记下cookie
+    def switch_account(self):
+        self.clear_wax_cookie()
+        if not self.cookies or not self.driver.current_url.startswith("http"):
+            self.login()
+            self.cookies = self.driver.execute_cdp_cmd("Network.getCookies", {"urls": ["https://all-access.wax.io"]})
+            return
+        self.log.info("切换浏览器中的WAX云钱包账号")
+        self.set_wax_cookie()
+        self.driver.refresh()
+        self.wax_login()
+
+    # 游戏配置是所有账号共用的，优先使用进程内和本地缓存的配置，过期了在后台刷新
+    def load_farming_config(self):
+        farming_config.get(self.fetch_farming_config, res.init_farming_config)
 
     def may_cache_login(self):
         cookies = self.driver.execute_cdp_cmd("Network.getCookies", {"urls": ["https://all-access.wax.io"]})
@@ -204,7 +442,8 @@ class Farmer:
     def log_retry(self, state: RetryCallState):
         exp = state.outcome.exception()
         if isinstance(exp, RequestException):
-            self.log.info("网络错误: {0}".format(exp))
+            metrics.inc("farmer_http_retries_total", account=self.wax_account)
+            self.log.info("网络错误({0}): {1}".format(classify(exp), exp))
             self.log.info("正在重试: [{0}]".format(state.attempt_number))
 
     def table_row_template(self) -> dict:
@@ -223,14 +462,94 @@ class Farmer:
         }
         return post_data
 
+    def table_request(self, table: str, index_position: int) -> Tuple[str, dict]:
+        post_data = self.table_row_template()
+        post_data["table"] = table
+        post_data["index_position"] = index_position
+        return "get_table_rows", post_data
+
+    # 查询本账号的数据表，优先使用本轮预取的结果，其次是本地推算的状态
+    def get_table_rows(self, table: str, index_position: int) -> List[dict]:
+        resp = self.table_cache.pop(table, None)
+        if resp is None and cfg.state_tracking:
+            resp = self.state.fresh(table)
+            if resp is not None:
+                self.log.debug("使用本地状态: {0}".format(table))
+                return resp["rows"]
+        if resp is None:
+            path, post_data = self.table_request(table, index_position)
+            resp = self.rpc_pool.post(self.http, path, post_data)
+            resp = fast_json.decode(resp, self.log, "get_table_rows {0}".format(table))
+        self.state.store(table, resp)
+        return resp["rows"]
+
+    # 本地状态可用的表不必读取
+    def need_read(self, table: str) -> bool:
+        return table not in self.table_cache and (not cfg.state_tracking or self.state.fresh(table) is None)
+
+    # 检查链上操作记录，有外部变化的表下次重新读取
+    def poll_history(self):
+        if self.history:
+            self.history.poll(self.state)
+
+    # 根据成功的交易推算作物的新状态，不必重新读取数据表
+    def update_state(self, item: Farming, result: dict):
+        table = self.subsystem_tables[self.subsystem_of(item)][0]
+        charge_time = getattr(item, "charge_time", None)
+        if not charge_time:
+            # 不知道下一次可操作时间，只能重新读取
+            self.state.mark_dirty(table)
+            return
+        claim_time = utils.block_time(result)
+
+        def update(row: dict):
+            row["next_availability"] = int((claim_time + charge_time).timestamp())
+            if isinstance(item, Tool):
+                row["current_durability"] -= item.durability_consumed
+            elif isinstance(item, Crop):
+                row["times_claimed"] = row.get("times_claimed", 0) + 1
+                row["last_claimed"] = int(claim_time.timestamp())
+                # 最后一次耕作后就收获了
+                return row["times_claimed"] < item.required_claims
+
+        self.state.update_row(table, item.asset_id, update)
+
+    # 本轮要扫描的数据表
+    def tables_of(self, subsystems: List[str]) -> List[str]:
+        return ["accounts"] + [self.subsystem_tables[name][0] for name in subsystems]
+
+    # 并发预取本轮要扫描的所有数据表，多账号批量读取时已经预先放入的表不再读取
+    def prefetch(self, subsystems: List[str]):
+        requests = {}
+        if "balance" not in self.table_cache:
+            requests["balance"] = self.balance_request()
+        for name in subsystems:
+            table, index_position = self.subsystem_tables[name]
+            if self.need_read(table):
+                requests[table] = self.table_request(table, index_position)
+        if "accounts" not in self.table_cache:
+            requests["accounts"] = self.table_request("accounts", 1)
+        if not cfg.async_read:
+            return
+        ep = self.rpc_pool.choose()
+        requests = {key: (self.rpc_pool.url(ep, path), post_data) for key, (path, post_data) in requests.items()}
+        try:
+            reader = AsyncTableReader(self.proxy, observer=self.rpc_pool.record_url)
+            self.table_cache.update(reader.read(requests))
+        except Exception as e:
+            self.log.warning("并发读取数据失败，改为逐个读取: {0}".format(e))
+
+    def sleep(self, seconds: float, reason: str):
+        metrics.observe("farmer_sleep_seconds", seconds, account=self.wax_account, reason=reason)
+        time.sleep(seconds)
+
     # 从服务器获取各种工具和作物的参数
-    def init_farming_config(self):
-        # 工具
+    def fetch_farming_config(self) -> Dict[str, List[dict]]:
         post_data = {
             "json": True,
             "code": "farmersworld",
             "scope": "farmersworld",
-            "table": "toolconfs",
+            "table": None,  # 覆写
             "lower_bound": "",
             "upper_bound": "",
             "index_position": 1,
@@ -239,39 +558,25 @@ class Farmer:
             "reverse": False,
             "show_payer": False
         }
-        resp = self.http.post(self.url_table_row, json=post_data)
-        self.log.debug("get tools config:{0}".format(resp.text))
-        resp = resp.json()
-        res.init_tool_config(resp["rows"])
-        time.sleep(cfg.req_interval)
-
-        # 农作物
-        post_data["table"] = "cropconf"
-        resp = self.http.post(self.url_table_row, json=post_data)
-        self.log.debug("get crop config:{0}".format(resp.text))
-        resp = resp.json()
-        res.init_crop_config(resp["rows"])
-
-        # 会员卡
-        post_data["table"] = "mbsconf"
-        resp = self.http.post(self.url_table_row, json=post_data)
-        self.log.debug("get mbs config:{0}".format(resp.text))
-        resp = resp.json()
-        res.init_mbs_config(resp["rows"])
+        tables = {}
+        # 工具 农作物 会员卡
+        for table in ["toolconfs", "cropconf", "mbsconf"]:
+            post_data["table"] = table
+            resp = self.rpc_pool.post(self.http, "get_table_rows", post_data)
+            tables[table] = fast_json.decode(resp, self.log, "get {0}".format(table))["rows"]
+        return tables
 
     # 获取游戏中的三种资源数量和能量值
     def get_resource(self) -> Resoure:
-        post_data = self.table_row_template()
-        post_data["table"] = "accounts"
-        post_data["index_position"] = 1
-
-        resp = self.http.post(self.url_table_row, json=post_data)
-        self.log.debug("get_table_rows:{0}".format(resp.text))
-        resp = resp.json()
+        rows = self.get_table_rows("accounts", 1)
         resource = Resoure()
-        resource.energy = Decimal(resp["rows"][0]["energy"])
-        resource.max_energy = Decimal(resp["rows"][0]["max_energy"])
-        balances: List[str] = resp["rows"][0]["balances"]
+        resource.energy = Decimal(rows[0]["energy"])
+        resource.max_energy = Decimal(rows[0]["max_energy"])
+        # 没有某种资源时，balances中不会有这一项
+        resource.gold = Decimal(0)
+        resource.wood = Decimal(0)
+        resource.food = Decimal(0)
+        balances: List[str] = rows[0]["balances"]
         for item in balances:
             sp = item.split(" ")
             if sp[1].upper() == "GOLD":
@@ -285,207 +590,183 @@ class Farmer:
 
     # 获取建造信息
     def get_buildings(self) -> List[Building]:
-        post_data = self.table_row_template()
-        post_data["table"] = "buildings"
-        post_data["index_position"] = 2
-
-        resp = self.http.post(self.url_table_row, json=post_data)
-        self.log.debug("get_buildings_info:{0}".format(resp.text))
-        resp = resp.json()
-        buildings = []
-        for item in resp["rows"]:
-            build = Building()
-            build.asset_id = item["asset_id"]
-            build.name = item["name"]
-            build.is_ready = item["is_ready"]
-            build.next_availability = datetime.fromtimestamp(item["next_availability"])
-            build.template_id = item["template_id"]
-            build.times_claimed = item.get("times_claimed", None)
-            if build.is_ready == 1:
-                continue
-            buildings.append(build)
-        return buildings
+        rows = self.get_table_rows("buildings", 2)
+        return [build for build in res.create_buildings(rows) if build.is_ready != 1]
 
     # 获取农作物信息
     def get_crops(self) -> List[Crop]:
-        post_data = self.table_row_template()
-        post_data["table"] = "crops"
-        post_data["index_position"] = 2
-
-        resp = self.http.post(self.url_table_row, json=post_data)
-        self.log.debug("get_crops_info:{0}".format(resp.text))
-        resp = resp.json()
-        crops = []
-        for item in resp["rows"]:
-            crop = res.create_crop(item)
-            if crop:
-                crops.append(crop)
-            else:
-                self.log.warning("尚未支持的农作物类型:{0}".format(item))
+        rows = self.get_table_rows("crops", 2)
+        unsupported = []
+        crops = res.create_crops(rows, unsupported)
+        for item in unsupported:
+            self.log.warning("尚未支持的农作物类型:{0}".format(item))
         return crops
 
-    # claim 建筑
-    def claim_building(self, item: Building):
-        self.consume_energy(Decimal(item.energy_consumed))
-        transaction = {
-            "actions": [{
-                "account": "farmersworld",
-                "name": "bldclaim",
-                "authorization": [{
-                    "actor": self.wax_account,
-                    "permission": "active",
-                }],
-                "data": {
-                    "asset_id": item.asset_id,
-                    "owner": self.wax_account,
-                },
+    # 构造一个智能合约action
+    def make_action(self, name: str, data: dict, account: str = "farmersworld") -> dict:
+        return {
+            "account": account,
+            "name": name,
+            "authorization": [{
+                "actor": self.wax_account,
+                "permission": self.user_param.permission,
             }],
+            "data": data,
         }
-        return self.wax_transact(transaction)
+
+    # 把一个操作加入本轮的计划，扫描完后统一安排能量和修理
+    def plan_claim(self, action: dict, item: Farming, op_name: str, energy: int, reserve: int = 0):
+        value = expected_yield(item, self.subsystem_of(item))
+        self.planner.add(PlannedClaim(item, action, op_name, Decimal(energy), Decimal(reserve), value))
+
+    # 按计划先恢复能量、修理工具，再把各项操作加入批量交易
+    def execute_plan(self):
+        if not self.planner:
+            return
+        plan = self.planner.plan(self.resoure, Decimal(self.user_param.recover_energy))
+        if plan.recover > 0:
+            self.log.info("本轮操作共需能量【{0}】，当前能量【{1}】".format(plan.energy_used, self.resoure.energy))
+            self.recover_energy(plan.recover)
+            self.resoure.energy += plan.recover
+        for tool in plan.repairs:
+            self.repair_tool(tool)
+        for claim in plan.claims:
+            self.add_claim(claim.action, claim.item, claim.op_name)
+        self.resoure.energy -= plan.energy_used
+        retry_time = datetime.now() + cfg.min_scan_interval
+        for claim, reason in plan.deferred:
+            self.log.error("{0}，暂不{1}: {2}，请及时补充".format(reason, claim.op_name, claim.item.show(more=False)))
+            self.scheduler.schedule(self.subsystem_of(claim.item), retry_time)
+        self.planner.clear()
+
+    # 把一个claim操作加入本轮的批量交易
+    def add_claim(self, action: dict, item: Farming, op_name: str):
+        subsystem = self.subsystem_of(item)
+        key = (action["name"], item.asset_id)
+
+        def on_success(result: dict):
+            self.retry_attempts.pop(key, None)
+            self.count_success_claim += 1
+            metrics.inc("farmer_claims_total", account=self.wax_account, subsystem=subsystem, result="success")
+            self.log.info("{0}成功: {1}".format(op_name, item.show(more=False)))
+            self.update_state(item, result)
+            if action["account"] == "atomicassets":
+                # 转出的资产(喂鸡的大麦)已经不在箱子里了
+                self.inventory.remove(action["data"]["asset_ids"])
+            # 知道间隔的作物，直接安排下一次操作，不必等下一轮全量扫描
+            charge_time = getattr(item, "charge_time", None)
+            if charge_time:
+                self.scheduler.schedule(self.subsystem_of(item), datetime.now() + charge_time + cfg.operate_delay)
+            if self.receipts:
+                self.receipts.track(result["transaction_id"], on_confirmed, on_dropped)
+
+        # 上链后按区块时间安排下一次操作
+        def on_confirmed(block_time: datetime):
+            charge_time = getattr(item, "charge_time", None)
+            if charge_time:
+                self.scheduler.schedule(subsystem, block_time + charge_time + cfg.operate_delay)
+
+        # 节点接受了交易但没有上链，按交易过期重试
+        def on_dropped():
+            on_failure(TransactException("expired transaction: {0}".format(op_name)))
+
+        def on_failure(e: TransactException):
+            if isinstance(e, ResourceException):
+                # 没有提交，只是推迟到CPU/NET恢复以后
+                self.scheduler.schedule(subsystem, datetime.now() + timedelta(seconds=e.wait_seconds))
+                return
+            self.count_error_claim += 1
+            metrics.inc("farmer_claims_total", account=self.wax_account, subsystem=subsystem, result="error")
+            self.log.info("{0}失败: {1}".format(op_name, item.show(more=False)))
+            if action["account"] == "atomicassets":
+                self.inventory.invalidate()
+            self.retry_claim(key, subsystem, op_name, e)
+
+        self.batcher.add(action, "{0} {1}".format(op_name, item.show(more=False)), on_success, on_failure,
+                         retry=key in self.retry_attempts)
+
+    # 操作失败后按错误类型退避一段时间，只重新扫描这个操作所在的子系统
+    def retry_claim(self, key: Tuple[str, str], subsystem: str, op_name: str, e: TransactException):
+        error_class = classify(e)
+        attempt = self.retry_attempts.get(key, 0) + 1
+        # 链上状态可能与本地推算的不一致，重试前重新读取
+        self.state.mark_dirty(self.subsystem_tables[subsystem][0])
+        if not should_retry(error_class, attempt):
+            self.retry_attempts.pop(key, None)
+            self.log.error("{0}已重试【{1}】次仍然失败({2})，等下一轮全量扫描再处理".format(
+                op_name, attempt - 1, error_class))
+            return
+        self.retry_attempts[key] = attempt
+        retry_stats.retry("action", error_class)
+        delay = backoff(error_class, attempt)
+        self.log.info("{0}失败({1})，{2:.0f}秒后第【{3}】次重试".format(op_name, error_class, delay, attempt))
+        self.scheduler.schedule(subsystem, datetime.now() + timedelta(seconds=delay))
+
+    # claim 建筑
+    def claim_building(self, item: Building):
+        action = self.make_action("bldclaim", {
+            "asset_id": item.asset_id,
+            "owner": self.wax_account,
+        })
+        self.plan_claim(action, item, "建造", item.energy_consumed)
 
     # 耕种农作物
     def claim_crop(self, crop: Crop):
-        energy_consumed = crop.energy_consumed
-        fake_consumed = Decimal(0)
+        fake_consumed = 0
         if crop.times_claimed == crop.required_claims - 1:
             # 收获前的最后一次耕作，多需要200点能量，游戏合约BUG
-            fake_consumed = Decimal(200)
-        self.consume_energy(Decimal(energy_consumed), fake_consumed)
-        transaction = {
-            "actions": [{
-                "account": "farmersworld",
-                "name": "cropclaim",
-                "authorization": [{
-                    "actor": self.wax_account,
-                    "permission": "active",
-                }],
-                "data": {
-                    "crop_id": crop.asset_id,
-                    "owner": self.wax_account,
-                },
-            }],
-        }
-        return self.wax_transact(transaction)
+            fake_consumed = 200
+        action = self.make_action("cropclaim", {
+            "crop_id": crop.asset_id,
+            "owner": self.wax_account,
+        })
+        self.plan_claim(action, crop, "耕作", crop.energy_consumed, fake_consumed)
 
     def claim_buildings(self, blds: List[Building]):
         for item in blds:
             self.log.info("正在建造: {0}".format(item.show()))
-            if self.claim_building(item):
-                self.log.info("建造成功: {0}".format(item.show(more=False)))
-            else:
-                self.log.info("建造失败: {0}".format(item.show(more=False)))
-                self.count_error_claim += 1
-            time.sleep(cfg.req_interval)
+            self.claim_building(item)
 
     def claim_crops(self, crops: List[Crop]):
         for item in crops:
             self.log.info("正在耕作: {0}".format(item.show()))
-            if self.claim_crop(item):
-                self.log.info("耕作成功: {0}".format(item.show(more=False)))
-            else:
-                self.log.info("耕作失败: {0}".format(item.show(more=False)))
-                self.count_error_claim += 1
-            time.sleep(cfg.req_interval)
+            self.claim_crop(item)
 
-    # 获取箱子里的NTF
+    # 获取箱子里的NTF，逐页读取全部
     def get_chest(self) -> dict:
-        payload = {
-            "limit": 1000,
-            "collection_name": "farmersworld",
-            "owner": self.wax_account,
-            "template_blacklist": "260676",
-        }
-        resp = self.http.get(self.url_assets, params=payload)
-        self.log.debug("get_chest:{0}".format(resp.text))
-        resp = resp.json()
-        assert resp["success"]
-        return resp
+        return {"success": True, "data": list(self.chest.iter_raw(template_blacklist="260676"))}
 
     # schema: [foods]
     def get_chest_by_schema_name(self, schema_name: str):
-        payload = {
-            "limit": 1000,
-            "collection_name": "farmersworld",
-            "owner": self.wax_account,
-            "schema_name": schema_name,
-        }
-        resp = self.http.get(self.url_assets, params=payload)
-        self.log.debug("get_chest_by_schema_name:{0}".format(resp.text))
-        resp = resp.json()
-        assert resp["success"]
-        return resp
+        return {"success": True, "data": list(self.chest.iter_raw(schema_name=schema_name))}
 
     # template_id: [大麦 318606]
     def get_chest_by_template_id(self, template_id: int):
-        payload = {
-            "limit": 1000,
-            "collection_name": "farmersworld",
-            "owner": self.wax_account,
-            "template_id": template_id,
-        }
-        resp = self.http.get(self.url_assets, params=payload)
-        self.log.debug("get_chest_by_schema_name:{0}".format(resp.text))
-        resp = resp.json()
-        assert resp["success"]
-        return resp
+        return {"success": True, "data": list(self.chest.iter_raw(template_id=template_id))}
 
-    # 获取大麦
+    # 获取大麦，优先使用本地缓存的库存
     def get_barley(self) -> List[Asset]:
-        barley_list = []
-        chest = self.get_chest_by_template_id(NFT.Barley)
-        if len(chest["data"]) <= 0:
-            return barley_list
-        for item in chest["data"]:
-            assert item["name"] == "Barley"
-            asset = Asset()
-            asset.asset_id = item["asset_id"]
-            asset.name = item["name"]
-            asset.is_transferable = item["is_transferable"]
-            asset.is_burnable = item["is_transferable"]
-            asset.schema_name = item["schema"]["schema_name"]
-            asset.template_id = item["template"]["template_id"]
-            barley_list.append(asset)
-        self.log.info("get_barley: {0}".format(barley_list))
+        if self.state.take_dirty(CHEST):
+            self.inventory.invalidate()
+        barley_list = self.inventory.get(NFT.Barley, lambda: self.chest.iter_assets(template_id=NFT.Barley))
+        self.log.debug("get_barley: {0}".format(barley_list))
         return barley_list
 
     # 获取鸡的信息
     def get_chicken(self) -> List[Animal]:
-        post_data = self.table_row_template()
-        post_data["table"] = "animals"
-        post_data["index_position"] = 2
-
-        resp = self.http.post(self.url_table_row, json=post_data)
-        self.log.debug("get_chicken_info:{0}".format(resp.text))
-        resp = resp.json()
-        animals = []
-        for item in resp["rows"]:
-            if item["name"] != "Chicken":
-                continue
-            anim: Chicken = res.create_farming(item)
-            animals.append(anim)
-        return animals
+        rows = self.get_table_rows("animals", 2)
+        return res.create_chickens(rows)
 
     # 喂鸡
-    def feed_chicken(self, asset_id_food: str, chicken: Chicken) -> bool:
+    def feed_chicken(self, asset_id_food: str, chicken: Chicken):
         self.log.info("feed [{0}] to [{1}]".format(asset_id_food, chicken.asset_id))
-        self.consume_energy(Decimal(chicken.energy_consumed))
-        transaction = {
-            "actions": [{
-                "account": "atomicassets",
-                "name": "transfer",
-                "authorization": [{
-                    "actor": self.wax_account,
-                    "permission": "active",
-                }],
-                "data": {
-                    "asset_ids": [asset_id_food],
-                    "from": self.wax_account,
-                    "memo": "feed_animal:{0}".format(chicken.asset_id),
-                    "to": "farmersworld"
-                },
-            }],
-        }
-        return self.wax_transact(transaction)
+        action = self.make_action("transfer", {
+            "asset_ids": [asset_id_food],
+            "from": self.wax_account,
+            "memo": "feed_animal:{0}".format(chicken.asset_id),
+            "to": "farmersworld"
+        }, account="atomicassets")
+        self.plan_claim(action, chicken, "喂鸡", chicken.energy_consumed)
 
     # 饲养鸡
     def claim_chicken(self, animals: List[Animal]):
@@ -497,36 +778,32 @@ class Farmer:
                 return False
             barley = list_barley.pop()
             self.log.info("正在喂鸡: {0}".format(item.show()))
-            success = self.feed_chicken(barley.asset_id, item)
-            if success:
-                self.log.info("喂鸡成功: {0}".format(item.show(more=False)))
-            else:
-                self.log.info("喂鸡失败: {0}".format(item.show(more=False)))
-                self.count_error_claim += 1
-            time.sleep(cfg.req_interval)
+            self.feed_chicken(barley.asset_id, item)
         return True
 
     # 获取wax账户信息
     def wax_get_account(self):
-        url = self.url_rpc + "get_account"
         post_data = {"account_name": self.wax_account}
-        resp = self.http.post(url, json=post_data)
-        self.log.debug("get_account:{0}".format(resp.text))
-        resp = resp.json()
+        resp = self.rpc_pool.post(self.http, "get_account", post_data)
+        resp = fast_json.decode(resp, self.log, "get_account")
         return resp
 
-    # 获取三种资源的代币余额 FWF FWG FWW
-    def get_fw_balance(self) -> Token:
-        url = self.url_rpc + "get_currency_balance"
+    def balance_request(self) -> Tuple[str, dict]:
+        path = "get_currency_balance"
         post_data = {
             "code": "farmerstoken",
             "account": self.wax_account,
             "symbol": None
         }
-        resp = self.http.post(url, json=post_data)
+        return path, post_data
 
-        self.log.debug("get_fw_balance:{0}".format(resp.text))
-        resp = resp.json()
+    # 获取三种资源的代币余额 FWF FWG FWW
+    def get_fw_balance(self) -> Token:
+        resp = self.table_cache.pop("balance", None)
+        if resp is None:
+            path, post_data = self.balance_request()
+            resp = self.rpc_pool.post(self.http, path, post_data)
+            resp = fast_json.decode(resp, self.log, "get_fw_balance")
         balance = Token()
         for item in resp:
             sp = item.split(" ")
@@ -539,26 +816,60 @@ class Farmer:
         self.log.debug("fw_balance: {0}".format(balance))
         return balance
 
-    # 签署交易(只许成功，否则抛异常）
-    def wax_transact(self, transaction: dict):
-        self.inject_waxjs()
+    # 提交交易但不等待签名返回，返回的Future成功时为交易结果，失败时抛出TransactException
+    def wax_submit(self, transaction: dict) -> Future:
         self.log.info("begin transact: {0}".format(transaction))
-        try:
-            success, result = self.driver.execute_script("return window.wax_transact(arguments[0]);", transaction)
+        limiter = get_limiter(SIGNER)
+        limiter.wait()
+        begin = time.monotonic()
+        outer = Future()
+
+        def done(future: Future):
+            try:
+                success, result = future.result()
+            except Exception as e:
+                success, result = False, str(e)
+            metrics.observe("farmer_transact_seconds", time.monotonic() - begin, account=self.wax_account, ok=success)
+            metrics.inc("farmer_transact_actions_total", len(transaction["actions"]), account=self.wax_account)
             if success:
+                limiter.on_success()
                 self.log.info("transact ok, transaction_id: [{0}]".format(result["transaction_id"]))
                 self.log.debug("transact result: {0}".format(result))
-                return True
-            else:
-                self.log.error("transact error: {0}".format(result))
-                if "is greater than the maximum billable" in result:
-                    self.log.error("EOS CPU资源不足，可能需要质押更多WAX，一般为误报，稍后重试")
-                    raise TransactException(result)
-                raise TransactException(result)
-        except WebDriverException as e:
-            self.log.error("transact error: {0}".format(e))
-            self.log.exception(str(e))
-            raise TransactException(result)
+                # 超时后才返回的交易也要记下，同步链上记录时不当作外部操作
+                self.state.own_transactions.append(result["transaction_id"])
+                settle(outer.set_result, result)
+                return
+            self.log.error("transact error: {0}".format(result))
+            if "is greater than the maximum billable" in result:
+                self.log.error("EOS CPU资源不足，可能需要质押更多WAX，一般为误报，稍后重试")
+                limiter.on_throttle()
+            e = TransactException(result)
+            if self.resources and classify(e) in (CPU, NET):
+                # 云钱包没有代付，之后按账号自己的CPU/NET提交
+                self.signer.own_resources = True
+                self.resources.exhausted()
+            settle(outer.set_exception, e)
+
+        # 等待方已超时取消的交易，结果只记日志
+        def settle(setter: Callable, value):
+            try:
+                setter(value)
+            except InvalidStateError:
+                self.log.warning("交易超时后才返回: {0}".format(value))
+
+        # 等待方超时取消后，签名端不再等待这笔交易
+        def abandon(future: Future):
+            if future.cancelled():
+                self.signer.cancel(inner)
+
+        inner = self.signer.submit(transaction)
+        inner.add_done_callback(done)
+        outer.add_done_callback(abandon)
+        return outer
+
+    # 取回浏览器中已完成的签名结果
+    def poll_signer(self):
+        self.signer.poll()
 
     # 过滤可操作的作物
     def filter_operable(self, items: List[Farming]) -> Farming:
@@ -575,6 +886,8 @@ class Farmer:
                     item.next_availability = max(item.next_availability, next_op_time)
             if now < item.next_availability:
                 self.not_operational.append(item)
+                # 可操作时间到了，也要延后几秒再扫，以免链上状态还没更新
+                self.scheduler.schedule(self.subsystem_of(item), item.next_availability + cfg.operate_delay)
                 continue
             op.append(item)
         return op
@@ -634,45 +947,22 @@ class Farmer:
         return True
 
     def get_tools(self):
-        post_data = self.table_row_template()
-        post_data["table"] = "tools"
-        post_data["index_position"] = 2
-
-        resp = self.http.post(self.url_table_row, json=post_data)
-        self.log.debug("get_tools:{0}".format(resp.text))
-        resp = resp.json()
-        tools = []
-        for item in resp["rows"]:
-            tool = res.create_tool(item)
-            if tool:
-                tools.append(tool)
-            else:
-                self.log.warning("尚未支持的工具类型:{0}".format(item))
+        rows = self.get_table_rows("tools", 2)
+        unsupported = []
+        tools = res.create_tools(rows, unsupported)
+        for item in unsupported:
+            self.log.warning("尚未支持的工具类型:{0}".format(item))
         return tools
 
     # 使用工具挖矿操作
     def claim_mining(self, tools: List[Tool]):
         for item in tools:
             self.log.info("正在采矿: {0}".format(item.show()))
-            self.consume_energy(Decimal(item.energy_consumed))
-            self.consume_durability(item)
-            transaction = {
-                "actions": [{
-                    "account": "farmersworld",
-                    "name": "claim",
-                    "authorization": [{
-                        "actor": self.wax_account,
-                        "permission": "active",
-                    }],
-                    "data": {
-                        "asset_id": item.asset_id,
-                        "owner": self.wax_account,
-                    },
-                }],
-            }
-            self.wax_transact(transaction)
-            self.log.info("采矿成功: {0}".format(item.show(more=False)))
-            time.sleep(cfg.req_interval)
+            action = self.make_action("claim", {
+                "asset_id": item.asset_id,
+                "owner": self.wax_account,
+            })
+            self.plan_claim(action, item, "采矿", item.energy_consumed)
 
     def scan_mining(self):
         self.log.info("检查矿场")
@@ -693,25 +983,23 @@ class Farmer:
     # 修理工具
     def repair_tool(self, tool: Tool):
         self.log.info(f"正在修理工具: {tool.show()}")
-        consume_gold = (tool.durability - tool.current_durability) // 5
-        if Decimal(consume_gold) > self.resoure.gold:
+        consume_gold = repair_cost(tool)
+        if consume_gold > self.resoure.gold:
             raise FarmerException("没有足够的金币修理工具，请补充金币，稍后程序自动重试")
-        transaction = {
-            "actions": [{
-                "account": "farmersworld",
-                "name": "repair",
-                "authorization": [{
-                    "actor": self.wax_account,
-                    "permission": "active",
-                }],
-                "data": {
-                    "asset_id": tool.asset_id,
-                    "asset_owner": self.wax_account,
-                },
-            }],
-        }
-        self.wax_transact(transaction)
-        self.log.info(f"修理完毕: {tool.show(more=False)}")
+        action = self.make_action("repair", {
+            "asset_id": tool.asset_id,
+            "asset_owner": self.wax_account,
+        })
+        self.resoure.gold -= consume_gold
+        tool.current_durability = tool.durability
+        def on_success(result: dict):
+            self.log.info(f"修理完毕: {tool.show(more=False)}")
+            self.state.update_row("tools", tool.asset_id, repaired)
+
+        def repaired(row: dict):
+            row["current_durability"] = row["durability"]
+
+        self.batcher.add(action, f"修理 {tool.show(more=False)}", on_success, barrier=True)
 
     # 恢复能量
     def recover_energy(self, count: Decimal):
@@ -720,46 +1008,12 @@ class Farmer:
         if need_food > self.resoure.food:
             self.log.error(f"食物不足，仅剩【{self.resoure.food}】，兑换能量【{count}】点需要【{need_food}】个食物，请手工处理")
             raise FarmerException("没有足够的食物，请补充食物，稍后程序自动重试")
-
-        transaction = {
-            "actions": [{
-                "account": "farmersworld",
-                "name": "recover",
-                "authorization": [{
-                    "actor": self.wax_account,
-                    "permission": "active",
-                }],
-                "data": {
-                    "energy_recovered": int(count),
-                    "owner": self.wax_account,
-                },
-            }],
-        }
-        return self.wax_transact(transaction)
-
-    # 消耗能量 （操作前模拟计算）
-    def consume_energy(self, real_consume: Decimal, fake_consume: Decimal = Decimal(0)):
-        consume = real_consume + fake_consume
-        if self.resoure.energy - consume > 0:
-            self.resoure.energy -= real_consume
-            return True
-        else:
-            self.log.info("能量不足")
-            recover = min(user_param.recover_energy, self.resoure.max_energy - self.resoure.energy)
-            recover = (recover // Decimal(5)) * Decimal(5)
-            self.recover_energy(recover)
-            self.resoure.energy += recover
-            self.resoure.energy -= real_consume
-            return True
-
-    # 消耗耐久度 （操作前模拟计算）
-    def consume_durability(self, tool: Tool):
-        if tool.current_durability >= tool.durability_consumed:
-            return True
-        else:
-            self.log.info("工具耐久不足")
-            self.repair_tool(tool)
-
+        action = self.make_action("recover", {
+            "energy_recovered": int(count),
+            "owner": self.wax_account,
+        })
+        self.resoure.food -= need_food
+        self.batcher.add(action, "恢复能量【{0}】点".format(count), barrier=True)
 
     def scan_mbs(self):
         self.log.info("检查会员卡")
@@ -778,102 +1032,120 @@ class Farmer:
         return True
 
     def get_mbs(self) -> List[MBS]:
-        post_data = self.table_row_template()
-        post_data["table"] = "mbs"
-        post_data["index_position"] = 2
-        post_data["key_type"] = "i64"
-
-        resp = self.http.post(self.url_table_row, json=post_data)
-        self.log.debug("get_mbs:{0}".format(resp.text))
-        resp = resp.json()
-        mbs = []
-        for item in resp["rows"]:
-            mb = res.create_mbs(item)
-            if mb:
-                mbs.append(mb)
-            else:
-                self.log.warning("尚未支持的会员卡类型:{0}".format(item))
+        rows = self.get_table_rows("mbs", 2)
+        unsupported = []
+        mbs = res.create_mbs_list(rows, unsupported)
+        for item in unsupported:
+            self.log.warning("尚未支持的会员卡类型:{0}".format(item))
         return mbs
 
     def claim_mbs(self, tools: List[MBS]):
         for item in tools:
             self.log.info("正在点击会员卡: {0}".format(item.show(True)))
-            self.consume_energy(Decimal(item.energy_consumed))
-            transaction = {
-                "actions": [{
-                    "account": "farmersworld",
-                    "name": "mbsclaim",
-                    "authorization": [{
-                        "actor": self.wax_account,
-                        "permission": "active",
-                    }],
-                    "data": {
-                        "asset_id": item.asset_id,
-                        "owner": self.wax_account,
-                    },
-                }],
-            }
-            self.wax_transact(transaction)
-            self.log.info("点击会员卡成功: {0}".format(item.show(more=False)))
-            time.sleep(cfg.req_interval)
+            action = self.make_action("mbsclaim", {
+                "asset_id": item.asset_id,
+                "owner": self.wax_account,
+            })
+            self.plan_claim(action, item, "点击会员卡", item.energy_consumed)
 
     def scan_resource(self):
         r = self.get_resource()
         self.log.info(f"金币【{r.gold}】 木头【{r.wood}】 食物【{r.food}】 能量【{r.energy}/{r.max_energy}】")
         self.resoure = r
-        time.sleep(cfg.req_interval)
         self.token = self.get_fw_balance()
         self.log.info(f"FWG【{self.token.fwg}】 FWW【{self.token.fww}】 FWF【{self.token.fwf}】")
 
     def reset_before_scan(self):
         self.not_operational.clear()
+        self.planner.clear()
+        self.batcher.clear()
         self.count_success_claim = 0
         self.count_error_claim = 0
 
+    # 作物所属的子系统，与user_param中的开关同名
+    @staticmethod
+    def subsystem_of(item: Farming) -> str:
+        if isinstance(item, Tool):
+            return "mining"
+        elif isinstance(item, Crop):
+            return "plant"
+        elif isinstance(item, Chicken):
+            return "chicken"
+        elif isinstance(item, MBS):
+            return "mbs"
+        elif isinstance(item, Building):
+            return "build"
+        raise FarmerException("未知的作物类型: {0}".format(item))
+
+    # 子系统的扫描函数，按扫描顺序排列
+    def scanners(self) -> Dict[str, callable]:
+        return {
+            "mbs": self.scan_mbs,
+            "build": self.scan_buildings,
+            "plant": self.scan_crops,
+            "chicken": self.scan_animals,
+            "mining": self.scan_mining,
+        }
+
+    # 用户开启的子系统
+    def enabled_subsystems(self) -> List[str]:
+        return [name for name in self.scanners() if getattr(self.user_param, name)]
+
     # 检查正在培养的作物， 返回值：是否继续运行程序
     def scan_all(self) -> int:
+        self.scheduler.clear()
+        return self.scan(self.enabled_subsystems(), full=True)
+
+    # 只扫描到期的子系统
+    def scan_due(self, subsystems: List[str]) -> int:
+        return self.scan(subsystems, full=False)
+
+    def scan(self, subsystems: List[str], full: bool) -> int:
+        with metrics.timer("farmer_scan_seconds", account=self.wax_account, full=full):
+            return self.do_scan(subsystems, full)
+
+    def do_scan(self, subsystems: List[str], full: bool) -> int:
         status = Status.Continue
         try:
             self.reset_before_scan()
-            self.log.info("开始一轮扫描")
+            if full:
+                self.log.info("开始一轮扫描")
+            else:
+                self.log.info("开始扫描到期的子系统: {0}".format(subsystems))
+            for name in subsystems:
+                self.scheduler.discard(name)
+            self.load_farming_config()
+            self.poll_history()
+            self.prefetch(subsystems)
             self.scan_resource()
-            time.sleep(cfg.req_interval)
-
-            if user_param.mbs:
-                self.scan_mbs()
-                time.sleep(cfg.req_interval)
-            if user_param.build:
-                self.scan_buildings()
-                time.sleep(cfg.req_interval)
-            if user_param.plant:
-                self.scan_crops()
-                time.sleep(cfg.req_interval)
-            if user_param.chicken:
-                self.scan_animals()
-                time.sleep(cfg.req_interval)
-            if user_param.mining:
-                self.scan_mining()
-                time.sleep(cfg.req_interval)
+
+            scanners = self.scanners()
+            for name in subsystems:
+                scanners[name]()
+            self.execute_plan()
+            # 云钱包可能代付CPU，浏览器签名的账号出现过CPU/NET不足后才按账号自己的CPU/NET预先推迟操作
+            self.batcher.monitor = self.resources if self.signer.own_resources else None
+            if self.batcher.monitor and self.batcher:
+                self.resources.refresh()
+            # 本轮所有操作合并成少数几笔交易提交
+            error = None
+            if self.batcher:
+                with self.lease_browser():
+                    error = self.batcher.flush()
             self.log.info("结束一轮扫描")
-            if self.not_operational:
-                self.next_operate_time = min([item.next_availability for item in self.not_operational])
+            self.next_operate_time = self.scheduler.next_time()
+            if self.next_operate_time != datetime.max:
                 self.log.info("下一次可操作时间: {0}".format(utils.show_time(self.next_operate_time)))
-                # 可操作时间到了，也要延后5秒再扫，以免
-                self.next_operate_time += timedelta(seconds=5)
-            else:
-                self.next_operate_time = datetime.max
             if self.count_success_claim > 0 or self.count_error_claim > 0:
                 self.log.info(f"本轮操作成功数量: {self.count_success_claim} 操作失败数量: {self.count_error_claim}")
 
-            if self.count_error_claim > 0:
-                self.log.info("本轮有失败操作，稍后重试")
-                self.next_scan_time = datetime.now() + cfg.min_scan_interval
-            else:
+            if full:
+                # 兜底的全量扫描，可以处理上次扫描后新种的作物
                 self.next_scan_time = datetime.now() + cfg.max_scan_interval
 
-            self.next_scan_time = min(self.next_scan_time, self.next_operate_time)
-
-            # 没有合约出错，清空错误计数器
+            # 有交易失败时计入合约调用异常并推迟下一轮扫描，没有合约出错则清空错误计数器
+            if error:
+                raise error
             self.count_error_transact = 0
 
         except TransactException as e:
@@ -881,11 +1153,13 @@ class Farmer:
             if not e.retry:
                 return Status.Stop
             self.count_error_transact += 1
+            metrics.inc("farmer_transact_errors_total", account=self.wax_account)
             self.log.error("合约调用异常【{0}】次".format(self.count_error_transact))
             if self.count_error_transact >= e.max_retry_times and e.max_retry_times != -1:
                 self.log.error("合约连续调用异常")
                 return Status.Stop
-            self.next_scan_time = datetime.now() + cfg.min_scan_interval
+            delay = max(backoff(classify(e), self.count_error_transact), cfg.min_scan_interval.total_seconds())
+            self.next_scan_time = datetime.now() + timedelta(seconds=delay)
         except CookieExpireException as e:
             self.log.exception(str(e))
             self.log.error("Cookie失效，请手动重启程序并重新登录")
@@ -903,19 +1177,49 @@ class Farmer:
             self.log.error("常规错误，稍后重试")
             self.next_scan_time = datetime.now() + cfg.min_scan_interval
 
+        # 预取的数据只在本轮有效
+        self.table_cache.clear()
         self.log.info("下一轮扫描时间: {0}".format(utils.show_time(self.next_scan_time)))
         return status
 
+    # 执行所有到期的扫描，返回值：是否继续运行程序
+    def run_once(self) -> int:
+        self.poll_receipts()
+        now = datetime.now()
+        if self.full_scan_due(now):
+            return self.scan_all()
+        subsystems = self.scheduler.pop_due(now)
+        if subsystems:
+            return self.scan_due(subsystems)
+        return Status.Continue
+
+    # 下一次run_once是否是全量扫描
+    def full_scan_due(self, now: datetime) -> bool:
+        return now >= self.next_scan_time
+
+    # 下一次需要醒来的时间
+    def next_wake_time(self) -> datetime:
+        wake = min(self.next_scan_time, self.scheduler.next_time())
+        if self.receipts:
+            wake = min(wake, self.receipts.next_poll_time())
+        return wake
+
+    # 查询已提交交易是否上链
+    def poll_receipts(self):
+        if self.receipts:
+            self.receipts.poll()
+
     def run_forever(self):
         while True:
-            if datetime.now() > self.next_scan_time:
-                status = self.scan_all()
-                if status == Status.Stop:
-                    self.close()
-                    self.log.info("程序已停止，请检查日志后手动重启程序")
-                    return 1
-            time.sleep(1)
-
+            status = self.run_once()
+            if status == Status.Stop:
+                self.close()
+                self.log.info("程序已停止，请检查日志后手动重启程序")
+                return 1
+            # 一直睡到下一个到期的作物或下一轮全量扫描
+            seconds = (self.next_wake_time() - datetime.now()).total_seconds()
+            if seconds > 0:
+                self.sleep(seconds, "idle")
 
 
 def test():
@@ -0,0 +1,18 @@
+# 快速解析响应中的JSON：装了orjson就用它，否则用标准库；调试日志关闭时不再为了日志把响应体解码成文本
+import json
+import logging
+import requests
+
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    orjson = None
+    loads = json.loads
+
+
+# 解析http响应，log开启调试级别时才记录响应文本
+def decode(resp: requests.Response, log: logging.LoggerAdapter = None, name: str = None):
+    if log is not None and log.isEnabledFor(logging.DEBUG):
+        log.debug("{0}:{1}".format(name, resp.text))
+    return loads(resp.content)
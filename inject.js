@@ -1,4 +1,4 @@
-window.mywax = new waxjs.WaxJS({rpcEndpoint: 'https://api.wax.alohaeos.com'});
+window.mywax = new waxjs.WaxJS({rpcEndpoint: window.wax_rpc_endpoint || 'https://api.wax.alohaeos.com'});
 
 window.sleep = function sleep(ms) {
   return new Promise(resolve => setTimeout(resolve, ms));
@@ -32,3 +32,16 @@ window.wax_transact = async function(transaction){
         return [false, e.message];
     }
 }
+
+// 异步提交的交易：发起后立即返回，结果按编号存入farmer_results，由wax_results取回
+window.farmer_results = window.farmer_results || {};
+
+window.wax_submit = function(key, transaction){
+    window.wax_transact(transaction).then(result => { window.farmer_results[key] = result; });
+}
+
+window.wax_results = function(){
+    const results = window.farmer_results;
+    window.farmer_results = {};
+    return results;
+}
@@ -5,7 +5,8 @@ from logger import log
 import yaml
 import sys
 import utils
-from settings import load_user_param, user_param
+from settings import load_user_param, user_param, cfg
+import metrics
 
 def run(config_file: str):
     with open(config_file, "r", encoding="utf8") as file:
@@ -15,6 +16,9 @@ def run(config_file: str):
     logger.init_loger(user_param.wax_account)
     log.info("wax_account; {0}".format(user_param.wax_account))
     utils.clear_orphan_webdriver()
+    if cfg.metrics_port:
+        metrics.start_http_server(cfg.metrics_port)
+    metrics.start_summary()
     farmer = Farmer()
     farmer.wax_account = user_param.wax_account
     if user_param.use_proxy:
@@ -0,0 +1,175 @@
+# 运行指标：统计请求耗时、交易耗时、操作成功失败次数等，以Prometheus文本格式在本地端口输出，并定期在日志中汇总
+import threading
+import time
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Tuple, List
+from settings import cfg
+from logger import log
+
+# 耗时分布的分桶上限（秒）
+buckets = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, float("inf"))
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    # 按分桶估算分位数，返回所在分桶的上限
+    def quantile(self, q: float) -> float:
+        target = self.count * q
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= target:
+                return buckets[i]
+        return buckets[-1]
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters: Dict[str, Dict[Labels, float]] = {}
+        self.histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self.gauges: Dict[str, Dict[Labels, float]] = {}
+        self.help: Dict[str, str] = {}
+
+    @staticmethod
+    def labels(labels: dict) -> Labels:
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = self.labels(labels)
+        with self.lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        key = self.labels(labels)
+        with self.lock:
+            self.gauges.setdefault(name, {})[key] = value
+
+    # 去掉一个当前值，如浏览器关闭后不再输出它的内存
+    def discard(self, name: str, **labels):
+        key = self.labels(labels)
+        with self.lock:
+            self.gauges.get(name, {}).pop(key, None)
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = self.labels(labels)
+        with self.lock:
+            series = self.histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = Histogram()
+            series[key].observe(seconds)
+
+    # 计时，with块结束时记录耗时
+    @contextmanager
+    def timer(self, name: str, **labels):
+        begin = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - begin, **labels)
+
+    @staticmethod
+    def format_labels(key: Labels, extra: str = None) -> str:
+        items = ['{0}="{1}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"')) for k, v in key]
+        if extra:
+            items.append(extra)
+        return "{" + ",".join(items) + "}" if items else ""
+
+    # Prometheus文本格式
+    def render(self) -> str:
+        lines: List[str] = []
+        with self.lock:
+            for name, series in sorted(self.counters.items()):
+                lines.append("# TYPE {0} counter".format(name))
+                for key, value in series.items():
+                    lines.append("{0}{1} {2}".format(name, self.format_labels(key), value))
+            for name, series in sorted(self.gauges.items()):
+                lines.append("# TYPE {0} gauge".format(name))
+                for key, value in series.items():
+                    lines.append("{0}{1} {2}".format(name, self.format_labels(key), value))
+            for name, series in sorted(self.histograms.items()):
+                lines.append("# TYPE {0} histogram".format(name))
+                for key, hist in series.items():
+                    cumulative = 0
+                    for bound, c in zip(buckets, hist.counts):
+                        cumulative += c
+                        le = "+Inf" if bound == float("inf") else str(bound)
+                        lines.append("{0}_bucket{1} {2}".format(name, self.format_labels(key, 'le="{0}"'.format(le)),
+                                                                cumulative))
+                    lines.append("{0}_sum{1} {2}".format(name, self.format_labels(key), hist.sum))
+                    lines.append("{0}_count{1} {2}".format(name, self.format_labels(key), hist.count))
+        return "\n".join(lines) + "\n"
+
+    # 日志汇总：各计数器和当前值的总数，各耗时的次数、平均值和p95
+    def summary(self) -> List[str]:
+        lines = []
+        with self.lock:
+            for name, series in sorted(self.counters.items()):
+                lines.append("{0}: {1:g}".format(name, sum(series.values())))
+            for name, series in sorted(self.gauges.items()):
+                lines.append("{0}: {1:g}".format(name, sum(series.values())))
+            for name, series in sorted(self.histograms.items()):
+                total = Histogram()
+                for hist in series.values():
+                    total.counts = [a + b for a, b in zip(total.counts, hist.counts)]
+                    total.sum += hist.sum
+                    total.count += hist.count
+                if total.count:
+                    lines.append("{0}: 次数{1} 平均{2:.3f}秒 p95<={3}秒".format(
+                        name, total.count, total.sum / total.count, total.quantile(0.95)))
+        return lines
+
+
+metrics = Registry()
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = metrics.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# 在本地端口输出Prometheus指标，端口被占用(如同一台机器上运行多个main.py)时不输出，照常运行
+def start_http_server(port: int):
+    try:
+        server = ThreadingHTTPServer(("127.0.0.1", port), MetricsHandler)
+    except OSError as e:
+        log.warning("运行指标端口【{0}】无法使用，不输出Prometheus指标: {1}".format(port, e))
+        return None
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    log.info("运行指标: http://127.0.0.1:{0}/metrics".format(port))
+    return server
+
+
+# 定期在日志中输出汇总
+def start_summary():
+    def run():
+        while True:
+            time.sleep(cfg.metrics_summary_interval.total_seconds())
+            for line in metrics.summary():
+                log.info("[指标] {0}".format(line))
+
+    threading.Thread(target=run, daemon=True).start()
@@ -0,0 +1,133 @@
+# 能量与耐久规划：一轮扫描中可操作的东西先汇总，算出总共需要的能量和修理，
+# 最多恢复一次能量、修理一批工具，排在所有claim前面提交，
+# 资源不够时按每点能量的预估收益挑出收益最高的一批操作，推迟其余的
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import List, Tuple
+from res import Farming, Tool, Resoure
+from settings import cfg
+
+
+# 计划中的一个操作
+@dataclass
+class PlannedClaim:
+    item: Farming
+    action: dict
+    op_name: str
+    # 实际消耗的能量
+    energy: Decimal
+    # 操作时需要多留的能量，不会消耗(收获前最后一次耕作，游戏合约BUG)
+    reserve: Decimal = Decimal(0)
+    # 预估收益(折合金币)
+    value: Decimal = Decimal(0)
+
+    # 每点能量的收益，不耗能量的排在最前
+    def value_per_energy(self) -> Decimal:
+        if self.energy <= 0:
+            return Decimal("Infinity")
+        return self.value / self.energy
+
+
+@dataclass
+class Plan:
+    # 恢复多少能量，0表示不需要
+    recover: Decimal = Decimal(0)
+    # 需要修理的工具
+    repairs: List[Tool] = field(default_factory=list)
+    # 本轮执行的操作
+    claims: List[PlannedClaim] = field(default_factory=list)
+    # 资源不足推迟的操作及原因
+    deferred: List[Tuple[PlannedClaim, str]] = field(default_factory=list)
+    # 本轮消耗的能量
+    energy_used: Decimal = Decimal(0)
+
+
+# 一次操作的预估收益：工具按配置表中的产出和资源价值计算，其它按设置中的估值
+def expected_yield(item: Farming, subsystem: str) -> Decimal:
+    if isinstance(item, Tool) and item.rewards_rate:
+        return item.rewards_rate * Decimal(str(cfg.resource_value.get(item.mining_type, 1)))
+    return Decimal(str(cfg.claim_value.get(subsystem, 1)))
+
+
+# 执行顺序：需要多留能量的操作排在前面，此时能量最充足，所需的能量峰值最低
+def arrange(claims: List[PlannedClaim]) -> List[PlannedClaim]:
+    return sorted(claims, key=lambda claim: -claim.reserve)
+
+
+# 修理工具需要的金币
+def repair_cost(tool: Tool) -> Decimal:
+    return Decimal((tool.durability - tool.current_durability) // 5)
+
+
+# 工具耐久不够本次操作
+def need_repair(tool: Tool) -> bool:
+    return tool.current_durability < tool.durability_consumed
+
+
+# 按顺序执行这些操作时，操作前能量的最低要求(必须大于这个数)
+def peak_energy(claims: List[PlannedClaim]) -> Decimal:
+    used = Decimal(0)
+    peak = Decimal(0)
+    for claim in claims:
+        peak = max(peak, used + claim.energy + claim.reserve)
+        used += claim.energy
+    return peak
+
+
+# 能量一次恢复5的倍数，每5点能量消耗1个食物
+def round_up5(value: Decimal) -> Decimal:
+    return -(-value // 5) * 5
+
+
+class EnergyPlanner:
+    def __init__(self):
+        self.claims: List[PlannedClaim] = []
+
+    def add(self, claim: PlannedClaim):
+        self.claims.append(claim)
+
+    def clear(self):
+        self.claims.clear()
+
+    def __len__(self):
+        return len(self.claims)
+
+    # resoure: 本轮开始时的资源  recover_energy: 用户设置的每次恢复多少能量
+    def plan(self, resoure: Resoure, recover_energy: Decimal) -> Plan:
+        plan = Plan()
+        # 收益高的先分配金币和能量
+        ranked = sorted(self.claims, key=lambda claim: -claim.value_per_energy())
+        costs = [repair_cost(claim.item) if isinstance(claim.item, Tool) and need_repair(claim.item) else Decimal(0)
+                 for claim in ranked]
+
+        # 恢复能量的上限：不超过最大能量，也不超过食物能换的能量
+        limit = min(resoure.max_energy - resoure.energy, resoure.food * 5)
+        limit = max(Decimal(0), limit // 5 * 5)
+        budget = resoure.energy + limit
+        if sum(costs, Decimal(0)) <= resoure.gold and peak_energy(arrange(ranked)) < budget:
+            selected = ranked
+        else:
+            # 金币或能量不够全部操作，按收益从高到低挑选，能量也放得下的才扣除修理的金币
+            gold = resoure.gold
+            selected = []
+            for claim, cost in zip(ranked, costs):
+                if cost > gold:
+                    plan.deferred.append((claim, "金币不足，无法修理工具"))
+                elif peak_energy(arrange(selected + [claim])) >= budget:
+                    plan.deferred.append((claim, "能量不足，食物不够恢复"))
+                else:
+                    selected.append(claim)
+                    gold -= cost
+        # 保持扫描时的顺序，只把需要多留能量的提前
+        chosen = set(id(claim) for claim in selected)
+        claims = arrange([claim for claim in self.claims if id(claim) in chosen])
+
+        peak = peak_energy(claims)
+        if peak >= resoure.energy:
+            need = round_up5(peak - resoure.energy + 1)
+            # 按用户设置多恢复一些，减少以后恢复能量的交易，食物不会浪费
+            plan.recover = min(max(need, recover_energy // 5 * 5), limit)
+        plan.claims = claims
+        plan.repairs = [claim.item for claim in claims if isinstance(claim.item, Tool) and need_repair(claim.item)]
+        plan.energy_used = sum((claim.energy for claim in claims), Decimal(0))
+        return plan
@@ -0,0 +1,105 @@
+# 按节点限制请求频率，同一进程中的所有账号共用
+# 令牌桶：节点正常时允许短时间突发，被限流(429/5xx)或CPU不足时速率减半，之后每次成功逐步恢复
+import threading
+import time
+from typing import Dict
+from urllib.parse import urlparse
+from settings import cfg
+from metrics import metrics
+
+# 签名并推送交易的限速器名称
+SIGNER = "signer"
+
+# 这些状态码说明节点限流或过载
+throttle_status = (429, 502, 503, 504)
+
+
+class RateLimiter:
+    def __init__(self, name: str, rate: float, burst: float = 1):
+        self.name = name
+        # 正常时每秒最多请求数
+        self.base_rate = rate
+        # 当前每秒最多请求数，被限流后降低
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        # 服务器要求暂停到这个时间(Retry-After)
+        self.pause_until = 0.0
+        self.lock = threading.Lock()
+
+    def refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # 预约一次请求，返回需要等待的秒数
+    def reserve(self) -> float:
+        with self.lock:
+            now = time.monotonic()
+            self.refill(now)
+            self.tokens -= 1
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            delay = max(delay, self.pause_until - now)
+        if delay > 0:
+            metrics.observe("farmer_ratelimit_wait_seconds", delay, limiter=self.name)
+        return delay
+
+    def wait(self):
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    # 请求成功，速率逐步恢复到正常值
+    def on_success(self):
+        with self.lock:
+            if self.rate < self.base_rate:
+                self.refill(time.monotonic())
+                self.rate = min(self.base_rate, self.rate + self.base_rate * cfg.rate_recover_step)
+
+    # 被限流或节点过载，速率减半，清空积攒的令牌
+    # retry_after: 服务器要求等待的秒数
+    def on_throttle(self, retry_after: float = None):
+        with self.lock:
+            now = time.monotonic()
+            self.refill(now)
+            self.rate = max(cfg.endpoint_min_rate, self.rate * cfg.rate_backoff_factor)
+            self.tokens = min(self.tokens, 0.0)
+            if retry_after:
+                self.pause_until = max(self.pause_until, now + retry_after)
+        metrics.inc("farmer_ratelimit_throttled_total", limiter=self.name)
+        metrics.set("farmer_ratelimit_rate", self.rate, limiter=self.name)
+
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+# 获取url所在节点的限速器，不是url的按名称获取(如签名交易)
+def get_limiter(url: str) -> RateLimiter:
+    key = urlparse(url).netloc if "://" in url else url
+    with _limiters_lock:
+        if key not in _limiters:
+            if key == SIGNER:
+                _limiters[key] = RateLimiter(key, cfg.signer_rate_limit, cfg.signer_burst)
+            else:
+                _limiters[key] = RateLimiter(key, cfg.endpoint_rate_limit, cfg.endpoint_burst)
+        return _limiters[key]
+
+
+# 响应头中的Retry-After秒数
+def retry_after(headers) -> float:
+    value = headers.get("Retry-After") if headers else None
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+# 根据应答状态调整url所在节点的速率
+def feedback(url: str, status: int, headers=None):
+    limiter = get_limiter(url)
+    if status in throttle_status:
+        limiter.on_throttle(retry_after(headers))
+    elif status < 500:
+        limiter.on_success()
+
@@ -0,0 +1,106 @@
+# 交易回执跟踪：交易被节点接受后按transaction_id定期查询一次是否上链，
+# 上链后按区块时间回调(安排下一次操作)，超时后接口仍明确查不到的认为已被丢弃，交给失败回调重试；
+# 接口出错查不出结果的不当作丢弃，超时后不再跟踪
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+import requests
+import fast_json
+from settings import cfg
+from metrics import metrics
+
+# 查询结果：已上链、接口明确查不到、接口出错不知道
+CONFIRMED = "confirmed"
+MISSING = "missing"
+UNKNOWN = "unknown"
+
+
+@dataclass
+class TrackedTransaction:
+    transaction_id: str
+    submitted: datetime
+    # 下一次查询的时间
+    next_check: datetime
+    # 上链后的回调，参数为区块时间
+    on_confirmed: List[Callable[[datetime], None]] = field(default_factory=list)
+    # 超时未上链的回调
+    on_dropped: List[Callable[[], None]] = field(default_factory=list)
+
+
+class ReceiptTracker:
+    def __init__(self, http: requests.Session, url: str, account: str, log):
+        self.http = http
+        self.url = url
+        self.account = account
+        self.log = log
+        self.lock = threading.Lock()
+        self.transactions: Dict[str, TrackedTransaction] = {}
+
+    # 同一笔交易中的多个操作各自登记回调，只查询一次
+    def track(self, transaction_id: str, on_confirmed: Callable[[datetime], None] = None,
+              on_dropped: Callable[[], None] = None):
+        now = datetime.now()
+        with self.lock:
+            tx = self.transactions.get(transaction_id)
+            if not tx:
+                tx = TrackedTransaction(transaction_id, now, now + cfg.confirm_delay)
+                self.transactions[transaction_id] = tx
+            if on_confirmed:
+                tx.on_confirmed.append(on_confirmed)
+            if on_dropped:
+                tx.on_dropped.append(on_dropped)
+
+    # 下一次需要查询的时间，没有待确认的交易时为datetime.max
+    def next_poll_time(self) -> datetime:
+        with self.lock:
+            return min((tx.next_check for tx in self.transactions.values()), default=datetime.max)
+
+    # 查询所有到期的交易
+    def poll(self):
+        now = datetime.now()
+        with self.lock:
+            due = [tx for tx in self.transactions.values() if tx.next_check <= now]
+        for tx in due:
+            status, block_time = self.query(tx.transaction_id)
+            if status == CONFIRMED:
+                self.finish(tx)
+                metrics.inc("farmer_transactions_total", account=self.account, result="confirmed")
+                metrics.observe("farmer_confirm_seconds", (datetime.now() - tx.submitted).total_seconds(),
+                                account=self.account)
+                for callback in tx.on_confirmed:
+                    callback(block_time)
+            elif datetime.now() - tx.submitted > cfg.confirm_timeout:
+                self.finish(tx)
+                if status == MISSING:
+                    metrics.inc("farmer_transactions_total", account=self.account, result="dropped")
+                    self.log.error("交易超时未上链: {0}".format(tx.transaction_id))
+                    for callback in tx.on_dropped:
+                        callback()
+                else:
+                    metrics.inc("farmer_transactions_total", account=self.account, result="unknown")
+                    self.log.warning("无法确认交易是否上链，不再跟踪: {0}".format(tx.transaction_id))
+            else:
+                tx.next_check = datetime.now() + cfg.confirm_poll_interval
+
+    def finish(self, tx: TrackedTransaction):
+        with self.lock:
+            self.transactions.pop(tx.transaction_id, None)
+
+    # 返回 (查询结果, 区块时间)，只有接口正常应答executed为false时才算明确查不到
+    def query(self, transaction_id: str) -> Tuple[str, Optional[datetime]]:
+        try:
+            resp = self.http.get(self.url, params={"id": transaction_id})
+            if resp.status_code not in (200, 404):
+                return UNKNOWN, None
+            data = fast_json.decode(resp, self.log, "get_transaction")
+        except Exception as e:
+            self.log.warning("查询交易状态失败: {0}".format(e))
+            return UNKNOWN, None
+        if not isinstance(data, dict) or "executed" not in data:
+            return UNKNOWN, None
+        actions = data.get("actions") or []
+        if not data["executed"] or not actions:
+            return MISSING, None
+        t = datetime.strptime(actions[0]["timestamp"].split(".")[0], "%Y-%m-%dT%H:%M:%S")
+        return CONFIRMED, t.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
@@ -1,13 +1,13 @@
 # 游戏里的各种数据结构
+# 每种NFT模板的配置(来自游戏配置表)是不可修改的对象，集中放在registry中，重新加载配置时整体替换
+# 每个资产对象用__slots__保存自己的状态，并引用所属模板的配置，账号多、资产多时占用内存少
 from decimal import Decimal
 from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import List, ClassVar, Dict
+from typing import List, Dict, Iterable, Callable
 import utils
 
 
-farming_table = {}
-
 # nft template_id
 class NFT:
     Barley: int = 318606
@@ -40,13 +40,156 @@ class Token:
     fwf: Decimal = None
 
 
+####################################################### Config #######################################################
+
+# NFT模板的配置
+@dataclass(frozen=True)
+class TemplateConfig:
+    template_id: int
+    name: str
+    # 能量消耗
+    energy_consumed: int = None
+    # 操作间隔
+    charge_time: timedelta = None
+
+
+# 工具的配置
+@dataclass(frozen=True)
+class ToolConfig(TemplateConfig):
+    # 产出资源类型
+    mining_type: str = None
+    # 耐久消耗
+    durability_consumed: int = None
+    # 每次采集的产出
+    rewards_rate: Decimal = None
+
+
+# 农作物的配置
+@dataclass(frozen=True)
+class CropConfig(TemplateConfig):
+    # 最大耕作次数
+    required_claims: int = None
+
+
+# 会员卡的配置
+@dataclass(frozen=True)
+class MBSConfig(TemplateConfig):
+    type: str = None
+
+
+class ConfigRegistry:
+    def __init__(self, configs: Iterable[TemplateConfig]):
+        self.configs: Dict[int, TemplateConfig] = {item.template_id: item for item in configs}
+
+    def get(self, template_id: int) -> TemplateConfig:
+        return self.configs.get(template_id, None)
+
+    # 用新的配置替换，已经创建的资产对象仍引用旧的配置，不受影响
+    def update(self, configs: Iterable[TemplateConfig]):
+        merged = dict(self.configs)
+        merged.update({item.template_id: item for item in configs})
+        self.configs = merged
+
+    # 没有配置表的模板(如建筑物)，第一次遇到时创建配置
+    def get_or_add(self, template_id: int, create: Callable[[], TemplateConfig]) -> TemplateConfig:
+        config = self.configs.get(template_id, None)
+        if not config:
+            config = create()
+            self.update([config])
+        return config
+
+
+# 支持的工具
+supported_tools = {
+    203881: "Axe",
+    260763: "Stone Axe",
+    378691: "Ancient Stone Axe",
+    203883: "Saw",
+    203886: "Chainsaw",
+    203887: "Fishing Rod",
+    203888: "Fishing Net",
+    203889: "Fishing Boat",
+    203891: "Mining Excavator",
+}
+
+# 支持的农作物
+supported_crops = {
+    NFT.BarleySeed: "Barley Seed",
+    NFT.CornSeed: "Corn Seed",
+}
+
+registry = ConfigRegistry(
+    [ToolConfig(template_id, name) for template_id, name in supported_tools.items()] +
+    [CropConfig(template_id, name) for template_id, name in supported_crops.items()] +
+    [TemplateConfig(NFT.Chicken, "Chicken", energy_consumed=0)]
+)
+
+
+def init_tool_config(rows: List[dict]):
+    registry.update([ToolConfig(
+        template_id=item["template_id"],
+        name=supported_tools[item["template_id"]],
+        mining_type=item["type"],
+        charge_time=timedelta(seconds=item["charged_time"]),
+        energy_consumed=item["energy_consumed"],
+        durability_consumed=item["durability_consumed"],
+        rewards_rate=Decimal(str(item.get("rewards_rate", 0))),
+    ) for item in rows if item["template_id"] in supported_tools])
+
+
+def init_crop_config(rows: List[dict]):
+    registry.update([CropConfig(
+        template_id=item["template_id"],
+        name=item["name"],
+        charge_time=timedelta(seconds=item["charge_time"]),
+        energy_consumed=item["energy_consumed"],
+        required_claims=item["required_claims"],
+    ) for item in rows if item["template_id"] in supported_crops])
+
+
+def init_mbs_config(rows: List[dict]):
+    registry.update([MBSConfig(
+        template_id=item["template_id"],
+        name=item["name"],
+        type=item["type"],
+        energy_consumed=100,
+    ) for item in rows])
+
+
+# 应用从服务器获取的全部游戏配置表
+def init_farming_config(tables: Dict[str, List[dict]]):
+    init_tool_config(tables["toolconfs"])
+    init_crop_config(tables["cropconf"])
+    init_mbs_config(tables["mbsconf"])
+
+
+####################################################### Config #######################################################
+
+
 # 可操作的作物
-@dataclass(init=False)
 class Farming:
-    asset_id: str = None
-    name: str = None
-    template_id: int = None
-    next_availability: datetime = None
+    __slots__ = ("config", "asset_id", "next_availability")
+
+    def __init__(self, config: TemplateConfig, asset_id: str = None, next_availability: datetime = None):
+        self.config = config
+        self.asset_id = asset_id
+        self.next_availability = next_availability
+
+    @property
+    def name(self) -> str:
+        return self.config.name
+
+    @property
+    def template_id(self) -> int:
+        return self.config.template_id
+
+    @property
+    def energy_consumed(self) -> int:
+        return self.config.energy_consumed
+
+    @property
+    def charge_time(self) -> timedelta:
+        return self.config.charge_time
 
     def show(self, more=True) -> str:
         if more:
@@ -54,35 +197,46 @@ class Farming:
         else:
             return f"[{self.name}] [{self.asset_id}]"
 
+    def __repr__(self):
+        fields = ["name={0!r}".format(self.name)]
+        for cls in type(self).__mro__:
+            for key in getattr(cls, "__slots__", ()):
+                if key != "config":
+                    fields.append("{0}={1!r}".format(key, getattr(self, key, None)))
+        return "{0}({1})".format(type(self).__name__, ", ".join(fields))
+
 
 # 动物
-@dataclass(init=False)
 class Animal(Farming):
-    times_claimed: int = None
-    last_claimed: datetime = None
-    day_claims_at: List[datetime] = None
+    __slots__ = ("times_claimed", "last_claimed", "day_claims_at")
+
+    def __init__(self, config: TemplateConfig):
+        super().__init__(config)
+        self.times_claimed: int = None
+        self.last_claimed: datetime = None
+        self.day_claims_at: List[datetime] = None
 
 
 # 大鸡
-@dataclass(init=False)
 class Chicken(Animal):
-    energy_consumed: int = 0
+    __slots__ = ()
 
 
 ####################################################### Crop #######################################################
 
 # 农作物，大麦，玉米
-@dataclass(init=False)
 class Crop(Farming):
-    times_claimed: int = None
-    last_claimed: datetime = None
+    __slots__ = ("times_claimed", "last_claimed")
+
+    def __init__(self, config: CropConfig):
+        super().__init__(config)
+        self.times_claimed: int = None
+        self.last_claimed: datetime = None
 
     # 最大耕作次数
-    required_claims: int = None
-    # 能量消耗
-    energy_consumed: int = None
-    # 浇水间隔
-    charge_time: timedelta = None
+    @property
+    def required_claims(self) -> int:
+        return self.config.required_claims
 
     def show(self, more=True) -> str:
         if more:
@@ -91,67 +245,48 @@ class Crop(Farming):
             return f"[{self.name}] [{self.asset_id}]"
 
 
-# 大麦
-@dataclass(init=False)
-class BarleySeed(Crop):
-    name: str = "Barley Seed"
-    template_id: int = 298595
-
-
-# 玉米
-@dataclass(init=False)
-class CornSeed(Crop):
-    name: str = "Corn Seed"
-    template_id: int = 298596
-
-
-supported_crops = [BarleySeed, CornSeed]
-
-farming_table.update({cls.template_id: cls for cls in supported_crops})
-
-
-def init_crop_config(rows: List[dict]):
-    for item in rows:
-        crop_class : Crop = farming_table.get(item["template_id"], None)
-        if crop_class:
-            crop_class.name = item["name"]
-            crop_class.charge_time = timedelta(seconds=item["charge_time"])
-            crop_class.energy_consumed = item["energy_consumed"]
-            crop_class.required_claims = item["required_claims"]
-
-
 # 从json构造农作物对象
 def create_crop(item: dict) -> Crop:
-    crop_class = farming_table.get(item["template_id"], None)
-    if not crop_class:
+    config = registry.get(item["template_id"])
+    if not isinstance(config, CropConfig):
         return None
-    crop = crop_class()
+    crop = Crop(config)
     crop.asset_id = item["asset_id"]
-    crop.name = item["name"]
     crop.times_claimed = item.get("times_claimed", None)
     crop.last_claimed = datetime.fromtimestamp(item["last_claimed"])
     crop.next_availability = datetime.fromtimestamp(item["next_availability"])
     return crop
 
 
+####################################################### Crop #######################################################
+
 ####################################################### Tool #######################################################
 
 # 工具
-@dataclass(init=False)
 class Tool(Farming):
-    # 当前耐久
-    current_durability: Decimal = None
-    # 最大耐久
-    durability: Decimal = None
+    __slots__ = ("current_durability", "durability")
+
+    def __init__(self, config: ToolConfig):
+        super().__init__(config)
+        # 当前耐久
+        self.current_durability: Decimal = None
+        # 最大耐久
+        self.durability: Decimal = None
 
     # 产出资源类型
-    mining_type: str = None
-    # 挖矿间隔
-    charge_time: timedelta = None
-    # 能量消耗
-    energy_consumed: int = None
+    @property
+    def mining_type(self) -> str:
+        return self.config.mining_type
+
     # 耐久消耗
-    durability_consumed: int = None
+    @property
+    def durability_consumed(self) -> int:
+        return self.config.durability_consumed
+
+    # 每次采集的产出
+    @property
+    def rewards_rate(self) -> Decimal:
+        return self.config.rewards_rate
 
     def show(self, more=True) -> str:
         if more:
@@ -160,89 +295,12 @@ class Tool(Farming):
             return f"[{self.name}] [{self.asset_id}]"
 
 
-# 斧头
-@dataclass(init=False)
-class Axe(Tool):
-    name: str = "Axe"
-    template_id: int = 203881
-
-
-# 石斧
-@dataclass(init=False)
-class StoneAxe(Tool):
-    name: str = "Stone Axe"
-    template_id: int = 260763
-
-
-# 古代石斧
-@dataclass(init=False)
-class AncientStoneAxe(Tool):
-    name: str = "Ancient Stone Axe"
-    template_id: int = 378691
-
-
-# 锯子
-@dataclass(init=False)
-class Saw(Tool):
-    name: str = "Saw"
-    template_id: int = 203883
-
-
-# 电锯
-@dataclass(init=False)
-class Chainsaw(Tool):
-    name: str = "Chainsaw"
-    template_id: int = 203886
-
-
-# 钓鱼竿
-@dataclass(init=False)
-class FishingRod(Tool):
-    name: str = "Fishing Rod"
-    template_id: int = 203887
-
-
-# 渔网
-@dataclass(init=False)
-class FishingNet(Tool):
-    name: str = "Fishing Net"
-    template_id: int = 203888
-
-
-# 渔船
-@dataclass(init=False)
-class FishingBoat(Tool):
-    name: str = "Fishing Boat"
-    template_id: int = 203889
-
-
-# 挖掘机
-@dataclass(init=False)
-class MiningExcavator(Tool):
-    name: str = "Mining Excavator"
-    template_id: int = 203891
-
-
-supported_tools = [Axe, StoneAxe, AncientStoneAxe, Saw, Chainsaw, FishingRod, FishingNet, FishingBoat, MiningExcavator]
-
-farming_table.update({cls.template_id: cls for cls in supported_tools})
-
-
-def init_tool_config(rows: List[dict]):
-    for item in rows:
-        tool_class = farming_table.get(item["template_id"], None)
-        if tool_class:
-            tool_class.mining_type = item["type"]
-            tool_class.charge_time = timedelta(seconds=item["charged_time"])
-            tool_class.energy_consumed = item["energy_consumed"]
-            tool_class.durability_consumed = item["durability_consumed"]
-
 # 从json构造工具对象
 def create_tool(item: dict) -> Tool:
-    tool_class = farming_table.get(item["template_id"], None)
-    if not tool_class:
+    config = registry.get(item["template_id"])
+    if not isinstance(config, ToolConfig):
         return None
-    tool = tool_class()
+    tool = Tool(config)
     tool.asset_id = item["asset_id"]
     tool.next_availability = datetime.fromtimestamp(item["next_availability"])
     tool.current_durability = item["current_durability"]
@@ -255,14 +313,12 @@ def create_tool(item: dict) -> Tool:
 ####################################################### MBS  #######################################################
 
 # 会员卡
-@dataclass(init=False)
 class MBS(Farming):
-    energy_consumed: int = 100
+    __slots__ = ()
 
-    def __init__(self, template_id, name, type):
-        self.name = name
-        self.template_id = template_id
-        self.type = type
+    @property
+    def type(self) -> str:
+        return self.config.type
 
     def show(self, more=True) -> str:
         if more:
@@ -270,64 +326,114 @@ class MBS(Farming):
         else:
             return f"[{self.name}] [类型:{self.type}]"
 
-mbs_table : Dict[int, MBS]= {}
-
-
-def init_mbs_config(rows: List[dict]):
-    for item in rows:
-        mbs = MBS(item["template_id"], item["name"], item["type"])
-        mbs_table[item["template_id"]] = mbs
 
 # 从json构造mbs对象
 def create_mbs(item: dict) -> MBS:
-    mbs_class = mbs_table.get(item["template_id"], None)
-    if not mbs_class:
+    config = registry.get(item["template_id"])
+    if not isinstance(config, MBSConfig):
         return None
-    mbs = MBS(mbs_class.template_id, mbs_class.name, mbs_class.type)
-    mbs.asset_id = item["asset_id"]
-    mbs.next_availability = datetime.fromtimestamp(item["next_availability"])
-    return mbs
+    return MBS(config, item["asset_id"], datetime.fromtimestamp(item["next_availability"]))
 
 ####################################################### MBS #######################################################
 
 
 # 建筑物
-@dataclass(init=False)
 class Building(Farming):
-    # 能量消耗
-    energy_consumed: int = 200
-    times_claimed: int = None
-    last_claimed: datetime = None
-    is_ready: int = None
+    __slots__ = ("times_claimed", "last_claimed", "is_ready")
+
+    def __init__(self, config: TemplateConfig):
+        super().__init__(config)
+        self.times_claimed: int = None
+        self.last_claimed: datetime = None
+        self.is_ready: int = None
+
+
+# 从json构造建筑物对象，建筑物没有配置表，能量消耗固定为200
+def create_building(item: dict) -> Building:
+    config = registry.get_or_add(item["template_id"], lambda: TemplateConfig(
+        item["template_id"], item["name"], energy_consumed=200))
+    build = Building(config)
+    build.asset_id = item["asset_id"]
+    build.is_ready = item["is_ready"]
+    build.next_availability = datetime.fromtimestamp(item["next_availability"])
+    build.times_claimed = item.get("times_claimed", None)
+    return build
 
 
 # NFT资产，可以是小麦，小麦种子，牛奶等
-@dataclass(init=False)
 class Asset:
-    asset_id: str
-    name: str
-    is_transferable: bool
-    is_burnable: bool
-    schema_name: str
-    template_id: str
+    __slots__ = ("asset_id", "name", "is_transferable", "is_burnable", "schema_name", "template_id")
+
+    def __init__(self):
+        self.asset_id: str = None
+        self.name: str = None
+        self.is_transferable: bool = None
+        self.is_burnable: bool = None
+        self.schema_name: str = None
+        self.template_id: str = None
+
+    def __repr__(self):
+        return "Asset({0})".format(", ".join("{0}={1!r}".format(key, getattr(self, key)) for key in self.__slots__))
+
+
+# 从atomicassets接口返回的json构造资产
+def create_asset(item: dict) -> Asset:
+    asset = Asset()
+    asset.asset_id = item["asset_id"]
+    asset.name = item["name"]
+    asset.is_transferable = item["is_transferable"]
+    asset.is_burnable = item["is_burnable"]
+    asset.schema_name = item["schema"]["schema_name"]
+    asset.template_id = item["template"]["template_id"]
+    return asset
 
 
 # 从http返回的json数据构造对象
 def create_farming(item: dict) -> Farming:
     template_id = item["template_id"]
-    if template_id == NFT.CornSeed:
-        fm = CornSeed()
-    elif template_id == NFT.BarleySeed:
-        fm = BarleySeed()
+    config = registry.get(template_id)
+    if isinstance(config, CropConfig):
+        fm = Crop(config)
     elif template_id == NFT.Chicken:
-        fm = Chicken()
+        fm = Chicken(config)
         fm.day_claims_at = [datetime.fromtimestamp(item) for item in item["day_claims_at"]]
     else:
         raise Exception("尚未支持的作物类型:{0}".format(item))
     fm.asset_id = item["asset_id"]
-    fm.name = item["name"]
-    fm.template_id = template_id
     fm.times_claimed = item.get("times_claimed", None)
     fm.last_claimed = datetime.fromtimestamp(item["last_claimed"])
     fm.next_availability = datetime.fromtimestamp(item["next_availability"])
     return fm
+
+
+# 批量构造：rows为数据表中的行，不支持的行放入unsupported
+def create_all(rows: List[dict], create: Callable[[dict], Farming], unsupported: List[dict] = None) -> list:
+    items = []
+    for row in rows:
+        item = create(row)
+        if item is None:
+            if unsupported is not None:
+                unsupported.append(row)
+            continue
+        items.append(item)
+    return items
+
+
+def create_tools(rows: List[dict], unsupported: List[dict] = None) -> List[Tool]:
+    return create_all(rows, create_tool, unsupported)
+
+
+def create_crops(rows: List[dict], unsupported: List[dict] = None) -> List[Crop]:
+    return create_all(rows, create_crop, unsupported)
+
+
+def create_mbs_list(rows: List[dict], unsupported: List[dict] = None) -> List[MBS]:
+    return create_all(rows, create_mbs, unsupported)
+
+
+def create_buildings(rows: List[dict]) -> List[Building]:
+    return create_all(rows, create_building)
+
+
+def create_chickens(rows: List[dict]) -> List[Chicken]:
+    return create_all([row for row in rows if row["name"] == "Chicken"], create_farming)
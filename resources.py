@@ -0,0 +1,111 @@
+# 账号CPU/NET资源监控：定期读取get_account中的可用CPU/NET，按以往交易回执估算每种action的消耗，
+# 提交前检查资源是否够用，不够的操作推迟到资源恢复之后，不必等交易失败才发现
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+from settings import cfg
+from metrics import metrics
+
+# 已用的CPU/NET在24小时内线性恢复
+REGEN_SECONDS = 24 * 3600
+
+
+class ResourceMonitor:
+    # fetch: 读取get_account的函数
+    def __init__(self, account: str, fetch: Callable[[], dict], log):
+        self.account = account
+        self.fetch = fetch
+        self.log = log
+        self.lock = threading.Lock()
+        # 可用和最大的CPU(微秒)、NET(字节)，为空表示还没读取到
+        self.cpu_available: float = None
+        self.cpu_max: float = None
+        self.net_available: float = None
+        self.net_max: float = None
+        self.updated = 0.0
+        # 每种action的CPU(微秒)和NET(字节)消耗的指数移动平均
+        self.cpu_cost: Dict[str, float] = {}
+        self.net_cost: Dict[str, float] = {}
+
+    # 距上次读取超过设置的间隔才重新读取，force: 交易因资源不足失败后立即重新读取
+    def refresh(self, force: bool = False):
+        if not force and time.monotonic() - self.updated < cfg.resource_refresh_interval.total_seconds():
+            return
+        try:
+            resp = self.fetch()
+            cpu = resp["cpu_limit"]
+            net = resp["net_limit"]
+        except Exception as e:
+            self.log.warning("读取账号CPU/NET失败: {0}".format(e))
+            return
+        with self.lock:
+            self.cpu_available = float(cpu["available"])
+            self.cpu_max = float(cpu["max"])
+            self.net_available = float(net["available"])
+            self.net_max = float(net["max"])
+            self.updated = time.monotonic()
+        metrics.set("farmer_cpu_available_us", self.cpu_available, account=self.account)
+        metrics.set("farmer_net_available_bytes", self.net_available, account=self.account)
+        self.log.info("CPU可用【{0:.0f}/{1:.0f}】微秒 NET可用【{2:.0f}/{3:.0f}】字节".format(
+            self.cpu_available, self.cpu_max, self.net_available, self.net_max))
+
+    # 根据交易回执更新每种action的消耗，并从可用资源中扣除
+    def record(self, actions: List[dict], result: dict):
+        receipt = (result.get("processed") or {}).get("receipt") if isinstance(result, dict) else None
+        if not receipt or not actions:
+            return
+        cpu = float(receipt.get("cpu_usage_us", 0))
+        net = float(receipt.get("net_usage_words", 0)) * 8
+        with self.lock:
+            for action in actions:
+                name = action["name"]
+                self.cpu_cost[name] = self.average(self.cpu_cost.get(name), cpu / len(actions))
+                self.net_cost[name] = self.average(self.net_cost.get(name), net / len(actions))
+            if self.cpu_available is not None:
+                self.cpu_available = max(0.0, self.cpu_available - cpu)
+                self.net_available = max(0.0, self.net_available - net)
+
+    @staticmethod
+    def average(old: float, sample: float) -> float:
+        return sample if old is None else old * 0.8 + sample * 0.2
+
+    # 交易因CPU/NET不足失败，可用资源按0计算，下次提交前重新读取
+    def exhausted(self):
+        with self.lock:
+            if self.cpu_available is not None:
+                self.cpu_available = 0.0
+            self.updated = 0.0
+
+    # 预计消耗的CPU(微秒)和NET(字节)
+    def estimate(self, actions: List[dict]) -> Tuple[float, float]:
+        cpu = sum(self.cpu_cost.get(action["name"], cfg.default_action_cpu_us) for action in actions)
+        net = sum(self.net_cost.get(action["name"], cfg.default_action_net_bytes) for action in actions)
+        return cpu, net
+
+    # 可用资源(留出一部分余量)够提交前面多少个action
+    def affordable(self, actions: List[dict]) -> int:
+        with self.lock:
+            if self.cpu_available is None or not self.cpu_max:
+                return len(actions)
+            cpu_budget = self.cpu_available - self.cpu_max * cfg.resource_reserve
+            net_budget = self.net_available - self.net_max * cfg.resource_reserve
+            for i, action in enumerate(actions):
+                cpu, net = self.estimate([action])
+                cpu_budget -= cpu
+                net_budget -= net
+                if cpu_budget < 0 or net_budget < 0:
+                    return i
+        return len(actions)
+
+    # 资源恢复到足够提交这些action需要的秒数，最多等到下一轮全量扫描，届时重新读取
+    def wait_seconds(self, actions: List[dict]) -> float:
+        cpu, net = self.estimate(actions)
+        with self.lock:
+            if self.cpu_available is None:
+                return 0.0
+            cpu_need = cpu + self.cpu_max * cfg.resource_reserve - self.cpu_available
+            net_need = net + self.net_max * cfg.resource_reserve - self.net_available
+            cpu_wait = cpu_need / (self.cpu_max / REGEN_SECONDS) if cpu_need > 0 and self.cpu_max else 0.0
+            net_wait = net_need / (self.net_max / REGEN_SECONDS) if net_need > 0 and self.net_max else 0.0
+        wait = max(cpu_wait, net_wait, cfg.min_scan_interval.total_seconds())
+        return min(wait, cfg.max_scan_interval.total_seconds())
@@ -0,0 +1,109 @@
+# 错误分类与重试策略：按错误类型决定是否重试、重试前等多久(指数退避加随机抖动)，并统计重试造成的请求放大倍数
+import random
+import threading
+from typing import Dict, Tuple
+from requests.exceptions import RequestException, HTTPError, Timeout, ConnectionError
+from tenacity import RetryCallState
+from settings import cfg
+from metrics import metrics
+from ratelimit import throttle_status
+from exceptions import ResourceException
+
+# 错误类型
+CPU = "cpu"
+NET = "net"
+EXPIRED = "expired"
+DUPLICATE = "duplicate"
+NOT_READY = "not_ready"
+THROTTLED = "throttled"
+NETWORK = "network"
+CONTRACT = "contract"
+
+# 按错误信息中的关键字分类，按顺序匹配，都不匹配的是合约报错(CONTRACT)
+message_patterns = [
+    (CPU, ("is greater than the maximum billable", "tx_cpu_usage_exceeded", "billed CPU time")),
+    (NET, ("net usage", "tx_net_usage_exceeded")),
+    (EXPIRED, ("expired transaction", "expired_tx_exception", "Transaction Expiration")),
+    (DUPLICATE, ("duplicate transaction", "tx_duplicate")),
+    (NOT_READY, ("not ready", "too early")),
+    (THROTTLED, ("Too Many Requests", "Bad Gateway", "Service Unavailable", "Gateway Timeout")),
+    (NETWORK, ("timed out", "Max retries exceeded", "Connection aborted", "Connection refused")),
+]
+
+# 这些错误是整笔交易的问题，与具体某个action无关，拆分交易也无济于事
+whole_transaction_errors = (CPU, NET, EXPIRED, DUPLICATE, THROTTLED, NETWORK)
+
+# 这些错误说明账号资源不足或节点过载，本轮剩下的交易也不要再提交
+pause_errors = (CPU, NET, THROTTLED)
+
+
+def classify(error: Exception) -> str:
+    if isinstance(error, ResourceException):
+        return CPU
+    if isinstance(error, HTTPError) and error.response is not None \
+            and error.response.status_code in throttle_status:
+        return THROTTLED
+    if isinstance(error, (Timeout, ConnectionError)):
+        return NETWORK
+    msg = str(error)
+    for error_class, patterns in message_patterns:
+        if any(pattern in msg for pattern in patterns):
+            return error_class
+    if isinstance(error, RequestException):
+        return NETWORK
+    return CONTRACT
+
+
+# (首次等待秒数, 最长等待秒数, 最多重试次数)
+def policy(error_class: str) -> Tuple[float, float, int]:
+    return cfg.retry_policies.get(error_class) or cfg.retry_policies[CONTRACT]
+
+
+# 第attempt次重试(从1开始)前等待的秒数：指数增长到上限，再在一半到全部之间随机，避免多个账号同时重试
+def backoff(error_class: str, attempt: int) -> float:
+    base, cap, _ = policy(error_class)
+    delay = min(cap, base * 2 ** max(0, attempt - 1))
+    return random.uniform(delay / 2, delay)
+
+
+# 是否还可以进行第attempt次重试
+def should_retry(error_class: str, attempt: int) -> bool:
+    return attempt <= policy(error_class)[2]
+
+
+# tenacity的等待时间和停止条件，按上一次的错误类型决定
+def wait_for_error(state: RetryCallState) -> float:
+    return backoff(classify(state.outcome.exception()), state.attempt_number)
+
+
+def stop_for_error(state: RetryCallState) -> bool:
+    return not should_retry(classify(state.outcome.exception()), state.attempt_number)
+
+
+# 重试统计：请求放大倍数 = 实际发出的次数 / 原始请求次数
+class RetryStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests: Dict[str, int] = {}
+        self.attempts: Dict[str, int] = {}
+
+    # kind: http 网络请求，action 提交的操作
+    def request(self, kind: str, count: int = 1):
+        with self.lock:
+            self.requests[kind] = self.requests.get(kind, 0) + count
+
+    def attempt(self, kind: str, count: int = 1):
+        with self.lock:
+            self.attempts[kind] = self.attempts.get(kind, 0) + count
+        metrics.set("farmer_retry_amplification", self.amplification(kind), kind=kind)
+
+    def retry(self, kind: str, error_class: str):
+        metrics.inc("farmer_retries_total", kind=kind, error=error_class)
+
+    def amplification(self, kind: str) -> float:
+        with self.lock:
+            requests = self.requests.get(kind, 0)
+            return self.attempts.get(kind, 0) / requests if requests else 1.0
+
+
+retry_stats = RetryStats()
@@ -0,0 +1,155 @@
+# WAX节点池：记录每个节点的延迟和出错率，请求发给最快的健康节点，慢了就向另一个节点发对冲请求，连续出错的节点暂时熔断
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, wait, FIRST_COMPLETED
+from typing import List, Deque
+import requests
+from requests.exceptions import RequestException, HTTPError
+from settings import cfg
+from logger import log
+from metrics import metrics
+from retry import classify, backoff, retry_stats
+
+# 这些状态码说明节点本身有问题，其它状态码(如合约报错的500)是正常应答
+failure_status = (429, 502, 503, 504)
+
+# 发送对冲请求的线程池
+_executor = ThreadPoolExecutor(max_workers=cfg.max_workers * 2, thread_name_prefix="rpc_hedge")
+
+
+class Endpoint:
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        # 延迟的指数移动平均（秒），为空表示还没请求过
+        self.latency: float = None
+        # 出错率的指数移动平均
+        self.error_rate: float = 0.0
+        # 最近的延迟样本，用于计算p95
+        self.samples: Deque[float] = deque(maxlen=50)
+        self.count_failure = 0
+        # 熔断到这个时间为止
+        self.open_until: float = 0.0
+
+    def is_open(self, now: float) -> bool:
+        return now < self.open_until
+
+    # 越小越优先，没请求过的节点优先试一次，从没成功过的节点按很慢计算
+    def score(self) -> float:
+        latency = self.latency
+        if latency is None:
+            latency = 10.0 if self.error_rate else 0.0
+        return latency * (1 + 4 * self.error_rate)
+
+    def p95(self) -> float:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def __repr__(self):
+        return "[{0}] latency:{1} error_rate:{2:.2f}".format(self.url, self.latency, self.error_rate)
+
+
+class EndpointPool:
+    def __init__(self, urls: List[str]):
+        self.endpoints = [Endpoint(url) for url in urls]
+        self.lock = threading.Lock()
+
+    # 选出最优节点，熔断中的节点只在没有别的节点可选时使用
+    def choose(self, exclude: List[Endpoint] = ()) -> Endpoint:
+        now = time.monotonic()
+        with self.lock:
+            candidates = [ep for ep in self.endpoints if ep not in exclude and not ep.is_open(now)]
+            if not candidates:
+                candidates = [ep for ep in self.endpoints if ep not in exclude] or self.endpoints
+            return min(candidates, key=lambda ep: ep.score())
+
+    def record(self, ep: Endpoint, seconds: float, ok: bool, path: str = ""):
+        metrics.observe("farmer_rpc_seconds", seconds, endpoint=ep.url, path=path, ok=ok)
+        with self.lock:
+            ep.error_rate = ep.error_rate * 0.8 + (0.0 if ok else 0.2)
+            if ok:
+                ep.latency = seconds if ep.latency is None else ep.latency * 0.7 + seconds * 0.3
+                ep.samples.append(seconds)
+                ep.count_failure = 0
+                ep.open_until = 0.0
+                return
+            ep.count_failure += 1
+            if ep.count_failure >= cfg.rpc_break_failures:
+                ep.open_until = time.monotonic() + cfg.rpc_break_seconds.total_seconds()
+                log.warning("节点连续出错【{0}】次，暂停使用: {1}".format(ep.count_failure, ep.url))
+
+    # 按完整url记录结果，用于不经过节点池发出的请求（如并发预取）
+    def record_url(self, url: str, seconds: float, ok: bool):
+        for ep in self.endpoints:
+            if url.startswith(ep.url):
+                self.record(ep, seconds, ok, url.rsplit("/", 1)[-1])
+                return
+
+    def url(self, ep: Endpoint, path: str) -> str:
+        return "{0}/v1/chain/{1}".format(ep.url, path)
+
+    def send(self, http: requests.Session, ep: Endpoint, path: str, post_data: dict) -> requests.Response:
+        url = self.url(ep, path)
+        begin = time.monotonic()
+        try:
+            resp = http.request("POST", url, json=post_data)
+            if resp.status_code in failure_status:
+                raise HTTPError("{0} {1}".format(resp.status_code, resp.reason), response=resp)
+        except RequestException:
+            self.record(ep, time.monotonic() - begin, False, path)
+            raise
+        self.record(ep, time.monotonic() - begin, True, path)
+        return resp
+
+    # 主请求超过p95还没返回，就向另一个节点再发一次，哪个先成功用哪个
+    def send_hedged(self, http: requests.Session, primary: Endpoint, path: str, post_data: dict,
+                    tried: List[Endpoint]) -> requests.Response:
+        first = _executor.submit(self.send, http, primary, path, post_data)
+        p95 = primary.p95()
+        delay = max(p95, cfg.rpc_hedge_min_delay) if p95 is not None else cfg.rpc_hedge_min_delay
+        try:
+            return first.result(timeout=delay)
+        except TimeoutError:
+            pass
+        backup = self.choose(exclude=tried)
+        if backup in tried:
+            return first.result()
+        tried.append(backup)
+        metrics.inc("farmer_rpc_hedged_total", endpoint=backup.url)
+        second = _executor.submit(self.send, http, backup, path, post_data)
+        pending = {first, second}
+        while True:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            succeeded = [future for future in done if future.exception() is None]
+            if succeeded:
+                return succeeded[0].result()
+            if not pending:
+                return done.pop().result()
+
+    # 调用节点的/v1/chain/接口，失败时换一个节点重试
+    # hedge: 是否允许对冲请求，推送交易等非幂等请求应关闭
+    def post(self, http: requests.Session, path: str, post_data: dict, hedge: bool = True) -> requests.Response:
+        tried: List[Endpoint] = []
+        last_error = None
+        rounds = 0
+        retry_stats.request("http")
+        for attempt in range(cfg.rpc_max_attempts):
+            ep = self.choose(exclude=tried)
+            tried.append(ep)
+            try:
+                if hedge and cfg.rpc_hedge and len(self.endpoints) > 1:
+                    return self.send_hedged(http, ep, path, post_data, tried)
+                return self.send(http, ep, path, post_data)
+            except RequestException as e:
+                last_error = e
+                metrics.inc("farmer_rpc_retries_total", endpoint=ep.url)
+                retry_stats.retry("http", classify(e))
+                log.info("节点请求失败: {0} {1}，正在重试: [{2}]".format(ep.url, e, attempt + 1))
+            if len(tried) >= len(self.endpoints):
+                tried.clear()
+                # 所有节点都试过了，按错误类型退避后再来一轮
+                rounds += 1
+                time.sleep(backoff(classify(last_error), rounds))
+        raise last_error
@@ -0,0 +1,50 @@
+# 按下一次可操作时间排序的优先队列，到期时只扫描到期的子系统
+import heapq
+from datetime import datetime
+from typing import List, Tuple, Dict
+
+
+class Scheduler:
+    def __init__(self):
+        self.heap: List[Tuple[datetime, str]] = []
+        # 每个子系统最早的到期时间，堆中与之不符的条目视为已过期
+        self.due: Dict[str, datetime] = {}
+
+    # 安排子系统在when时刻扫描，已有更早的安排则忽略
+    def schedule(self, subsystem: str, when: datetime):
+        current = self.due.get(subsystem)
+        if current is not None and current <= when:
+            return
+        self.due[subsystem] = when
+        heapq.heappush(self.heap, (when, subsystem))
+
+    def discard(self, subsystem: str):
+        self.due.pop(subsystem, None)
+
+    def clear(self):
+        self.heap.clear()
+        self.due.clear()
+
+    # 丢弃堆顶已过期的条目
+    def _prune(self):
+        while self.heap:
+            when, subsystem = self.heap[0]
+            if self.due.get(subsystem) == when:
+                return
+            heapq.heappop(self.heap)
+
+    # 下一个到期时间，没有安排时返回datetime.max
+    def next_time(self) -> datetime:
+        self._prune()
+        if not self.heap:
+            return datetime.max
+        return self.heap[0][0]
+
+    # 取出所有在now之前到期的子系统
+    def pop_due(self, now: datetime) -> List[str]:
+        subsystems = []
+        while self.next_time() <= now:
+            when, subsystem = heapq.heappop(self.heap)
+            del self.due[subsystem]
+            subsystems.append(subsystem)
+        return subsystems
@@ -6,58 +6,188 @@ class Settings:
     path_logs: str
     chrome_data_dir: str
     url_db: str = None
-    # 发送http请求的间隔
-    req_interval = 3
+    # 各类错误的重试策略：(首次等待秒数, 最长等待秒数, 最多重试次数)，等待时间指数增长并加随机抖动
+    # 网络请求的频率由各节点的限速器控制(endpoint_rate_limit)
+    retry_policies = {
+        # CPU/NET资源不足，等资源恢复
+        "cpu": (60, 1800, 8),
+        "net": (60, 1800, 8),
+        # 交易过期，重新签名即可
+        "expired": (3, 60, 5),
+        # 重复交易，可能已经成功，重新读取状态后再决定
+        "duplicate": (10, 10, 1),
+        # 资产还不能操作，链上状态可能还没更新
+        "not_ready": (15, 300, 5),
+        # 节点限流或过载
+        "throttled": (5, 120, 6),
+        # 网络超时、连接失败
+        "network": (2, 60, 5),
+        # 其它合约报错
+        "contract": (10, 300, 3),
+    }
+    # 登录成功后等待页面加载的秒数
+    login_wait = 3
     # 每小时至少扫描一次，即使没有可用的作物，这样可以处理上次扫码后新种的作物
     max_scan_interval = timedelta(minutes=15)
     # 每次扫描至少间隔10秒，哪怕是出错重扫
     min_scan_interval = timedelta(seconds = 10)
+    # 作物到了可操作时间后，再延后一会儿扫描，以免链上状态还没更新
+    operate_delay = timedelta(seconds=5)
+    # 一笔交易最多打包多少个action，太多会超出CPU/NET限额导致整笔交易失败
+    batch_max_actions = 8
+    # 提交前检查账号CPU/NET是否够用，不够的操作推迟到资源恢复后(最多推迟到下一轮全量扫描)，不必等交易失败
+    # 浏览器签名时WAX云钱包可能代付CPU，不做检查
+    resource_monitor = True
+    # 每隔多久从链上读取一次账号的CPU/NET
+    resource_refresh_interval = timedelta(minutes=5)
+    # CPU/NET至少留出最大值的这个比例，估算有误差
+    resource_reserve = 0.05
+    # 还没有交易回执时，每个action预计消耗的CPU(微秒)和NET(字节)
+    default_action_cpu_us = 1000
+    default_action_net_bytes = 128
+    # 一个账号最多同时有多少笔交易已提交、还没返回签名结果，1为逐笔等待
+    max_inflight_transactions = 4
+    # 等待签名结果时轮询的间隔(秒)，超过多久还没返回按失败处理
+    transact_poll_interval = 0.2
+    transact_timeout = timedelta(seconds=60)
+    # 查询交易是否上链的接口(Hyperion)，为空则不确认，节点接受即视为成功
+    transaction_status_url = "https://wax.eosphere.io/v2/history/get_transaction"
+    # 交易提交后多久开始查询是否上链，之后每隔多久查询一次，超过多久还没上链认为已被丢弃(交易90秒过期)
+    confirm_delay = timedelta(seconds=5)
+    confirm_poll_interval = timedelta(seconds=15)
+    confirm_timeout = timedelta(minutes=3)
+    # WAX节点，请求会发给其中最快的健康节点
+    rpc_endpoints = [
+        "https://api.wax.alohaeos.com",
+        "https://wax.greymass.com",
+        "https://wax.eosphere.io",
+        "https://wax.cryptolions.io",
+    ]
+    # 一个请求最多尝试几次（每次换一个节点）
+    rpc_max_attempts = 5
+    # 主请求超过p95延迟（至少这么多秒）还没返回，就向另一个节点发对冲请求
+    rpc_hedge = True
+    rpc_hedge_min_delay = 1.0
+    # 节点连续出错这么多次就熔断一段时间
+    rpc_break_failures = 3
+    rpc_break_seconds = timedelta(minutes=2)
+    # 游戏配置的本地缓存文件及有效期，过期后在后台刷新
+    config_cache_path = "./cache/farming_config.json"
+    config_cache_ttl = timedelta(hours=6)
+    # 根据自己的交易结果推算账号状态，减少全量读取数据表
+    state_tracking = True
+    # 即使本地状态可用，也至少隔这么久从链上全量读取核对一次
+    reconcile_interval = timedelta(hours=1)
+    # 账号操作记录接口(Hyperion)，用于发现在别处手工进行的操作，为空则只依赖定期核对
+    history_url = "https://wax.eosphere.io/v2/history/get_actions"
+    # 每轮扫描开始时并发读取所有数据表
+    async_read = True
+    # 每个节点每秒最多请求数，节点正常时允许短时间内突发这么多个请求
+    endpoint_rate_limit = 10
+    endpoint_burst = 20
+    # 节点限流(429/5xx)时速率乘以这个系数，之后每次成功恢复正常速率的这个比例
+    rate_backoff_factor = 0.5
+    rate_recover_step = 0.05
+    # 限流后速率最低降到每秒这么多个请求
+    endpoint_min_rate = 0.5
+    # 每秒最多签名提交的交易数，CPU不足时同样减速
+    signer_rate_limit = 2
+    signer_burst = 4
+    # 多账号运行时，批量读取数据表
+    bulk_read = True
+    # 批量读取时每页的行数
+    bulk_page_limit = 500
+    # 多账号运行时在本地这个端口输出Prometheus指标，为空则不输出
+    metrics_port = 9108
+    # 每隔多久在日志中汇总一次运行指标
+    metrics_summary_interval = timedelta(minutes=10)
+    # 多账号运行时，同时执行扫描的线程数
+    max_workers = 16
+    # 能量、食物或金币不够时，按每点能量的预估收益决定先做哪些操作
+    # 各类资源折合成金币的价值，用于估算工具每次采集的收益
+    resource_value = {"Gold": 1, "Wood": 1, "Food": 1}
+    # 没有产出数据的操作，每次操作的预估收益（折合金币）
+    claim_value = {"mbs": 10, "build": 5, "plant": 5, "chicken": 5, "mining": 1}
+    # 读取箱子里的NFT时每页的数量
+    chest_page_size = 100
+    # 箱子里NFT的本地缓存多久重新读取一次，自己转出的会直接从缓存中去掉
+    chest_cache_ttl = timedelta(minutes=30)
+    # 已经登录过WAX云钱包的账号，浏览器只打开本地的签名页面，不加载游戏界面
+    # 试验功能，还没有在真实的WAX云钱包上验证本地页面能否自动签名，默认关闭
+    sign_only = False
+    # 服务器模式(on_server)下浏览器不加载的资源，只保留签名需要的脚本和接口
+    blocked_urls = [
+        "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
+        "*.mp3", "*.mp4", "*.webm", "*.woff", "*.woff2", "*.ttf", "*.otf",
+        "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+    ]
+    # 多账号运行时，浏览器池中的浏览器数量，账号之间通过替换WAX云钱包的cookie共用浏览器
+    max_browsers = 4
 
 
-# 用户配置参数
-class user_param:
-    wax_account: str = None
-    use_proxy: bool = False
-    proxy: str = None
+# 用户配置参数，每个账号一份，user_param是单账号运行时使用的那一份
+class UserParam:
+    def __init__(self):
+        self.wax_account: str = None
+        self.use_proxy: bool = False
+        self.proxy: str = None
 
-    build: bool = True
-    mining: bool = True
-    chicken: bool = True
-    plant: bool = True
-    cow: bool = True
-    mbs: bool = True
-    # 能量不够的时候，就去恢复那么多能量,但不超过最大能量
-    recover_energy: int = 500
+        self.build: bool = True
+        self.mining: bool = True
+        self.chicken: bool = True
+        self.plant: bool = True
+        self.cow: bool = True
+        self.mbs: bool = True
+        # 能量不够的时候，就去恢复那么多能量,但不超过最大能量
+        self.recover_energy: int = 500
 
-    on_server: bool = False
+        # 服务器模式：浏览器无界面运行，不加载图片、字体等，需要预设cookie登录
+        self.on_server: bool = False
 
-    @staticmethod
-    def to_dict():
+        # 签名方式：browser 浏览器中的WAX云钱包，key 本地私钥
+        self.signer: str = "browser"
+        # signer为key时使用的私钥，及其对应的权限
+        self.private_key: str = None
+        self.permission: str = "active"
+
+    def to_dict(self):
         return {
-            "wax_account": user_param.wax_account,
-            "use_proxy": user_param.use_proxy,
-            "proxy": user_param.proxy,
-            "build": user_param.build,
-            "mining": user_param.mining,
-            "chicken": user_param.chicken,
-            "plant": user_param.plant,
-            "cow": user_param.cow,
-            "mbs": user_param.mbs,
-            "recover_energy": user_param.recover_energy,
+            "wax_account": self.wax_account,
+            "use_proxy": self.use_proxy,
+            "proxy": self.proxy,
+            "build": self.build,
+            "mining": self.mining,
+            "chicken": self.chicken,
+            "plant": self.plant,
+            "cow": self.cow,
+            "mbs": self.mbs,
+            "recover_energy": self.recover_energy,
+            "on_server": self.on_server,
+            "signer": self.signer,
+            "private_key": self.private_key,
+            "permission": self.permission,
         }
 
 
-def load_user_param(user: dict):
-    user_param.wax_account = user["wax_account"]
-    user_param.use_proxy = user.get("use_proxy", False)
-    user_param.proxy = user.get("proxy", None)
-    user_param.build = user.get("build", True)
-    user_param.mining = user.get("mining", True)
-    user_param.chicken = user.get("chicken", True)
-    user_param.plant = user.get("plant", True)
-    user_param.cow = user.get("cow", True)
-    user_param.mbs = user.get("mbs", True)
-    user_param.recover_energy = user.get("recover_energy", 500)
+user_param = UserParam()
+
+
+def load_user_param(user: dict, param: UserParam = user_param) -> UserParam:
+    param.wax_account = user["wax_account"]
+    param.use_proxy = user.get("use_proxy", False)
+    param.proxy = user.get("proxy", None)
+    param.build = user.get("build", True)
+    param.mining = user.get("mining", True)
+    param.chicken = user.get("chicken", True)
+    param.plant = user.get("plant", True)
+    param.cow = user.get("cow", True)
+    param.mbs = user.get("mbs", True)
+    param.recover_energy = user.get("recover_energy", 500)
+    param.on_server = user.get("on_server", False)
+    param.signer = user.get("signer", "browser")
+    param.private_key = user.get("private_key", None)
+    param.permission = user.get("permission", "active")
+    return param
 
 
 cfg = Settings(
@@ -0,0 +1,50 @@
+# 只用于签名的本地页面：代替游戏页面加载waxjs并登录WAX云钱包，不必加载整个游戏界面
+import os
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from logger import log
+
+# 页面可以访问的文件，程序目录下的其它文件(如含私钥的配置文件)不对外提供
+page_files = {
+    "/sign.html": "text/html; charset=utf-8",
+    "/waxjs.js": "application/javascript",
+    "/inject.js": "application/javascript",
+    "/favicon.ico": "image/x-icon",
+}
+
+root = os.path.split(os.path.realpath(__file__))[0]
+
+
+class SignPageHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path not in page_files:
+            self.send_error(404)
+            return
+        with open(os.path.join(root, path[1:]), "rb") as file:
+            body = file.read()
+            file.close()
+        self.send_response(200)
+        self.send_header("Content-Type", page_files[path])
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "max-age=3600")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+lock = threading.Lock()
+server: ThreadingHTTPServer = None
+
+
+# 页面地址，第一次调用时在本地随机端口启动服务，所有浏览器共用
+def url() -> str:
+    global server
+    with lock:
+        if not server:
+            server = ThreadingHTTPServer(("127.0.0.1", 0), SignPageHandler)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            log.info("签名页面: http://127.0.0.1:{0}/sign.html".format(server.server_port))
+    return "http://127.0.0.1:{0}/sign.html".format(server.server_port)
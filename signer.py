@@ -0,0 +1,171 @@
+# 签署交易的后端：浏览器中的WAX云钱包，或本地私钥直接签名推送
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Tuple
+import requests
+from selenium.common.exceptions import WebDriverException
+import eos
+import fast_json
+from rpc_pool import EndpointPool
+from settings import cfg
+
+# 异步提交交易的线程池，所有账号共用
+_executor = ThreadPoolExecutor(max_workers=cfg.max_workers * cfg.max_inflight_transactions,
+                               thread_name_prefix="signer")
+
+# 交易90秒后过期，放弃等待的交易超过这个时间还没有结果就不再取回
+ABANDON_SECONDS = 120
+
+
+class Signer(ABC):
+    # 签名时是否需要浏览器
+    needs_browser: bool = False
+    # 交易的CPU/NET是否由账号自己承担，WAX云钱包可能代付，代付不了(交易因CPU/NET不足失败)后改为True
+    own_resources: bool = True
+
+    # 签署并推送交易，返回 (是否成功, 结果或错误信息)，与inject.js中window.wax_transact一致
+    @abstractmethod
+    def transact(self, transaction: dict) -> Tuple[bool, object]:
+        pass
+
+    # 提交交易但不等待，返回的Future结果与transact相同
+    def submit(self, transaction: dict) -> Future:
+        return _executor.submit(self.transact, transaction)
+
+    # 取回已经完成的交易结果，由提交交易的线程定期调用，签名结果需要轮询时才用到
+    def poll(self):
+        pass
+
+    # 超时后不再等待这笔交易，之后返回的结果仍会设置到Future中
+    def cancel(self, future: Future):
+        pass
+
+
+# 通过selenium调用页面中注入的waxjs签名
+class SeleniumSigner(Signer):
+    needs_browser = True
+    own_resources = False
+
+    def __init__(self, farmer):
+        self.farmer = farmer
+        # 已在页面中提交、还没取回结果的交易 {编号: Future}
+        self.pending: Dict[str, Future] = {}
+        # 已超时放弃等待的交易 {编号: (Future, 放弃时间)}，晚到的结果照样取回
+        self.abandoned: Dict[str, Tuple[Future, float]] = {}
+        self.count = 0
+
+    def transact(self, transaction: dict) -> Tuple[bool, object]:
+        self.farmer.inject_waxjs()
+        try:
+            return self.farmer.driver.execute_script("return window.wax_transact(arguments[0]);", transaction)
+        except WebDriverException as e:
+            self.farmer.log.exception(str(e))
+            return False, str(e)
+
+    # 在页面中发起交易后立即返回，结果由poll取回，浏览器只在提交交易的线程中使用
+    def submit(self, transaction: dict) -> Future:
+        future = Future()
+        self.count += 1
+        key = str(self.count)
+        self.farmer.inject_waxjs()
+        try:
+            self.farmer.driver.execute_script("window.wax_submit(arguments[0], arguments[1]);", key, transaction)
+        except WebDriverException as e:
+            self.farmer.log.exception(str(e))
+            future.set_result((False, str(e)))
+            return future
+        self.pending[key] = future
+        return future
+
+    def poll(self):
+        if not self.pending and not self.abandoned:
+            return
+        try:
+            results = self.farmer.driver.execute_script("return window.wax_results();")
+        except WebDriverException as e:
+            self.farmer.log.exception(str(e))
+            pending = self.pending
+            self.pending = {}
+            self.abandoned = {}
+            for future in pending.values():
+                future.set_result((False, str(e)))
+            return
+        for key, result in (results or {}).items():
+            future = self.pending.pop(key, None)
+            if not future and key in self.abandoned:
+                future = self.abandoned.pop(key)[0]
+            if future:
+                future.set_result(tuple(result))
+        now = time.monotonic()
+        for key, (future, abandoned) in list(self.abandoned.items()):
+            if now - abandoned > ABANDON_SECONDS:
+                del self.abandoned[key]
+
+    def cancel(self, future: Future):
+        for key, item in list(self.pending.items()):
+            if item is future:
+                del self.pending[key]
+                self.abandoned[key] = (future, time.monotonic())
+
+
+# 用本地保存的私钥签名，直接调用节点的push_transaction，不需要浏览器
+# 适用于自己掌握私钥的账号，或为farmersworld的action单独授权了一个权限的账号
+class KeySigner(Signer):
+    # 合约ABI，多个账号共用
+    abi_cache: Dict[str, eos.Abi] = {}
+
+    def __init__(self, http: requests.Session, rpc_pool: EndpointPool, private_key: str):
+        self.http = http
+        self.rpc_pool = rpc_pool
+        self.secret = eos.decode_private_key(private_key)
+        self.public_key = eos.public_key(self.secret)
+
+    def get_abi(self, account: str) -> eos.Abi:
+        abi = KeySigner.abi_cache.get(account)
+        if not abi:
+            resp = fast_json.loads(self.rpc_pool.post(self.http, "get_abi", {"account_name": account}).content)
+            abi = eos.Abi(resp["abi"])
+            KeySigner.abi_cache[account] = abi
+        return abi
+
+    # 以最新不可逆区块作为引用区块，相当于waxjs中的blocksBehind
+    def build_transaction(self, transaction: dict, info: dict) -> dict:
+        head_time = datetime.strptime(info["head_block_time"].split(".")[0], "%Y-%m-%dT%H:%M:%S")
+        expiration = head_time + timedelta(seconds=90)
+        ref_block_id = bytes.fromhex(info["last_irreversible_block_id"])
+        actions = []
+        for action in transaction["actions"]:
+            abi = self.get_abi(action["account"])
+            actions.append({
+                "account": action["account"],
+                "name": action["name"],
+                "authorization": action["authorization"],
+                "data": abi.pack_action_data(action["name"], action["data"]),
+            })
+        return {
+            "expiration": int((expiration - datetime(1970, 1, 1)).total_seconds()),
+            "ref_block_num": info["last_irreversible_block_num"] & 0xffff,
+            "ref_block_prefix": int.from_bytes(ref_block_id[8:12], "little"),
+            "actions": actions,
+        }
+
+    def transact(self, transaction: dict) -> Tuple[bool, object]:
+        try:
+            info = fast_json.loads(self.rpc_pool.post(self.http, "get_info", {}).content)
+            packed_trx = eos.pack_transaction(self.build_transaction(transaction, info))
+            signature = eos.sign_transaction(self.secret, info["chain_id"], packed_trx)
+            post_data = {
+                "signatures": [signature],
+                "compression": 0,
+                "packed_context_free_data": "",
+                "packed_trx": packed_trx.hex(),
+            }
+            resp = fast_json.loads(self.rpc_pool.post(self.http, "push_transaction", post_data, hedge=False).content)
+        except (requests.RequestException, KeyError, ValueError) as e:
+            return False, str(e)
+        if "error" in resp:
+            details = resp["error"].get("details") or [{"message": resp["error"].get("what", "")}]
+            return False, details[0]["message"]
+        return True, resp
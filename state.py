@@ -0,0 +1,131 @@
+# 账号的本地状态：缓存数据表，根据自己成功的交易推算变化，再用链上操作记录发现外部变化，全量读取只用于定期核对
+import copy
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, Set, Callable, Deque
+import requests
+from settings import cfg
+
+# farmersworld合约中的操作影响哪张表，为空表示只影响accounts表（每轮都会重新读取）
+action_tables = {
+    "claim": "tools",
+    "repair": "tools",
+    "cropclaim": "crops",
+    "mbsclaim": "mbs",
+    "bldclaim": "buildings",
+    "recover": None,
+}
+
+# 可以缓存的数据表
+state_tables = ["tools", "crops", "animals", "buildings", "mbs"]
+
+# 箱子里的NFT(atomicassets)，与数据表一起标记是否有外部变化
+CHEST = "chest"
+
+
+class AccountState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # 表名: 与get_table_rows相同格式的响应
+        self.tables: Dict[str, dict] = {}
+        # 表名: 上次从链上全量读取的时间
+        self.synced_at: Dict[str, float] = {}
+        # 需要重新从链上读取的表
+        self.dirty: Set[str] = set()
+        # 自己最近发出的交易，操作记录中遇到这些交易不算外部变化
+        self.own_transactions: Deque[str] = deque(maxlen=1000)
+
+    # 表的本地状态可用时返回，否则返回None
+    def fresh(self, table: str) -> dict:
+        with self.lock:
+            if table not in self.tables or table in self.dirty:
+                return None
+            if time.time() - self.synced_at[table] > cfg.reconcile_interval.total_seconds():
+                return None
+            return copy.deepcopy(self.tables[table])
+
+    # 保存从链上读取的表
+    def store(self, table: str, resp: dict):
+        if table not in state_tables:
+            return
+        with self.lock:
+            self.tables[table] = copy.deepcopy(resp)
+            self.synced_at[table] = time.time()
+            self.dirty.discard(table)
+
+    def mark_dirty(self, table: str = None):
+        with self.lock:
+            if table:
+                self.dirty.add(table)
+            else:
+                self.dirty.update(state_tables)
+                self.dirty.add(CHEST)
+
+    # 取出并清除标记，返回之前是否被标记
+    def take_dirty(self, table: str) -> bool:
+        with self.lock:
+            if table in self.dirty:
+                self.dirty.discard(table)
+                return True
+            return False
+
+    # 修改表中的一行，找不到这一行就只能重新读取
+    def update_row(self, table: str, asset_id: str, update: Callable[[dict], bool]):
+        with self.lock:
+            resp = self.tables.get(table)
+            rows = resp["rows"] if resp else []
+            for row in rows:
+                if str(row["asset_id"]) == str(asset_id):
+                    # update返回False表示这一行已经不存在了(如农作物已收获)
+                    if update(row) is False:
+                        rows.remove(row)
+                    return
+            self.dirty.add(table)
+
+
+# 轮询账号的链上操作记录（Hyperion的get_actions接口），发现不是本程序发出的操作时把相关的表标记为需要重新读取
+class HistoryPoller:
+    def __init__(self, http: requests.Session, url: str, account: str):
+        self.http = http
+        self.url = url
+        self.account = account
+        # 只关心这个时间之后的操作
+        self.after = datetime.utcnow()
+
+    def poll(self, state: AccountState):
+        params = {
+            "account": self.account,
+            "after": self.after.strftime("%Y-%m-%dT%H:%M:%S.000"),
+            "sort": "asc",
+            "limit": 100,
+        }
+        try:
+            resp = self.http.get(self.url, params=params).json()
+            actions = resp["actions"]
+        except (requests.RequestException, KeyError, ValueError):
+            # 无法确定有没有外部变化，只能全部重新读取
+            state.mark_dirty()
+            return
+        for item in actions:
+            timestamp = datetime.strptime(item["timestamp"].split(".")[0], "%Y-%m-%dT%H:%M:%S")
+            self.after = max(self.after, timestamp)
+            if item["trx_id"] in state.own_transactions:
+                continue
+            act = item["act"]
+            if act["account"] == "farmersworld" and act["name"] in action_tables:
+                table = action_tables[act["name"]]
+                if table:
+                    state.mark_dirty(table)
+            elif act["account"] == "atomicassets" and str(act["data"].get("memo", "")).startswith("feed_animal"):
+                state.mark_dirty("animals")
+                state.mark_dirty(CHEST)
+            elif act["account"] == "atomicassets" and act["name"] in ("transfer", "logmint", "logburnasset"):
+                # 箱子里的NFT有变化
+                state.mark_dirty(CHEST)
+            elif act["account"] in ("farmersworld", "atomicassets"):
+                # 质押、解押、建造等其它操作，可能影响任何一张表
+                state.mark_dirty()
+        if len(actions) >= params["limit"]:
+            state.mark_dirty()
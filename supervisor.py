@@ -0,0 +1,155 @@
+#!/usr/bin/python3
+# 多账号运行：在一个进程中运行一个目录下所有user.yml对应的账号，共用线程池、http连接池和浏览器池
+import heapq
+import os
+import queue
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import List, Dict
+import yaml
+import requests
+import logger
+import utils
+from logger import log
+from farmer import Farmer, Status, create_http_session
+from settings import cfg, load_user_param, UserParam
+from browser_pool import BrowserPool
+from bulk_reader import BulkTableReader
+import metrics
+
+
+# 读取目录下所有的yml配置文件
+def load_accounts(config_dir: str) -> List[UserParam]:
+    params = []
+    for name in sorted(os.listdir(config_dir)):
+        if not name.endswith((".yml", ".yaml")):
+            continue
+        with open(os.path.join(config_dir, name), "r", encoding="utf8") as file:
+            user: dict = yaml.load(file, Loader=yaml.FullLoader)
+            file.close()
+        params.append(load_user_param(user, UserParam()))
+    return params
+
+
+class Supervisor:
+    def __init__(self, params: List[UserParam]):
+        self.params = params
+        self.executor = ThreadPoolExecutor(max_workers=cfg.max_workers)
+        self.browser_pool = BrowserPool(cfg.max_browsers, Farmer.chrome_data_dir)
+        # 按代理分组共用http会话，没有代理的账号共用同一个
+        self.sessions: Dict[str, requests.Session] = {}
+        self.farmers: List[Farmer] = []
+        # 执行完一轮扫描的账号
+        self.done: "queue.Queue[tuple]" = queue.Queue()
+
+    def get_session(self, proxy: str) -> requests.Session:
+        if proxy not in self.sessions:
+            self.sessions[proxy] = create_http_session(proxy, pool_size=cfg.max_workers)
+        return self.sessions[proxy]
+
+    def create_farmer(self, param: UserParam) -> Farmer:
+        farmer = Farmer(param)
+        farmer.wax_account = param.wax_account
+        if param.use_proxy:
+            farmer.proxy = param.proxy
+        farmer.init_http(self.get_session(farmer.proxy))
+        farmer.init_signer()
+        farmer.browser_pool = self.browser_pool
+        return farmer
+
+    # 同时到期做全量扫描的账号，先批量读取数据表，放入各自的预取缓存
+    def bulk_prefetch(self, farmers: List[Farmer]):
+        now = datetime.now()
+        farmers = [farmer for farmer in farmers if farmer.full_scan_due(now) and not farmer.proxy]
+        if not cfg.bulk_read or len(farmers) < 2:
+            return
+        tables = []
+        for farmer in farmers:
+            farmer.poll_history()
+            for table in farmer.tables_of(farmer.enabled_subsystems()):
+                if table not in tables and farmer.need_read(table):
+                    tables.append(table)
+        reader = BulkTableReader(self.get_session(None), Farmer.rpc_pool, log)
+        try:
+            result = reader.read(tables, [farmer.wax_account for farmer in farmers])
+        except Exception as e:
+            log.warning("批量读取数据失败，改为逐个账号读取: {0}".format(e))
+            return
+        for farmer in farmers:
+            wanted = farmer.tables_of(farmer.enabled_subsystems())
+            farmer.table_cache.update({table: resp for table, resp in result[farmer.wax_account].items()
+                                       if table in wanted and farmer.need_read(table)})
+
+    def submit(self, farmer: Farmer):
+        future = self.executor.submit(farmer.run_once)
+        future.add_done_callback(lambda f: self.done.put((farmer, f)))
+
+    def run(self):
+        self.farmers = [self.create_farmer(param) for param in self.params]
+        if not self.farmers:
+            log.error("没有找到账号配置")
+            return 1
+        self.farmers[0].load_farming_config()
+        log.info("共【{0}】个账号，开始自动化".format(len(self.farmers)))
+        # (下一次醒来时间, 序号, 账号)
+        waiting = [(datetime.min, i, farmer) for i, farmer in enumerate(self.farmers)]
+        index = {id(farmer): i for i, farmer in enumerate(self.farmers)}
+        running = 0
+        while waiting or running:
+            now = datetime.now()
+            due = []
+            while waiting and waiting[0][0] <= now:
+                _, _, farmer = heapq.heappop(waiting)
+                due.append(farmer)
+            self.bulk_prefetch(due)
+            for farmer in due:
+                self.submit(farmer)
+                running += 1
+            timeout = None
+            if waiting:
+                timeout = max(0.0, (waiting[0][0] - datetime.now()).total_seconds())
+            try:
+                farmer, future = self.done.get(timeout=timeout)
+            except queue.Empty:
+                continue
+            running -= 1
+            status = Status.Stop
+            if future.exception():
+                log.error("[{0}] 运行出错: {1}".format(farmer.wax_account, future.exception()))
+            else:
+                status = future.result()
+            if status == Status.Stop:
+                farmer.close()
+                log.error("[{0}] 程序已停止，请检查日志后手动重启该账号".format(farmer.wax_account))
+                continue
+            heapq.heappush(waiting, (farmer.next_wake_time(), index[id(farmer)], farmer))
+        self.executor.shutdown()
+        return 1
+
+    def close(self):
+        for farmer in self.farmers:
+            farmer.close()
+        self.browser_pool.close()
+
+
+def main():
+    config_dir = "users"
+    if len(sys.argv) == 2:
+        config_dir = sys.argv[1]
+    logger.init_loger("supervisor")
+    if cfg.metrics_port:
+        metrics.start_http_server(cfg.metrics_port)
+    metrics.start_summary()
+    utils.clear_orphan_webdriver()
+    supervisor = Supervisor(load_accounts(config_dir))
+    try:
+        supervisor.run()
+    except Exception:
+        log.exception("start error")
+    finally:
+        supervisor.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,5 @@
 import psutil
-from datetime import datetime
+from datetime import datetime, timezone
 import platform
 from typing import List
 import shutil
@@ -12,6 +12,15 @@ def show_time(t):
         return datetime.fromtimestamp(t).strftime('%Y-%m-%d %H:%M:%S')
 
 
+# 交易被打包的时间，没有则取当前时间
+def block_time(result: dict) -> datetime:
+    processed = result.get("processed") if isinstance(result, dict) else None
+    if processed and processed.get("block_time"):
+        t = datetime.strptime(processed["block_time"].split(".")[0], "%Y-%m-%dT%H:%M:%S")
+        return t.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+    return datetime.now()
+
+
 class plat:
     name: str = None
     chromedriver: str = None
@@ -52,6 +61,23 @@ def kill_process_tree_by_id(pid: int):
         pass
 
 
+# 进程及其所有子进程占用的物理内存(字节)
+def process_tree_rss(pid: int) -> int:
+    try:
+        parent = psutil.Process(pid)
+        process: List[psutil.Process] = parent.children(recursive=True)
+        process.append(parent)
+    except psutil.NoSuchProcess:
+        return 0
+    rss = 0
+    for item in process:
+        try:
+            rss += item.memory_info().rss
+        except psutil.NoSuchProcess:
+            pass
+    return rss
+
+
 def kill_process_tree_by_name(name: str):
     for proc in psutil.process_iter():
         if proc.name() == name: